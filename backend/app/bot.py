@@ -9,6 +9,7 @@ logging.getLogger('discord.gateway').setLevel(logging.WARNING)
 import discord
 from discord import app_commands
 import asyncio
+import math
 from .services.music_player import MusicPlayer
 from openai import OpenAI  # Grok用（レガシー）
 import os
@@ -63,7 +64,8 @@ async def get_queue_local(guild_id: str):
                     "added_by": item.added_by.__dict__ if item.added_by else None
                 },
                 "position": i,
-                "isCurrent": (i == 0)
+                "isCurrent": (i == 0),
+                "id": item.entry_id,
             })
         return queue_items
     return []
@@ -1204,6 +1206,39 @@ async def set_volume(interaction: discord.Interaction, value: app_commands.Range
         await interaction.response.send_message("ボイスチャンネルに接続していないか、再生中のトラックがありません。", ephemeral=True)
 
 
+@tree.command(name="seek", description="再生中の曲の指定した位置へ移動します。")
+@app_commands.describe(position="移動先の位置（例: 90 または 1:30）")
+async def seek(interaction: discord.Interaction, position: str):
+    guild = interaction.guild
+    if guild is None:
+        await interaction.response.send_message("ギルド内でのみ実行可能です。", ephemeral=True)
+        return
+
+    # "秒" / "分:秒" / "時:分:秒" を秒に変換
+    try:
+        seconds = 0.0
+        for part in position.strip().split(":"):
+            seconds = seconds * 60 + float(part)
+        if not math.isfinite(seconds) or seconds < 0:
+            raise ValueError(position)
+    except ValueError:
+        await interaction.response.send_message("位置は 90 や 1:30 の形式で指定してください。", ephemeral=True)
+        return
+
+    guild_id = str(guild.id)
+    player = music_players.get(guild_id)
+    if not player:
+        await interaction.response.send_message("ボイスチャンネルに接続していないか、再生中のトラックがありません。", ephemeral=True)
+        return
+    try:
+        await player.seek(seconds)
+    except ValueError as e:
+        await interaction.response.send_message(str(e), ephemeral=True)
+        return
+    minutes, secs = divmod(int(seconds), 60)
+    await interaction.response.send_message(f"{minutes}:{secs:02d} へ移動しました。")
+
+
 @tree.command(name="history", description="再生履歴を表示します。")
 async def show_history(interaction: discord.Interaction):
     guild = interaction.guild
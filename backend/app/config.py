@@ -70,6 +70,59 @@ class MusicSettings(BaseSettings):
     # YouTube認証用クッキーファイル（空文字列の場合は使用しない）
     cookies_file: str = Field("", env="COOKIES_FILE")
 
+    # 曲のメタデータ（タイトル・サムネイル等）を SQLite に保持する期間（時間）。期間内の再追加は yt-dlp を呼ばない
+    metadata_ttl_hours: int = Field(24 * 7, env="MUSIC_METADATA_TTL_HOURS")
+    # yt-dlp の抽出/ダウンロードを同時に実行する数（全ギルド共通）
+    extraction_workers: int = Field(3, env="MUSIC_EXTRACTION_WORKERS")
+    # アルバム/プレイリストの一括追加で、1回の追加につき同時に情報を取得する曲数
+    bulk_enqueue_concurrency: int = Field(3, env="MUSIC_BULK_ENQUEUE_CONCURRENCY")
+    # /play のキーワードを ytmusicapi の検索（曲を優先）で解決する（失敗時は yt-dlp の検索）。解決結果を保持する期間（時間）
+    ytmusic_keyword_search: bool = Field(True, env="MUSIC_YTMUSIC_KEYWORD_SEARCH")
+    search_cache_ttl_hours: int = Field(24, env="MUSIC_SEARCH_CACHE_TTL_HOURS")
+    # 非公開・削除済み・地域制限などで取得できなかった動画を覚えておく期間（時間, 0 で記録しない）。期間内の再追加は即座に失敗させる
+    failure_ttl_hours: int = Field(6, env="MUSIC_FAILURE_TTL_HOURS")
+    # ヘッジ: 情報取得が最近の所要時間の分位点（hedge_percentile）を過ぎても返らなければ、player_client かクッキーの有無が違う次点の抽出設定でも同時に試して早い方を使う
+    hedge_extraction: bool = Field(True, env="MUSIC_HEDGE_EXTRACTION")
+    hedge_percentile: float = Field(0.9, env="MUSIC_HEDGE_PERCENTILE")
+    # 抽出設定の候補にする player_client（既定に加えて。";" 区切りで複数、各要素は "tv,web_safari" のような yt-dlp の指定）
+    alt_player_clients: str = Field("tv", env="MUSIC_ALT_PLAYER_CLIENTS")
+    # 先読み: 再生中に次の何曲をバックグラウンドで準備（ダウンロード）しておくか。0 で無効
+    prefetch_depth: int = Field(2, env="MUSIC_PREFETCH_DEPTH")
+    # ストリーム優先: 未キャッシュの曲はダウンロード完了を待たず、キャッシュへ書き込みながら再生を始める
+    stream_first: bool = Field(True, env="MUSIC_STREAM_FIRST")
+
+    # キャッシュ容量: music/ の合計上限（MB, 0 で無制限）と、ディスクに残す最低空き容量（MB, 0 で無視）
+    cache_max_mb: int = Field(4096, env="MUSIC_CACHE_MAX_MB")
+    cache_min_free_mb: int = Field(2048, env="MUSIC_CACHE_MIN_FREE_MB")
+    # 定期的なキャッシュ掃除の間隔（分）。ダウンロード完了時にも容量超過分だけ掃除する
+    cache_eviction_interval_minutes: int = Field(60, env="MUSIC_CACHE_EVICTION_INTERVAL_MINUTES")
+    # 掃除の優先度: 最終アクセス/再生からこの日数ごとに価値が半減する（再生回数が多いほど残りやすい）
+    cache_recency_half_life_days: float = Field(7.0, env="MUSIC_CACHE_RECENCY_HALF_LIFE_DAYS")
+
+    # Opus キャッシュ: キャッシュ済みの曲をバックグラウンドで Ogg/Opus に変換し、再生時はデコード/再エンコードせずそのまま送る
+    opus_cache: bool = Field(True, env="MUSIC_OPUS_CACHE")
+    # 変換時のビットレート（kbps）。webm(Opus) の曲は再エンコードせずコンテナだけ詰め替える
+    opus_bitrate_kbps: int = Field(128, env="MUSIC_OPUS_BITRATE_KBPS")
+    # 再生時に FFmpeg の libopus でエンコードするときの計算量（0-10。大きいほど高音質で重い）
+    opus_compression_level: int = Field(4, env="MUSIC_OPUS_COMPRESSION_LEVEL")
+
+    # ラウドネス正規化: キャッシュ/アップロード曲の統合ラウドネス（EBU R128）を一度だけ測り、再生時に固定ゲインで揃える
+    loudness_normalization: bool = Field(True, env="MUSIC_LOUDNESS_NORMALIZATION")
+    loudness_target_lufs: float = Field(-14.0, env="MUSIC_LOUDNESS_TARGET_LUFS")
+    # 解析に使う FFmpeg の同時実行数（再生の CPU を奪わないよう小さく）
+    loudness_workers: int = Field(1, env="MUSIC_LOUDNESS_WORKERS")
+
+    # 曲間: 次の曲を先に開いておき、曲の切れ目で無音を挟まずに切り替える
+    gapless: bool = Field(True, env="MUSIC_GAPLESS")
+    # クロスフェードの長さ（秒, 0 でギャップレスのみ）。曲の長さが分かっている曲同士で有効
+    crossfade_seconds: float = Field(0.0, env="MUSIC_CROSSFADE_SECONDS")
+
+    # PO Token: "server" なら bgutil の HTTP サーバーを常駐させて使い回す（使えない間は generate_once.js）、"script" なら毎回スクリプトを起動
+    pot_provider_mode: str = Field("server", env="MUSIC_POT_PROVIDER_MODE")
+    pot_server_port: int = Field(4416, env="MUSIC_POT_SERVER_PORT")
+    # サーバーが発行したトークンを使い回す期間（時間）
+    pot_token_ttl_hours: int = Field(6, env="MUSIC_POT_TOKEN_TTL_HOURS")
+
     model_config = {"env_prefix": "MUSIC_"}
 
 class DatabaseSettings(BaseSettings):
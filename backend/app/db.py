@@ -1,6 +1,6 @@
 import sqlite3
 import re
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel
 
@@ -63,6 +63,63 @@ def init_db():
         conn.execute("CREATE INDEX IF NOT EXISTS idx_hist_guild_time ON play_history(guild_id, played_at DESC)")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_hist_guild_user ON play_history(guild_id, added_by_id)")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_hist_guild_video ON play_history(guild_id, video_id)")
+        # yt-dlp で取得した曲のメタデータ（曲追加時に extract_info を省くためのキャッシュ）
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS track_metadata (
+            video_id    TEXT PRIMARY KEY,
+            title       TEXT NOT NULL,
+            uploader    TEXT,
+            thumbnail   TEXT,
+            duration    REAL,
+            webpage_url TEXT NOT NULL,
+            updated_at  TEXT NOT NULL
+        )
+        """)
+        # 曲ごとのラウドネス解析結果（key は YouTube の video_id または upload:<アップロードID>）。
+        # integrated_lufs が NULL の行は「解析できない曲」（無音・loudnorm が結果を出さない等）の印で、再解析しない
+        _create_track_loudness(conn)
+        columns = {row[1]: row for row in conn.execute("PRAGMA table_info(track_loudness)")}
+        if columns["integrated_lufs"][3]:
+            # 旧スキーマ（integrated_lufs が NOT NULL）は印を入れられないので作り直す
+            conn.execute("ALTER TABLE track_loudness RENAME TO track_loudness_old")
+            _create_track_loudness(conn)
+            conn.execute(
+                "INSERT INTO track_loudness (key, integrated_lufs, true_peak_db, gain_db, analyzed_at) "
+                "SELECT key, integrated_lufs, true_peak_db, gain_db, analyzed_at FROM track_loudness_old"
+            )
+            conn.execute("DROP TABLE track_loudness_old")
+        # キーワード検索（/play にキーワード）→ video_id の対応。同じキーワードの再検索を省く
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS search_resolutions (
+            query       TEXT PRIMARY KEY,
+            video_id    TEXT NOT NULL,
+            resolved_at TEXT NOT NULL
+        )
+        """)
+        # yt-dlp の抽出設定（フォーマット/player_client/クッキー）ごとの成否と所要時間。再起動後も良い設定から試すため
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS extraction_samples (
+            id          INTEGER PRIMARY KEY,
+            config_key  TEXT NOT NULL,
+            ok          INTEGER NOT NULL,
+            latency     REAL NOT NULL,
+            recorded_at TEXT NOT NULL
+        )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_extraction_samples_time ON extraction_samples(recorded_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_extraction_samples_key ON extraction_samples(config_key, id)")
+
+
+def _create_track_loudness(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS track_loudness (
+        key            TEXT PRIMARY KEY,
+        integrated_lufs REAL,
+        true_peak_db   REAL,
+        gain_db        REAL NOT NULL,
+        analyzed_at    TEXT NOT NULL
+    )
+    """)
 
 
 # ---------------------------------------------------------------------------
@@ -158,6 +215,163 @@ def get_top_tracks(guild_id: str, days: int = 30, limit: int = 10) -> List[Dict[
     return [dict(r) for r in rows]
 
 
+def get_play_stats_by_video() -> Dict[str, Dict[str, Any]]:
+    """全サーバー合計の video_id ごとの再生回数と最終再生時刻（キャッシュ掃除の優先度付け用）"""
+    with _connect() as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            """
+            SELECT video_id, COUNT(*) AS play_count, MAX(played_at) AS last_played_at
+            FROM play_history
+            WHERE video_id IS NOT NULL
+            GROUP BY video_id
+            """
+        ).fetchall()
+    return {r["video_id"]: {"play_count": r["play_count"], "last_played_at": r["last_played_at"]} for r in rows}
+
+
+# ---------------------------------------------------------------------------
+# 曲のメタデータキャッシュ
+# ---------------------------------------------------------------------------
+
+def upsert_track_metadata(rows: List[Dict[str, Any]]) -> None:
+    """{video_id, title, uploader, thumbnail, duration, webpage_url} をまとめて保存する"""
+    if not rows:
+        return
+    now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    with _connect() as conn:
+        conn.executemany(
+            """
+            INSERT INTO track_metadata (video_id, title, uploader, thumbnail, duration, webpage_url, updated_at)
+            VALUES (:video_id, :title, :uploader, :thumbnail, :duration, :webpage_url, :updated_at)
+            ON CONFLICT(video_id) DO UPDATE SET
+              title = excluded.title,
+              uploader = excluded.uploader,
+              thumbnail = excluded.thumbnail,
+              duration = COALESCE(excluded.duration, track_metadata.duration),
+              webpage_url = excluded.webpage_url,
+              updated_at = excluded.updated_at
+            """,
+            [{**row, "updated_at": now} for row in rows],
+        )
+
+
+def get_track_metadata(video_id: str, max_age_hours: int) -> Optional[Dict[str, Any]]:
+    """max_age_hours 以内に保存されたメタデータを返す（なければ None）"""
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=max_age_hours)).isoformat(timespec="seconds")
+    with _connect() as conn:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute(
+            """
+            SELECT video_id, title, uploader, thumbnail, duration, webpage_url
+            FROM track_metadata
+            WHERE video_id = ? AND updated_at >= ?
+            """,
+            (video_id, cutoff),
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def upsert_search_resolution(query: str, video_id: str) -> None:
+    with _connect() as conn:
+        conn.execute(
+            """
+            INSERT INTO search_resolutions (query, video_id, resolved_at) VALUES (?, ?, ?)
+            ON CONFLICT(query) DO UPDATE SET video_id = excluded.video_id, resolved_at = excluded.resolved_at
+            """,
+            (query, video_id, datetime.now(timezone.utc).isoformat(timespec="seconds")),
+        )
+
+
+def get_search_resolution(query: str, max_age_hours: int) -> Optional[str]:
+    """max_age_hours 以内に解決したキーワードの video_id（なければ None）"""
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=max_age_hours)).isoformat(timespec="seconds")
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT video_id FROM search_resolutions WHERE query = ? AND resolved_at >= ?",
+            (query, cutoff),
+        ).fetchone()
+    return row[0] if row else None
+
+
+# ---------------------------------------------------------------------------
+# ラウドネス解析結果
+# ---------------------------------------------------------------------------
+
+def upsert_track_loudness(
+    key: str, integrated_lufs: Optional[float], true_peak_db: Optional[float], gain_db: float
+) -> None:
+    """解析結果を保存する。integrated_lufs が None なら解析できない曲の印（gain_db は 0.0）"""
+    with _connect() as conn:
+        conn.execute(
+            """
+            INSERT INTO track_loudness (key, integrated_lufs, true_peak_db, gain_db, analyzed_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+              integrated_lufs = excluded.integrated_lufs,
+              true_peak_db = excluded.true_peak_db,
+              gain_db = excluded.gain_db,
+              analyzed_at = excluded.analyzed_at
+            """,
+            (key, integrated_lufs, true_peak_db, gain_db, datetime.now(timezone.utc).isoformat(timespec="seconds")),
+        )
+
+
+def get_all_track_loudness() -> Dict[str, Dict[str, Any]]:
+    """全曲の解析結果（起動時にメモリへ読み込む）"""
+    with _connect() as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute("SELECT key, integrated_lufs, true_peak_db, gain_db FROM track_loudness").fetchall()
+    return {r["key"]: dict(r) for r in rows}
+
+
+def delete_track_loudness(key: str) -> None:
+    with _connect() as conn:
+        conn.execute("DELETE FROM track_loudness WHERE key = ?", (key,))
+
+
+# ---------------------------------------------------------------------------
+# 抽出設定ごとの成否
+# ---------------------------------------------------------------------------
+
+def add_extraction_sample(config_key: str, ok: bool, latency: float, keep: int) -> None:
+    """記録を1件足し、その設定の記録は新しい方から keep 件だけ残す（長く動かしても表が大きくならない）"""
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO extraction_samples (config_key, ok, latency, recorded_at) VALUES (?, ?, ?, ?)",
+            (config_key, int(ok), latency, datetime.now(timezone.utc).isoformat(timespec="seconds")),
+        )
+        conn.execute(
+            """
+            DELETE FROM extraction_samples
+            WHERE config_key = ? AND id <= (
+              SELECT id FROM extraction_samples WHERE config_key = ? ORDER BY id DESC LIMIT 1 OFFSET ?
+            )
+            """,
+            (config_key, config_key, keep),
+        )
+
+
+def get_extraction_samples(max_age_hours: int, per_key_limit: int) -> List[Dict[str, Any]]:
+    """max_age_hours 以内の記録を、設定ごとに新しい方から per_key_limit 件まで古い順で返す（古い記録は削除する）"""
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=max_age_hours)).isoformat(timespec="seconds")
+    with _connect() as conn:
+        conn.execute("DELETE FROM extraction_samples WHERE recorded_at < ?", (cutoff,))
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            """
+            SELECT config_key, ok, latency, recorded_at FROM (
+              SELECT *, ROW_NUMBER() OVER (PARTITION BY config_key ORDER BY id DESC) AS rn
+              FROM extraction_samples
+            )
+            WHERE rn <= ?
+            ORDER BY id
+            """,
+            (per_key_limit,),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
 def get_history_stats(guild_id: str, days: int = 30) -> Dict[str, Any]:
     days = max(1, min(int(days), 3650))
     with _connect() as conn:
@@ -1,15 +1,23 @@
 # main.py
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, BackgroundTasks, Request, Form, File, UploadFile
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, BackgroundTasks, Request, Form, File, UploadFile, Query
 import uuid
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional, Dict
 import asyncio
 import json
 from .bot import client, music_players, register_notify_clients
-from .services.music_player import MusicPlayer, Song
+from .services.music_player import MusicPlayer, Song, StaleQueueEntryError, evict_audio_cache
+from .services.audio_cache import get_audio_cache
+from .services.loudness import get_loudness_analyzer, schedule_loudness_analysis
+from .services.pot_provider import get_pot_provider_server
+from .services.extraction_scheduler import get_extraction_scheduler
+from .services.extraction_errors import PermanentExtractionError, get_failure_cache
+from .services.hedging import get_hedged_runner
+from .services.extraction_strategy import get_extraction_strategy
 from .schemas import (
     User, Track, QueueItem, SearchItem, SearchResult, Server, VoiceChannel,
-    AddUrlRequest, PlayTrackRequest, ReorderRequest, SongResponse
+    AddUrlRequest, AddTracksRequest, PlayTrackRequest, ReorderRequest, SongResponse,
+    RemoveQueueEntryRequest, MoveQueueEntryRequest, QueueBatchRequest,
 )
 import yt_dlp
 import uvicorn
@@ -111,7 +119,38 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"データベースの初期化中にエラーが発生しました: {e}")
         raise
+
+    try:
+        # 抽出設定ごとの実績を読み込み、前回うまくいっていた設定から試す
+        await asyncio.to_thread(get_extraction_strategy().load)
+    except Exception as e:
+        print(f"抽出設定の実績の読み込み中にエラーが発生しました: {e}")
+
+    try:
+        # music/ のキャッシュ索引を1回だけ構築（以降の再生時はディレクトリを走査しない）
+        await asyncio.to_thread(get_audio_cache().build)
+    except Exception as e:
+        print(f"キャッシュ索引の構築中にエラーが発生しました（再生時に再試行します）: {e}")
+
+    analyzer = get_loudness_analyzer()
+    if analyzer is not None:
+        try:
+            # ラウドネス解析結果をメモリへ（読み込めなくても未解析として正規化なしで再生される）
+            await asyncio.to_thread(analyzer.load)
+        except Exception as e:
+            print(f"ラウドネス解析結果の読み込み中にエラーが発生しました: {e}")
     
+    # PO Token サーバーを起動（起動できなくても抽出はスクリプト方式で動く）
+    pot_server = get_pot_provider_server()
+    if pot_server is not None:
+        try:
+            await pot_server.start()
+        except Exception as e:
+            print(f"PO Token サーバーの起動中にエラーが発生しました: {e}")
+        pot_task = asyncio.create_task(pot_server.supervise())
+        background_tasks.add(pot_task)
+        pot_task.add_done_callback(background_tasks.discard)
+
     # Discordボットをバックグラウンドタスクとして起動
     discord_task = None
     try:
@@ -129,6 +168,11 @@ async def lifespan(app: FastAPI):
         print(f"Discordボットの起動中にエラーが発生しました: {e}")
         print("Discordボット無しでWebAPIサーバーのみ起動します。")
     
+    # music/ キャッシュの定期掃除（起動直後にも1回）
+    cache_task = asyncio.create_task(_cache_maintenance_loop())
+    background_tasks.add(cache_task)
+    cache_task.add_done_callback(background_tasks.discard)
+
     # アプリケーションで背景タスクを管理できるように設定
     app.state.background_tasks = background_tasks
     
@@ -174,6 +218,10 @@ async def lifespan(app: FastAPI):
                     print(f"音楽プレイヤーのシャットダウンエラー (guild: {guild_id}): {e}")
             music_players.clear()
         
+        if pot_server is not None:
+            await pot_server.stop()
+            print("PO Token サーバーを停止しました。")
+
         # WebSocket接続をクリーンアップ
         if active_connections:
             print("WebSocket接続をクリーンアップします...")
@@ -190,6 +238,19 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"シャットダウン中にエラーが発生しました: {e}")
 
+async def _cache_maintenance_loop():
+    """キャッシュを容量予算内に保つ定期ジョブ"""
+    from .config import get_settings
+    interval = max(1, get_settings().music.cache_eviction_interval_minutes) * 60
+    while True:
+        try:
+            await evict_audio_cache("定期")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"キャッシュ掃除中にエラーが発生しました: {e}")
+        await asyncio.sleep(interval)
+
 app = FastAPI(lifespan=lifespan)
 
 # ここでアップロード先ディレクトリを静的ファイルとして公開する
@@ -308,10 +369,14 @@ async def build_player_state(guild_id: str, *, bump_version: bool) -> dict:
         epoch = player.state_epoch
         head = player.queue[0] if player.queue else None
         is_loading = bool(getattr(player, "is_preparing", False)) or bool(head is not None and getattr(head, "pending", False))
+        position = player.get_position()
+        duration = player.get_duration()
     else:
         version = 0
         epoch = None
         is_loading = False
+        position = 0.0
+        duration = None
 
     return {
         "current_track": jsonable_encoder(current_track),
@@ -319,6 +384,8 @@ async def build_player_state(guild_id: str, *, bump_version: bool) -> dict:
         "is_playing": is_playing_status,
         "is_loading": is_loading,
         "history": jsonable_encoder(history),
+        "position": round(position, 2),  # 再生位置（秒）。timestamp の時点の値
+        "duration": duration,
         "version": version,
         "epoch": epoch,
         "has_player": player is not None,
@@ -372,6 +439,25 @@ async def notify_clients(guild_id: str):
 register_notify_clients(notify_clients)
 
 
+@app.get("/cache-stats")
+async def get_cache_stats():
+    """music/ キャッシュの件数・合計サイズ・形式別内訳"""
+    return await asyncio.to_thread(get_audio_cache().stats)
+
+
+@app.get("/extraction-stats")
+async def get_extraction_stats():
+    """yt-dlp の抽出まわりの状況（スケジューラの待ち行列・記録済みの失敗・ヘッジの所要時間・抽出設定の順位・PO Token サーバー）"""
+    pot_server = get_pot_provider_server()
+    return {
+        "scheduler": get_extraction_scheduler().stats(),
+        "failures": get_failure_cache().stats(),
+        "hedging": get_hedged_runner().stats(),
+        "strategies": get_extraction_strategy().stats(),
+        "pot_provider": pot_server.stats() if pot_server is not None else {"mode": "script"},
+    }
+
+
 @app.get("/player-state/{guild_id}")
 async def get_player_state(guild_id: str):
     """WebSocket の update と同じ形のプレイヤー状態を REST で返す（再接続時・タブ復帰時の再同期用）"""
@@ -437,6 +523,7 @@ async def upload_audio(
         full_path=full_audio_path,
     )
     add_uploaded_song(new_song)
+    schedule_loudness_analysis(None, full_audio_path)
 
     return {"message": "アップロード成功", "song": new_song}
 
@@ -479,6 +566,9 @@ async def delete_uploaded_audio(guild_id: str, song_id: str, user_id: str):
         os.remove(thumb_abs)
 
     delete_uploaded_song(guild_id, song_id)
+    analyzer = get_loudness_analyzer()
+    if analyzer is not None:
+        await asyncio.to_thread(analyzer.forget, f"upload:{song_id}")
     return {"message": "削除成功"}
 
 
@@ -492,6 +582,18 @@ async def set_volume(guild_id: str, volume: float):
         return {"message": "Volume set"}
     raise HTTPException(status_code=404, detail="No active music player found")
 
+@app.post("/seek/{guild_id}")
+async def seek(guild_id: str, position: float = Query(..., ge=0, allow_inf_nan=False)):
+    """再生中の曲の指定位置（秒）へ移動する"""
+    player = music_players.get(guild_id)
+    if not player:
+        raise HTTPException(status_code=404, detail="No active music player found")
+    try:
+        new_position = await player.seek(position)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Seeked", "position": new_position}
+
 @app.get("/bot-guilds")
 async def get_bot_guilds():
     bot_guilds = []
@@ -871,6 +973,64 @@ async def remove_from_queue(guild_id: str, position: int):
             raise HTTPException(status_code=422, detail="Invalid position")
     raise HTTPException(status_code=404, detail="No active music player found")
 
+# /queue/{guild_id}/batch で1回に受け付ける操作の数と、/add-tracks/{guild_id} で1回に追加できる曲数
+MAX_QUEUE_BATCH_OPERATIONS = 500
+MAX_BULK_ENQUEUE_TRACKS = 500
+
+
+def _stale_queue_edit(player: MusicPlayer) -> HTTPException:
+    """ID で指定した曲がもう無い（他のクライアントの操作や再生の進行で消えた）ときの 409。現在の version を返す"""
+    return HTTPException(status_code=409, detail={
+        "message": "Queue entry not found",
+        "version": player.get_version(),
+        "epoch": player.state_epoch,
+    })
+
+
+@app.post("/queue/{guild_id}/remove")
+async def remove_queue_entry(guild_id: str, request: RemoveQueueEntryRequest):
+    """キュー項目を ID で削除する（位置がずれていても指定した曲だけを消す）"""
+    player = music_players.get(guild_id)
+    if not player:
+        raise HTTPException(status_code=404, detail="No active music player found")
+    if not await player.remove_entry(request.entry_id):
+        raise _stale_queue_edit(player)
+    await notify_clients(guild_id)
+    return {"message": "Track removed from queue", "version": player.get_version()}
+
+
+@app.post("/queue/{guild_id}/move")
+async def move_queue_entry(guild_id: str, request: MoveQueueEntryRequest):
+    """キュー項目を ID で指定した曲の直後へ移す（after_id が無ければ次に再生）"""
+    player = music_players.get(guild_id)
+    if not player:
+        raise HTTPException(status_code=404, detail="No active music player found")
+    if not await player.move_entry(request.entry_id, request.after_id):
+        raise _stale_queue_edit(player)
+    await notify_clients(guild_id)
+    return {"message": "Queue reordered", "version": player.get_version()}
+
+
+@app.post("/queue/{guild_id}/batch")
+async def batch_queue_operations(guild_id: str, request: QueueBatchRequest):
+    """キューへの複数の操作（insert/remove/move/clear/shuffle）をまとめて適用し、通知は1回だけ行う。
+    1つでも失敗したらキューは元のまま（ID が見つからなければ 409、内容がおかしければ 422）"""
+    player = music_players.get(guild_id)
+    if not player:
+        raise HTTPException(status_code=404, detail="No active music player found")
+    if len(request.operations) > MAX_QUEUE_BATCH_OPERATIONS:
+        raise HTTPException(status_code=422, detail=f"Too many operations (max {MAX_QUEUE_BATCH_OPERATIONS})")
+    operations = [operation.dict() for operation in request.operations]
+    try:
+        inserted = await player.apply_queue_operations(operations, added_by=request.user)
+    except StaleQueueEntryError:
+        raise _stale_queue_edit(player)
+    except (ValueError, PermanentExtractionError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    await notify_clients(guild_id)
+    return {"message": "Queue updated", "version": player.get_version(), "inserted": inserted}
+
+
 @app.get("/servers", response_model=List[Server])
 async def get_servers():
     return [Server(id=str(guild.id), name=guild.name) for guild in client.guilds]
@@ -1028,7 +1188,8 @@ async def get_queue(guild_id: str):
                         pending=bool(getattr(item, "pending", False)) or None,
                     ),
                     position=i,
-                    isCurrent=(i == 0)
+                    isCurrent=(i == 0),
+                    id=item.entry_id,
                 )
             )
         return queue_items
@@ -1043,6 +1204,20 @@ async def is_playing(guild_id: str):
 async def play_track(guild_id: str, request: PlayTrackRequest, background_tasks: BackgroundTasks):
     track = request.track
     track.added_by = request.user
+    player = music_players.get(guild_id)
+    if player:
+        # 検索結果の曲情報をそのまま使ってすぐにキューへ入れる（yt-dlp は音源準備のときだけ）
+        try:
+            entry_id = await player.add_track_to_queue(
+                {"url": track.url, "title": track.title, "artist": track.artist, "thumbnail": track.thumbnail},
+                added_by=track.added_by,
+            )
+        except PermanentExtractionError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except ValueError:
+            pass  # 単曲の動画 URL ではない（プレイリスト・ローカルファイルなど）→ 従来どおり情報を取得してから追加
+        else:
+            return {"message": "Track added to queue", "id": entry_id}
     async def add_track_task():
         try:
             player = music_players.get(guild_id)
@@ -1234,6 +1409,19 @@ async def add_url(guild_id: str, request: AddUrlRequest, background_tasks: Backg
     background_tasks.add_task(add_url_task)
     return {"message": "URL is being processed and will be added to queue soon"}
 
+@app.post("/add-tracks/{guild_id}")
+async def add_tracks(guild_id: str, request: AddTracksRequest):
+    """複数の曲（アルバム/プレイリストの全曲など）をまとめてキューへ追加する。
+    プレースホルダを全曲分すぐに入れて返し、各曲の情報は並行数を抑えてバックグラウンドで取得する"""
+    player = music_players.get(guild_id)
+    if not player:
+        raise HTTPException(status_code=404, detail="No active music player found")
+    if len(request.tracks) > MAX_BULK_ENQUEUE_TRACKS:
+        raise HTTPException(status_code=422, detail=f"Too many tracks (max {MAX_BULK_ENQUEUE_TRACKS})")
+    tracks = [{"url": t.url, "title": t.title, "artist": t.artist, "thumbnail": t.thumbnail} for t in request.tracks]
+    entry_ids = await player.add_many_to_queue(tracks, added_by=request.user)
+    return {"message": f"{len(entry_ids)} tracks are being added to queue", "ids": entry_ids}
+
 @app.post("/reorder-queue/{guild_id}")
 async def reorder_queue(guild_id: str, reorder_request: ReorderRequest):
     player = music_players.get(guild_id)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import List, Literal, Optional, Dict
 
 class User(BaseModel):
     id: str
@@ -19,6 +19,7 @@ class QueueItem(BaseModel):
     track: Track
     position: int
     isCurrent: bool = False
+    id: Optional[str] = None  # キュー内で変わらないエントリ ID（位置が変わっても同じ曲を指す）
 
 class SearchItem(BaseModel):
     type: str  # 'song', 'video', 'album', 'playlist', 'artist'
@@ -49,10 +50,31 @@ class PlayTrackRequest(BaseModel):
     track: Track
     user: Optional[User] = None
     
+class AddTracksRequest(BaseModel):
+    tracks: List[Track]  # この順でキューの末尾へ入れる（url 以外は情報取得中の表示に使う）
+    user: Optional[User] = None
+
 class ReorderRequest(BaseModel):
     start_index: int
     end_index: int
 
+class RemoveQueueEntryRequest(BaseModel):
+    entry_id: str
+
+class MoveQueueEntryRequest(BaseModel):
+    entry_id: str
+    after_id: Optional[str] = None  # この曲の直後へ移す（None なら再生中の曲の直後 = 次に再生）
+
+class QueueOperation(BaseModel):
+    op: Literal['insert', 'remove', 'move', 'clear', 'shuffle']
+    entry_id: Optional[str] = None  # remove / move の対象
+    after_id: Optional[str] = None  # insert / move の位置（insert は None なら末尾、move は None なら次に再生）
+    tracks: Optional[List[Track]] = None  # insert する曲（単曲の YouTube URL）
+
+class QueueBatchRequest(BaseModel):
+    operations: List[QueueOperation]
+    user: Optional[User] = None  # insert した曲の追加者
+
 # レスポンス用のモデル
 class SongResponse(BaseModel):
     id: str
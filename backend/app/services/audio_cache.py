@@ -0,0 +1,342 @@
+"""
+music/ ディレクトリのキャッシュ索引
+
+起動時に1回だけディレクトリを走査し、video_id → キャッシュファイルの対応をメモリ上に持つ。
+以降の検索は辞書引きだけで SD カードに触れない。ダウンロード完了のたびに追加され、
+キャッシュ掃除や統計など他のコンポーネントからも get_audio_cache() で参照できる。
+
+走査時に書き込み途中（.part 等）・0 バイト・先頭バイトが形式と一致しない壊れたファイルは削除する。
+容量予算（合計上限・最低空き容量）を超えたら、再生頻度と新しさから見て価値の低い順に削除する（evict）。
+"""
+
+import os
+import re
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from ..config import get_settings
+from ..logging import get_logger
+from .cache_fill import find_active_fill, get_active_fill
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+# yt-dlp の outtmpl は %(title)s-%(id)s.%(ext)s。YouTube の ID は 11 文字（- を含み得る）
+_YOUTUBE_NAME_RE = re.compile(r"^.*-(?P<id>[0-9A-Za-z_-]{11})\.(?P<ext>[0-9A-Za-z]+)$")
+_GENERIC_NAME_RE = re.compile(r"^.*-(?P<id>[^-.]+)\.(?P<ext>[0-9A-Za-z]+)$")
+
+# ダウンロード途中/一時ファイルの拡張子
+_PARTIAL_SUFFIXES = (".part", ".ytdl", ".temp", ".tmp")
+
+# 形式ごとの先頭バイト（オフセット, マジック）。一致しなければ壊れたファイルとして扱う
+_MAGIC: Dict[str, tuple] = {
+    "webm": (0, b"\x1a\x45\xdf\xa3"),
+    "mkv": (0, b"\x1a\x45\xdf\xa3"),
+    "mka": (0, b"\x1a\x45\xdf\xa3"),
+    "m4a": (4, b"ftyp"),
+    "mp4": (4, b"ftyp"),
+    "ogg": (0, b"OggS"),
+    "opus": (0, b"OggS"),
+    "flac": (0, b"fLaC"),
+    "wav": (0, b"RIFF"),
+}
+
+# これより小さい音声ファイルは中断されたダウンロードとみなす
+_MIN_VALID_SIZE = 1024
+
+
+@dataclass
+class CacheEntry:
+    """キャッシュ済みの1曲"""
+    video_id: str
+    path: str
+    size: int
+    format: str  # 拡張子（webm / m4a など）
+    last_access: float  # UNIX 時刻
+
+
+def parse_cache_filename(name: str) -> Optional[tuple]:
+    """キャッシュファイル名から (video_id, 拡張子) を取り出す。該当しなければ None"""
+    m = _YOUTUBE_NAME_RE.match(name) or _GENERIC_NAME_RE.match(name)
+    if not m:
+        return None
+    return m.group("id"), m.group("ext").lower()
+
+
+def is_valid_audio_file(path: str, ext: str, size: int) -> bool:
+    """サイズと先頭バイトで壊れていないかを簡易チェックする（デコードはしない）"""
+    if size < _MIN_VALID_SIZE:
+        return False
+    try:
+        with open(path, "rb") as f:
+            head = f.read(12)
+    except OSError:
+        return False
+    if ext == "mp3":
+        return head.startswith(b"ID3") or (len(head) >= 2 and head[0] == 0xFF and (head[1] & 0xE0) == 0xE0)
+    magic = _MAGIC.get(ext)
+    if magic is None:
+        return True  # 未知の形式はサイズだけで判断
+    offset, expected = magic
+    return head[offset:offset + len(expected)] == expected
+
+
+class AudioCacheIndex:
+    """video_id → キャッシュファイルの索引（スレッドセーフ）"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._entries: Dict[str, CacheEntry] = {}
+        self._lock = threading.Lock()
+        self._built = False
+        self.last_eviction: Optional[Dict[str, Any]] = None
+
+    def build(self) -> None:
+        """ディレクトリを1回走査して索引を作り直す（同期。起動時に asyncio.to_thread で呼ぶ）"""
+        started = time.monotonic()
+        entries: Dict[str, CacheEntry] = {}
+        removed = 0
+        try:
+            scanner = os.scandir(self.directory)
+        except FileNotFoundError:
+            scanner = None
+        if scanner is not None:
+            with scanner:
+                for dirent in scanner:
+                    if not dirent.is_file(follow_symlinks=False):
+                        continue
+                    path = dirent.path
+                    if dirent.name.endswith(_PARTIAL_SUFFIXES):
+                        # ストリーム再生中の書き込み先は消さない
+                        if get_active_fill(path.rsplit(".", 1)[0]) is None and self._remove(path, "書き込み途中"):
+                            removed += 1
+                        continue
+                    parsed = parse_cache_filename(dirent.name)
+                    if parsed is None:
+                        continue
+                    video_id, ext = parsed
+                    st = dirent.stat()
+                    if not is_valid_audio_file(path, ext, st.st_size):
+                        if self._remove(path, "破損"):
+                            removed += 1
+                        continue
+                    entry = CacheEntry(
+                        video_id=video_id,
+                        path=path,
+                        size=st.st_size,
+                        format=ext,
+                        last_access=max(st.st_atime, st.st_mtime),
+                    )
+                    existing = entries.get(video_id)
+                    if existing is not None:
+                        # 同じ曲が別形式で重複している → 新しい方を残す
+                        older, entry = (existing, entry) if existing.last_access <= entry.last_access else (entry, existing)
+                        if self._remove(older.path, "重複"):
+                            removed += 1
+                    entries[video_id] = entry
+        with self._lock:
+            self._entries = entries
+            self._built = True
+        total = sum(e.size for e in entries.values())
+        logger.info(
+            f"キャッシュ索引を構築: {len(entries)} 曲 / {total / 1024 / 1024:.1f} MB"
+            f"（不正ファイル {removed} 件を削除, {time.monotonic() - started:.2f}s）"
+        )
+
+    def ensure_built(self) -> None:
+        if not self._built:
+            self.build()
+
+    def lookup(self, video_id: str) -> Optional[CacheEntry]:
+        """video_id のキャッシュを返し、最終アクセス時刻を更新する（ファイルシステムには触れない）"""
+        self.ensure_built()
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is not None:
+                entry.last_access = time.time()
+            return entry
+
+    def add(self, video_id: str, path: str) -> Optional[CacheEntry]:
+        """ダウンロード完了したファイルを索引に登録する。壊れていれば登録せず削除する"""
+        if not video_id:
+            return None
+        self.ensure_built()
+        ext = path.rsplit(".", 1)[-1].lower() if "." in os.path.basename(path) else ""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        if not is_valid_audio_file(path, ext, size):
+            self._remove(path, "破損")
+            return None
+        entry = CacheEntry(video_id=video_id, path=path, size=size, format=ext, last_access=time.time())
+        with self._lock:
+            self._entries[video_id] = entry
+        return entry
+
+    def replace_file(self, video_id: str, old_path: str, new_path: str) -> Optional[CacheEntry]:
+        """同じ曲の変換済みファイル（Opus など）へ差し替え、元ファイルを削除する。
+        索引の登録が old_path でなくなっていれば（掃除済みなど）何もせず None"""
+        try:
+            size = os.path.getsize(new_path)
+        except OSError:
+            return None
+        with self._lock:
+            current = self._entries.get(video_id)
+            if current is None or current.path != old_path:
+                return None
+            entry = CacheEntry(
+                video_id=video_id,
+                path=new_path,
+                size=size,
+                format=new_path.rsplit(".", 1)[-1].lower(),
+                last_access=current.last_access,
+            )
+            self._entries[video_id] = entry
+        if old_path != new_path:
+            try:
+                os.remove(old_path)  # 再生中でも開いているファイルハンドルは読み続けられる
+            except OSError as e:
+                logger.warning(f"変換元のキャッシュファイルを削除できませんでした: {old_path}: {e}")
+        return entry
+
+    def discard(self, video_id: str) -> Optional[CacheEntry]:
+        """索引から外す（ファイルが外部で消えていた場合など。ファイル自体は触らない）"""
+        with self._lock:
+            return self._entries.pop(video_id, None)
+
+    def entries(self) -> List[CacheEntry]:
+        """全エントリのスナップショット"""
+        self.ensure_built()
+        with self._lock:
+            return list(self._entries.values())
+
+    def stats(self) -> dict:
+        """件数・合計サイズ・形式別の内訳"""
+        entries = self.entries()
+        by_format: Dict[str, int] = {}
+        for e in entries:
+            by_format[e.format] = by_format.get(e.format, 0) + 1
+        return {
+            "directory": self.directory,
+            "files": len(entries),
+            "total_bytes": sum(e.size for e in entries),
+            "by_format": by_format,
+            "last_eviction": self.last_eviction,
+        }
+
+    def evict(
+        self,
+        *,
+        max_bytes: int,
+        min_free_bytes: int,
+        protected_ids: Set[str],
+        load_play_stats: Callable[[], Dict[str, Dict[str, Any]]],
+        half_life_days: float,
+        is_protected: Optional[Callable[[str], bool]] = None,
+    ) -> Dict[str, Any]:
+        """容量予算を超えている分だけ、価値の低いキャッシュから削除する（同期）。
+
+        予算: 合計 max_bytes 以下（0 で無制限）かつディスク空き min_free_bytes 以上（0 で無視）。
+        価値 = (1 + 再生回数) × 0.5^(最終アクセス/再生からの経過日数 / half_life_days)。
+        protected_ids（キュー・再生中・履歴の曲）は消さない。予算内なら再生統計も読まずに終わる。
+
+        protected_ids は掃除を始める前の写しなので、その後に追加・先読みされた曲を消さないよう1件ずつ消す直前に確かめる:
+        is_protected(video_id) が True の曲、書き込み中の曲、掃除を始めてから lookup() された曲は残す。
+        索引から外してからファイルを消すので、外した後の lookup() はキャッシュ無しとして扱われる。
+        """
+        started = time.time()
+        entries = self.entries()
+        total = sum(e.size for e in entries)
+        need = total - max_bytes if max_bytes > 0 else 0
+        if min_free_bytes > 0:
+            try:
+                free = shutil.disk_usage(self.directory).free
+                need = max(need, min_free_bytes - free)
+            except OSError as e:
+                logger.warning(f"ディスク空き容量の取得に失敗: {e}")
+        result: Dict[str, Any] = {
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "reclaimed_bytes": 0,
+            "removed_files": 0,
+            "skipped_files": 0,
+            "total_bytes": total,
+        }
+        if need <= 0:
+            return result
+
+        play_stats = load_play_stats()
+        now = time.time()
+
+        def _value(entry: CacheEntry) -> float:
+            stats = play_stats.get(entry.video_id) or {}
+            last_used = entry.last_access
+            last_played = stats.get("last_played_at")
+            if last_played:
+                try:
+                    last_used = max(last_used, datetime.fromisoformat(last_played).timestamp())
+                except ValueError:
+                    pass
+            age_days = max(0.0, now - last_used) / 86400
+            return (1 + int(stats.get("play_count") or 0)) * 0.5 ** (age_days / max(half_life_days, 0.1))
+
+        candidates = sorted((e for e in entries if e.video_id not in protected_ids), key=_value)
+        for entry in candidates:
+            if result["reclaimed_bytes"] >= need:
+                break
+            if find_active_fill(entry.video_id) is not None or (is_protected is not None and is_protected(entry.video_id)):
+                result["skipped_files"] += 1
+                continue
+            with self._lock:
+                if self._entries.get(entry.video_id) is not entry or entry.last_access >= started:
+                    # 差し替えられた・掃除を始めてから再生の準備で使われた
+                    result["skipped_files"] += 1
+                    continue
+                del self._entries[entry.video_id]
+            if self._remove(entry.path, "容量超過"):
+                result["reclaimed_bytes"] += entry.size
+                result["removed_files"] += 1
+            else:
+                with self._lock:
+                    self._entries.setdefault(entry.video_id, entry)  # 消せなかったので索引に戻す
+        result["total_bytes"] = total - result["reclaimed_bytes"]
+        if result["reclaimed_bytes"] < need:
+            logger.warning(
+                f"キャッシュ掃除: 保護中の曲を除くと予算まで削減できませんでした"
+                f"（不足 {(need - result['reclaimed_bytes']) / 1024 / 1024:.1f} MB）"
+            )
+        logger.info(
+            f"キャッシュ掃除: {result['removed_files']} 件 / {result['reclaimed_bytes'] / 1024 / 1024:.1f} MB を削除"
+            f"（残り {result['total_bytes'] / 1024 / 1024:.1f} MB）"
+        )
+        self.last_eviction = result
+        return result
+
+    @staticmethod
+    def _remove(path: str, reason: str) -> bool:
+        try:
+            os.remove(path)
+            logger.warning(f"キャッシュファイルを削除（{reason}）: {path}")
+            return True
+        except OSError as e:
+            logger.warning(f"キャッシュファイルの削除に失敗（{reason}）: {path}: {e}")
+            return False
+
+
+# 索引インスタンス（遅延初期化、スレッドセーフ）
+_cache_index: Optional[AudioCacheIndex] = None
+_cache_index_lock = threading.Lock()
+
+
+def get_audio_cache() -> AudioCacheIndex:
+    """プロセス共通のキャッシュ索引を取得する"""
+    global _cache_index
+    if _cache_index is None:
+        with _cache_index_lock:
+            if _cache_index is None:
+                _cache_index = AudioCacheIndex(settings.music.directory)
+    return _cache_index
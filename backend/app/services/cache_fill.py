@@ -0,0 +1,267 @@
+"""
+ストリーム再生しながらキャッシュを作るためのダウンローダー
+
+yt-dlp で抽出した音声ストリーム URL を music/ のキャッシュファイル（.part）へ書き込み、
+書き込み済みの部分をそのまま FFmpeg のパイプ入力として渡す。
+ダウンロードは1回だけで、再生開始はダウンロード完了ではなく最初のチャンク到着まで短縮される。
+ダウンロードは回線速度で先行するので、再生位置がファイル末尾に追いつくことは通常ない。
+途中でストリーム URL が失効（403/410）した場合は再抽出した URL で続きから取得し、
+再生側は書き込み済みのキャッシュファイルを読み続ける。
+"""
+
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import BinaryIO, Callable, Dict, Optional, Tuple
+
+from ..logging import get_logger
+
+logger = get_logger(__name__)
+
+# 再抽出関数: 新しい (ストリーム URL, HTTP ヘッダ) を返す
+RefreshFn = Callable[[], Tuple[str, Dict[str, str]]]
+
+
+class CacheFill:
+    """1曲分のストリーム URL をキャッシュファイルへ書き込むバックグラウンドダウンロード"""
+
+    CHUNK_SIZE = 64 * 1024
+    # YouTube は大きな Range を一度に要求すると帯域制限されるため、yt-dlp と同じく分割して取得する
+    RANGE_SIZE = 10 * 1024 * 1024
+    MAX_NETWORK_RETRIES = 3
+    MAX_REFRESHES = 2
+
+    def __init__(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]],
+        final_path: str,
+        *,
+        refresh: Optional[RefreshFn] = None,
+        total_size: Optional[int] = None,
+        socket_timeout: float = 30.0,
+        on_done: Optional[Callable[["CacheFill"], None]] = None,
+    ):
+        self.url = url
+        self.headers = dict(headers or {})
+        self.final_path = final_path
+        self.part_path = final_path + ".part"
+        self.total_size = total_size
+        self.bytes_written = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._refresh = refresh
+        self._on_done = on_done
+        self._socket_timeout = socket_timeout
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name=f"cache-fill-{os.path.basename(final_path)}", daemon=True
+        )
+
+    # ------------------------------------------------------------------
+    # 状態
+    # ------------------------------------------------------------------
+
+    @property
+    def finished(self) -> bool:
+        """ダウンロードが終わった（成功でも失敗でも）"""
+        return self.done or self.error is not None
+
+    def start(self) -> "CacheFill":
+        self._thread.start()
+        return self
+
+    def wait_for_data(self, timeout: float) -> bool:
+        """最初のデータが書き込まれる（または完了する）まで待つ。失敗していたら例外を投げる"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.bytes_written == 0 and not self.finished:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            if self.error is not None and self.bytes_written == 0:
+                raise self.error
+            return True
+
+    def open_reader(self) -> "CacheFillReader":
+        """書き込み中のキャッシュファイルを先頭から読むリーダーを返す（FFmpeg の pipe 入力用）"""
+        return CacheFillReader(self)
+
+    # ------------------------------------------------------------------
+    # ダウンロード本体（専用スレッド）
+    # ------------------------------------------------------------------
+
+    def _run(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.final_path) or ".", exist_ok=True)
+            with open(self.part_path, "wb") as out:
+                network_failures = 0
+                refreshes = 0
+                while True:
+                    try:
+                        if self._download_range(out):
+                            break
+                        network_failures = 0
+                    except urllib.error.HTTPError as e:
+                        # 署名付き URL の失効 → 再抽出して続きから取得する
+                        if e.code in (403, 410) and self._refresh is not None and refreshes < self.MAX_REFRESHES:
+                            refreshes += 1
+                            logger.warning(f"ストリーム URL が失効したため再抽出します ({e.code}): {self.final_path}")
+                            self.url, self.headers = self._refresh()
+                            continue
+                        raise
+                    except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+                        network_failures += 1
+                        if network_failures > self.MAX_NETWORK_RETRIES:
+                            raise
+                        logger.warning(f"キャッシュ書き込み中の通信エラー（再試行 {network_failures}）: {e}")
+                        time.sleep(network_failures)
+            os.replace(self.part_path, self.final_path)
+            with self._cond:
+                self.done = True
+                self._cond.notify_all()
+            logger.info(f"キャッシュ書き込み完了: {self.final_path} ({self.bytes_written} bytes)")
+            if self._on_done is not None:
+                try:
+                    self._on_done(self)
+                except Exception as e:
+                    logger.warning(f"キャッシュ書き込み完了処理に失敗: {e}")
+        except Exception as e:
+            logger.error(f"キャッシュ書き込みに失敗: {self.final_path}: {e}")
+            try:
+                os.remove(self.part_path)  # 読み込み中のリーダーは開いたファイルハンドルで読み続けられる
+            except OSError:
+                pass
+            with self._cond:
+                self.error = e
+                self._cond.notify_all()
+
+    def _download_range(self, out) -> bool:
+        """続きの1区間を取得して書き込む。ファイル全体を取得し終えたら True"""
+        start = self.bytes_written
+        end = start + self.RANGE_SIZE - 1
+        if self.total_size:
+            end = min(end, self.total_size - 1)
+        request = urllib.request.Request(self.url, headers={**self.headers, "Range": f"bytes={start}-{end}"})
+        with urllib.request.urlopen(request, timeout=self._socket_timeout) as response:
+            ranged = response.status == 206
+            if ranged:
+                content_range = response.headers.get("Content-Range", "")
+                total = content_range.rsplit("/", 1)[-1] if "/" in content_range else ""
+                if total.isdigit():
+                    self.total_size = int(total)
+            elif start > 0:
+                raise urllib.error.URLError("server ignored Range request while resuming")
+            while True:
+                chunk = response.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                out.write(chunk)
+                out.flush()
+                with self._cond:
+                    self.bytes_written += len(chunk)
+                    self._cond.notify_all()
+        if not ranged:
+            return True  # Range 非対応サーバー: 1回のレスポンスで全体を受け取った
+        if self.total_size is not None:
+            return self.bytes_written >= self.total_size
+        return self.bytes_written - start < end - start + 1
+
+
+class CacheFillReader:
+    """書き込み中のキャッシュファイルを、書き込みに追従しながら読むファイルライクオブジェクト
+
+    discord.py の FFmpeg*Audio(pipe=True) は read(n) が空を返すまで stdin へ書き続けるので、
+    未着分はダウンロードを待ち、完了（または失敗）して末尾まで読んだら空を返して終わる。
+    最初のデータを待ちきれずに再生を始めたときは .part がまだ無いことがあるので、ファイルも現れるまで待つ。
+    """
+
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, fill: CacheFill):
+        self._fill = fill
+        self._closed = False
+        self._fh: Optional[BinaryIO] = self._open()
+
+    def _open(self) -> Optional[BinaryIO]:
+        """完了時に .part → 本来の名前へ rename されるため、どちらかを開く（開いた後の rename は読み込みに影響しない）。
+        まだどちらも無ければ None"""
+        for path in (self._fill.part_path, self._fill.final_path):
+            try:
+                return open(path, "rb")
+            except FileNotFoundError:
+                continue
+        return None
+
+    def read(self, size: int = -1) -> bytes:
+        fill = self._fill
+        while not self._closed:
+            if self._fh is None:
+                finished = fill.finished
+                self._fh = self._open()
+                if self._fh is None:
+                    if finished:
+                        return b""  # 書き込みが終わったのにファイルが無い（失敗して削除された）
+                    with fill._cond:
+                        if not fill.finished:
+                            fill._cond.wait(self.POLL_INTERVAL)
+                    continue
+            data = self._fh.read(size)
+            if data:
+                return data
+            with fill._cond:
+                if fill.error is not None:
+                    return b""
+                if fill.done and self._fh.tell() >= fill.bytes_written:
+                    return b""
+                fill._cond.wait(self.POLL_INTERVAL)
+        return b""
+
+    def close(self) -> None:
+        self._closed = True
+        if self._fh is None:
+            return
+        try:
+            self._fh.close()
+        except Exception:
+            pass
+
+
+# 進行中のキャッシュ書き込み（キャッシュファイルのパス単位）。
+# 同じ曲を複数のキュー項目/ギルドが同時に準備したとき、同じ .part へ二重に書き込まないよう共有する
+_active_fills: Dict[str, CacheFill] = {}
+_active_fills_lock = threading.Lock()
+
+
+def get_or_start_fill(final_path: str, factory: Callable[[], CacheFill]) -> CacheFill:
+    """final_path への書き込みが進行中ならそれを返し、なければ factory で作って開始する"""
+    with _active_fills_lock:
+        fill = _active_fills.get(final_path)
+        if fill is not None and not fill.finished:
+            return fill
+        for path in [p for p, f in _active_fills.items() if f.finished]:
+            del _active_fills[path]
+        fill = factory()
+        _active_fills[final_path] = fill
+    fill.start()
+    return fill
+
+
+def get_active_fill(final_path: str) -> Optional[CacheFill]:
+    """final_path への書き込みが進行中なら返す"""
+    with _active_fills_lock:
+        fill = _active_fills.get(final_path)
+    return fill if fill is not None and not fill.finished else None
+
+
+def find_active_fill(video_id: str) -> Optional[CacheFill]:
+    """video_id の曲のキャッシュ書き込みが進行中なら返す（キャッシュ名は %(title)s-%(id)s.%(ext)s）"""
+    marker = f"-{video_id}."
+    with _active_fills_lock:
+        for path, fill in _active_fills.items():
+            if marker in os.path.basename(path) and not fill.finished:
+                return fill
+    return None
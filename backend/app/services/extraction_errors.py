@@ -0,0 +1,159 @@
+"""
+yt-dlp の抽出失敗の分類と、恒久的な失敗の記憶（ネガティブキャッシュ）
+
+非公開・削除済み・地域制限などの動画は何度試しても取得できないのに、以前は音源準備が3回リトライし、
+そのたびにフォーマットのフォールバックも試していたため、1つの URL で最大9回の抽出がワーカーを塞いでいた。
+ここでは失敗を「恒久的（retry しても無駄）」と「一時的（通信・レート制限・ボット判定など）」に分け、
+恒久的な失敗は video_id ごとに一定時間覚えておき、同じ曲の再追加・再準備を抽出せずに即座に失敗させる。
+分類できない失敗は一時的として扱う（誤って覚えると再生できる曲を弾いてしまうため）。
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import yt_dlp
+
+from ..config import get_settings
+from ..logging import get_logger
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+# 恒久的な失敗のメッセージ（小文字で部分一致）→ 理由
+_PERMANENT_PATTERNS: Tuple[Tuple[str, str], ...] = (
+    ("private video", "private"),
+    ("has been removed", "removed"),
+    ("no longer available", "removed"),
+    ("account associated with this video has been terminated", "removed"),
+    ("not available in your country", "geo_restricted"),
+    ("not made this video available in your country", "geo_restricted"),
+    ("members-only", "members_only"),
+    ("join this channel", "members_only"),
+    ("sign in to confirm your age", "age_restricted"),
+    ("unsupported url", "unsupported"),
+    ("is not a valid url", "unsupported"),
+    ("video unavailable", "unavailable"),
+)
+
+# 恒久的なパターンにも当たるが、一時的な失敗として扱うメッセージ（YouTube のレート制限時の文言など）
+_TRANSIENT_OVERRIDES: Tuple[str, ...] = (
+    "try again later",
+)
+
+
+class PermanentExtractionError(Exception):
+    """retry しても取得できない動画（非公開・削除済み・地域制限など）"""
+
+    def __init__(self, message: str, reason: str, video_id: Optional[str] = None):
+        super().__init__(message)
+        self.reason = reason
+        self.video_id = video_id
+
+
+def _root_cause(exc: BaseException) -> BaseException:
+    """DownloadError が包んでいる元の例外（ExtractorError など）"""
+    seen = set()
+    while id(exc) not in seen:
+        seen.add(id(exc))
+        inner = None
+        if isinstance(exc, yt_dlp.utils.DownloadError) and exc.exc_info and exc.exc_info[1] is not None:
+            inner = exc.exc_info[1]
+        inner = inner or exc.__cause__
+        if inner is None:
+            break
+        exc = inner
+    return exc
+
+
+def permanent_reason(exc: BaseException) -> Optional[str]:
+    """恒久的な失敗ならその理由、一時的（または分類できない）なら None"""
+    if isinstance(exc, PermanentExtractionError):
+        return exc.reason
+    cause = _root_cause(exc)
+    if isinstance(cause, yt_dlp.utils.GeoRestrictedError):
+        return "geo_restricted"
+    if isinstance(cause, yt_dlp.utils.UnsupportedError):
+        return "unsupported"
+    message = f"{exc} {cause}".lower()
+    if any(pattern in message for pattern in _TRANSIENT_OVERRIDES):
+        return None
+    for pattern, reason in _PERMANENT_PATTERNS:
+        if pattern in message:
+            return reason
+    return None
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """retry する価値のある失敗か（スケジューラの retry 判定に渡す）"""
+    return permanent_reason(exc) is None
+
+
+class FailureCache:
+    """video_id → 恒久的な失敗（理由・メッセージ）を TTL 付きでメモリに持つ（スレッドセーフ。再起動で消える）"""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[float, str, str]] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, video_id: Optional[str]) -> Optional[PermanentExtractionError]:
+        """覚えている失敗があれば、それを表す例外を返す（期限切れなら忘れる）"""
+        if not video_id or self.ttl_seconds <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is None:
+                return None
+            expires_at, reason, message = entry
+            if expires_at <= time.monotonic():
+                del self._entries[video_id]
+                return None
+        return PermanentExtractionError(message, reason, video_id)
+
+    def check(self, video_id: Optional[str]) -> None:
+        """覚えている失敗があれば抽出せずにその例外を投げる"""
+        error = self.lookup(video_id)
+        if error is not None:
+            logger.info(f"再生できない動画として記録済みのため抽出を省略: {video_id} ({error.reason})")
+            raise error
+
+    def remember(self, video_id: Optional[str], exc: BaseException) -> Optional[PermanentExtractionError]:
+        """恒久的な失敗なら記録して PermanentExtractionError を返す（一時的な失敗なら None）"""
+        reason = permanent_reason(exc)
+        if reason is None:
+            return None
+        error = exc if isinstance(exc, PermanentExtractionError) else PermanentExtractionError(str(exc), reason, video_id)
+        if video_id and self.ttl_seconds > 0:
+            with self._lock:
+                self._entries[video_id] = (time.monotonic() + self.ttl_seconds, reason, str(error))
+            logger.warning(f"再生できない動画として記録: {video_id} ({reason})")
+        return error
+
+    def forget(self, video_id: str) -> None:
+        with self._lock:
+            self._entries.pop(video_id, None)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            reasons: Dict[str, int] = {}
+            for expires_at, reason, _ in self._entries.values():
+                if expires_at > now:
+                    reasons[reason] = reasons.get(reason, 0) + 1
+        return {"entries": sum(reasons.values()), "reasons": reasons}
+
+
+# ネガティブキャッシュ（遅延初期化、スレッドセーフ）
+_failure_cache: Optional[FailureCache] = None
+_failure_cache_lock = threading.Lock()
+
+
+def get_failure_cache() -> FailureCache:
+    """プロセス共通のネガティブキャッシュを取得する"""
+    global _failure_cache
+    if _failure_cache is None:
+        with _failure_cache_lock:
+            if _failure_cache is None:
+                _failure_cache = FailureCache(settings.music.failure_ttl_hours * 3600)
+    return _failure_cache
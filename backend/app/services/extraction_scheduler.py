@@ -0,0 +1,312 @@
+"""
+yt-dlp の抽出/ダウンロードを実行するプロセス共通のスケジューラ
+
+以前は MusicPlayer ごとに ThreadPoolExecutor(max_workers=3) を持っていたため、
+ギルド数に比例してスレッドが増え、Raspberry Pi の少ないコアを yt-dlp が奪い合っていた。
+ここでは全ギルドで固定数のワーカースレッドを共有し、次の順で仕事を取り出す:
+
+1. 優先度クラス（ユーザーが待っている曲追加 > キュー先頭の準備 > 先読み > ウォームアップ）
+2. 同じ優先度の中ではギルドごとのラウンドロビン（大きなプレイリストを追加したギルドが他を待たせない）
+
+submit() は asyncio.Future を返す。開始前にキャンセルされた仕事は実行しない
+（開始後のスレッドは止められないので、結果を捨てるだけ）。
+retry を渡した仕事は、一時的な失敗なら待ち時間を置いて同じ Future のまま並び直す。
+待ち時間はイベントループのタイマーで数えるので、待っている間ワーカースレッドは他の仕事をする。
+
+ヘッジ（hedging.py）の予備の抽出は borrow_slot() でワーカー1つ分の枠を借りて走らせ、実行中の仕事と借りた枠の合計が
+max_workers を超えないようにする（空きが無ければヘッジしない）。借りた枠は予備と主の両方が終わるまで返さないので、
+負けて走り続ける yt-dlp も数に入る。
+"""
+
+import asyncio
+import itertools
+import threading
+from collections import OrderedDict, deque
+from enum import IntEnum
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from ..config import get_settings
+from ..logging import get_logger
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+
+class JobPriority(IntEnum):
+    """仕事の優先度（小さいほど先に実行）"""
+    INTERACTIVE = 0  # ユーザーが応答を待っている曲追加・検索
+    HEAD = 1  # キュー先頭（次に再生する曲）の準備
+    PREFETCH = 2  # 再生中に後続の曲を準備する先読み
+    WARMUP = 3  # 起動時などの下準備（急がない）
+
+
+# retry の待ち時間（1回目の失敗後。以降は倍々）
+RETRY_BASE_DELAY_SECONDS = 1.0
+
+
+class _Job:
+    __slots__ = (
+        "seq", "fn", "args", "future", "loop", "guild_id", "priority", "label",
+        "retry", "max_attempts", "attempt", "waiting",
+    )
+
+    def __init__(self, seq, fn, args, future, loop, guild_id, priority, label, retry=None, max_attempts=1):
+        self.seq = seq
+        self.fn = fn
+        self.args = args
+        self.future = future
+        self.loop = loop
+        self.guild_id = guild_id
+        self.priority = priority
+        self.label = label
+        self.retry = retry
+        self.max_attempts = max_attempts
+        self.attempt = 0
+        self.waiting = False  # retry の待ち時間中（待ち行列には入っていない）
+
+
+class ExtractionScheduler:
+    """優先度付き・ギルド間で公平なワーカープール"""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max(1, max_workers)
+        # 優先度 → (ギルド → 待ち行列)。OrderedDict の先頭のギルドから順に1件ずつ取り出す
+        self._queues: Dict[JobPriority, "OrderedDict[str, Deque[_Job]]"] = {p: OrderedDict() for p in JobPriority}
+        self._jobs: Dict[int, _Job] = {}  # id(future) → 未開始の仕事
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._threads: List[threading.Thread] = []
+        self._running = 0
+        self._borrowed = 0  # ヘッジが借りている枠
+
+    # ------------------------------------------------------------------
+    # 投入・変更（イベントループから呼ぶ）
+    # ------------------------------------------------------------------
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        priority: JobPriority,
+        guild_id: str,
+        label: str = "",
+        retry: Optional[Callable[[BaseException], bool]] = None,
+        max_attempts: int = 1,
+    ) -> asyncio.Future:
+        """fn(*args) をワーカーで実行する Future を返す。
+        retry(例外) が True を返す失敗は、合計 max_attempts 回まで間隔を空けて実行し直す"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        job = _Job(
+            next(self._seq), fn, args, future, loop, guild_id, priority,
+            label or getattr(fn, "__name__", ""), retry, max(1, max_attempts),
+        )
+        with self._cond:
+            self._enqueue(job)
+            self._jobs[id(future)] = job
+            self._ensure_workers()
+            self._cond.notify()
+        future.add_done_callback(self._on_future_done)
+        return future
+
+    def promote(self, future: asyncio.Future, priority: JobPriority) -> None:
+        """まだ始まっていない仕事の優先度を上げる（先読み中の曲がキュー先頭になったときなど）"""
+        with self._cond:
+            job = self._jobs.get(id(future))
+            if job is None or job.priority <= priority:
+                return
+            if job.waiting:
+                job.priority = priority  # 並び直すときにこの優先度で入る
+                return
+            self._remove(job)
+            job.priority = priority
+            self._enqueue(job, front=True)
+
+    def cancel(self, future: asyncio.Future) -> bool:
+        """まだ始まっていない仕事（retry の待ち時間中を含む）を取り消す。始まっていた・終わっていたら False"""
+        with self._cond:
+            job = self._jobs.pop(id(future), None)
+            if job is None:
+                return False
+            if not job.waiting:
+                self._remove(job)
+        future.cancel()
+        return True
+
+    def cancel_guild(self, guild_id: str) -> int:
+        """ギルドの未開始の仕事をすべてキャンセルする（プレイヤー終了時）。キャンセルした件数を返す"""
+        with self._cond:
+            jobs = [job for by_guild in self._queues.values() for job in by_guild.pop(guild_id, ())]
+            jobs.extend(job for job in self._jobs.values() if job.waiting and job.guild_id == guild_id)
+            for job in jobs:
+                self._jobs.pop(id(job.future), None)
+        for job in jobs:
+            job.loop.call_soon_threadsafe(job.future.cancel)
+        return len(jobs)
+
+    def stats(self) -> dict:
+        with self._cond:
+            pending = {p.name.lower(): sum(len(q) for q in self._queues[p].values()) for p in JobPriority}
+            retrying = sum(1 for job in self._jobs.values() if job.waiting)
+            return {
+                "workers": self.max_workers, "running": self._running, "borrowed": self._borrowed,
+                "pending": pending, "retrying": retrying,
+            }
+
+    def borrow_slot(self) -> bool:
+        """空いているワーカー1つ分の枠を借りる（ヘッジの予備用。空きが無ければ False）。返すまで新しい仕事はその分始まらない"""
+        with self._cond:
+            if self._running + self._borrowed >= self.max_workers:
+                return False
+            self._borrowed += 1
+            return True
+
+    def release_slot(self) -> None:
+        """borrow_slot() で借りた枠を返す"""
+        with self._cond:
+            self._borrowed -= 1
+            self._cond.notify()
+
+    # ------------------------------------------------------------------
+    # 内部処理
+    # ------------------------------------------------------------------
+
+    def _enqueue(self, job: _Job, front: bool = False) -> None:
+        by_guild = self._queues[job.priority]
+        queue = by_guild.get(job.guild_id)
+        if queue is None:
+            queue = by_guild[job.guild_id] = deque()
+        if front:
+            queue.appendleft(job)
+        else:
+            queue.append(job)
+
+    def _remove(self, job: _Job) -> None:
+        by_guild = self._queues[job.priority]
+        queue = by_guild.get(job.guild_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(job)
+        except ValueError:
+            return
+        if not queue:
+            del by_guild[job.guild_id]
+
+    def _on_future_done(self, future: asyncio.Future) -> None:
+        if not future.cancelled():
+            return
+        # 開始前にキャンセルされた → 待ち行列から外す
+        with self._cond:
+            job = self._jobs.pop(id(future), None)
+            if job is not None:
+                self._remove(job)
+
+    def _take(self) -> Optional[_Job]:
+        """優先度順・ギルドのラウンドロビンで次の仕事を取り出す（ロック取得済み）"""
+        for priority in JobPriority:
+            by_guild = self._queues[priority]
+            while by_guild:
+                guild_id, queue = next(iter(by_guild.items()))
+                job = queue.popleft()
+                if queue:
+                    by_guild.move_to_end(guild_id)  # 次は別のギルドの番
+                else:
+                    del by_guild[guild_id]
+                if self._jobs.pop(id(job.future), None) is None:
+                    continue  # キャンセル済み
+                return job
+        return None
+
+    def _take_if_free(self) -> Optional[_Job]:
+        """ヘッジに貸している分を除いて枠が空いていれば、次の仕事を取り出す（ロック取得済み）"""
+        if self._running + self._borrowed >= self.max_workers:
+            return None
+        return self._take()
+
+    def _ensure_workers(self) -> None:
+        while len(self._threads) < self.max_workers:
+            thread = threading.Thread(
+                target=self._worker, name=f"extraction-{len(self._threads)}", daemon=True
+            )
+            self._threads.append(thread)
+            thread.start()
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                job = self._take_if_free()
+                while job is None:
+                    self._cond.wait()
+                    job = self._take_if_free()
+                self._running += 1
+            try:
+                result = job.fn(*job.args)
+            except BaseException as e:
+                if not self._schedule_retry(job, e):
+                    job.loop.call_soon_threadsafe(_set_exception, job.future, e)
+            else:
+                job.loop.call_soon_threadsafe(_set_result, job.future, result)
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._cond.notify()  # 枠が空くのを待っているワーカーがいるかもしれない
+
+    def _schedule_retry(self, job: _Job, error: BaseException) -> bool:
+        """一時的な失敗なら待ち時間の後に並び直すよう予約する（ワーカースレッドから呼ぶ）"""
+        if job.retry is None or job.attempt + 1 >= job.max_attempts or job.future.done():
+            return False
+        try:
+            if not job.retry(error):
+                return False
+        except Exception:
+            return False
+        job.attempt += 1
+        delay = RETRY_BASE_DELAY_SECONDS * 2 ** (job.attempt - 1)
+        with self._cond:
+            job.waiting = True
+            self._jobs[id(job.future)] = job
+        logger.warning(
+            f"一時的な失敗のため {delay:.0f} 秒後に再試行します ({job.attempt + 1}/{job.max_attempts}): {job.label}: {error}"
+        )
+        job.loop.call_soon_threadsafe(job.loop.call_later, delay, self._requeue, job)
+        return True
+
+    def _requeue(self, job: _Job) -> None:
+        """retry の待ち時間が明けた仕事を待ち行列に戻す（イベントループから呼ばれる）"""
+        with self._cond:
+            if self._jobs.get(id(job.future)) is not job:
+                return  # 待っている間にキャンセルされた
+            if job.future.done():
+                self._jobs.pop(id(job.future), None)
+                return
+            job.waiting = False
+            self._enqueue(job)
+            self._ensure_workers()
+            self._cond.notify()
+
+
+def _set_result(future: asyncio.Future, result: Any) -> None:
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, exc: BaseException) -> None:
+    if not future.done():
+        future.set_exception(exc)
+
+
+# スケジューラ（遅延初期化、スレッドセーフ）
+_scheduler: Optional[ExtractionScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_extraction_scheduler() -> ExtractionScheduler:
+    """プロセス共通のスケジューラを取得する"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = ExtractionScheduler(settings.music.extraction_workers)
+                logger.info(f"抽出スケジューラを初期化（ワーカー {_scheduler.max_workers}）")
+    return _scheduler
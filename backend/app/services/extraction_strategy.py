@@ -0,0 +1,249 @@
+"""
+yt-dlp の抽出設定（フォーマット指定・player_client・クッキーの有無）を実績から選ぶ
+
+以前は決まった順（通常設定 → bestaudio/best → best）を、特定のエラー文言のときだけ先へ進んでいた。
+YouTube 側の挙動が変わると毎回1つ目で失敗してから次を試すことになり、設定を変えるまで直らなかった。
+ここでは設定ごとに直近の成否と所要時間を記録し、経路（player_client とクッキーの有無の組）を
+「期待所要時間」（成功時の所要時間の中央値 + 失敗率 × 失敗1回分の罰則）が小さい順に並べる。
+記録は一定時間（STATS_WINDOW_HOURS）で古くなって消えるので、一度失敗続きになった経路も時間が経てば再び試され、
+YouTube 側が戻れば自然に元の順へ戻る。
+
+フォーマット指定は実績で並べ替えない。情報取得の所要時間はフォーマットでほとんど変わらず（差は誤差）、
+選ばれたフォーマットと URL はそのままダウンロード・ストリーム再生に使われるので、動画込みの 'best' が
+たまたま速くて先頭に来ると動画を落とすことになる。経路ごとに 通常設定 → bestaudio/best の順で試し、
+'best' はすべての経路の後（最後の手段）に回す。
+クッキーなしの経路も、クッキーありの経路がどれも失敗続きのときだけ前に出す
+（クッキーなしでは Premium の高音質フォーマットが選べないので、速さだけでは選ばない）。
+
+情報取得（download=False）とダウンロード（download=True）は所要時間の桁が違うので、別々に記録して別々に順位を付ける
+（同じ窓に混ぜると、たまたまどちらで使われたかで順位が決まってしまう）。
+
+記録は SQLite（extraction_samples）にも書き、再起動後も同じ判断から始める（設定・モードごとに直近 STATS_WINDOW 件だけ残す）。
+"""
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+
+from ..config import get_settings
+from .. import db as history_db
+from ..logging import get_logger
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+# 設定ごとに覚える直近の件数と期間
+STATS_WINDOW = 50
+STATS_WINDOW_HOURS = 24
+# 記録が少ない設定の見込み（成功率と、成功時の所要時間）。記録が増えるほど実績の比重が大きくなる
+PRIOR_SUCCESS_RATE = 0.8
+PRIOR_LATENCY_SECONDS = 3.0
+PRIOR_WEIGHT = 3
+# 失敗1回で失う時間の見込み（次の設定を試すまでの時間）
+FAILURE_PENALTY_SECONDS = 10.0
+
+# 候補のフォーマット指定（None は get_ytdl_format_options の既定）。この順で試し、並べ替えない
+FORMAT_SELECTORS: Tuple[Optional[str], ...] = (None, 'bestaudio/best', 'best')
+# 動画込みのフォーマット。すべての経路で音声のみのフォーマットを試した後にだけ使う
+LAST_RESORT_FORMAT = 'best'
+# クッキーありの経路の成功率がどれもこれを下回ったら、クッキーなしの経路を実績どおりに前へ出す
+COOKIELESS_FALLBACK_SUCCESS_RATE = 0.5
+
+
+@dataclass(frozen=True)
+class ExtractionConfig:
+    """1回の抽出に使う設定の組み合わせ"""
+    format_selector: Optional[str] = None
+    player_client: Optional[str] = None
+    use_cookies: bool = True
+
+    @property
+    def key(self) -> str:
+        return (
+            f"format={self.format_selector or 'default'}"
+            f"|client={self.player_client or 'default'}"
+            f"|cookies={'on' if self.use_cookies else 'off'}"
+        )
+
+    @property
+    def route(self) -> Tuple[Optional[str], bool]:
+        """実績で順位を付ける単位（player_client とクッキーの有無）"""
+        return self.player_client, self.use_cookies
+
+    def stats_key(self, download: bool) -> str:
+        """実績を記録するキー（情報取得は key のまま、ダウンロードは末尾に |mode=download）"""
+        return f"{self.key}|mode=download" if download else self.key
+
+
+class _Window:
+    __slots__ = ("samples",)
+
+    def __init__(self):
+        self.samples: Deque[Tuple[float, bool, float]] = deque(maxlen=STATS_WINDOW)  # (記録時刻, 成否, 所要時間)
+
+    def fresh(self, now: float) -> List[Tuple[float, bool, float]]:
+        cutoff = now - STATS_WINDOW_HOURS * 3600
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        return list(self.samples)
+
+
+class ExtractionStrategy:
+    """抽出設定の候補と実績を持ち、試す順番を決める（スレッドセーフ）"""
+
+    def __init__(self, configs: List[ExtractionConfig], persist: bool = True):
+        self.configs = configs
+        self.persist = persist
+        self._rank = {config: i for i, config in enumerate(configs)}
+        self._windows: Dict[str, _Window] = {
+            config.stats_key(download): _Window() for config in configs for download in (False, True)
+        }
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        """保存済みの実績を読み込む（同期。起動時に asyncio.to_thread で呼ぶ）"""
+        rows = history_db.get_extraction_samples(STATS_WINDOW_HOURS, STATS_WINDOW)
+        loaded = 0
+        with self._lock:
+            for row in rows:
+                window = self._windows.get(row["config_key"])
+                if window is None:
+                    continue  # 候補から外れた設定
+                recorded_at = datetime.fromisoformat(row["recorded_at"]).timestamp()
+                window.samples.append((recorded_at, bool(row["ok"]), row["latency"]))
+                loaded += 1
+        logger.info(f"抽出設定の実績を読み込み: {loaded} 件")
+        logger.info(f"抽出設定の試行順: {[c.key for c in self.ordered()]}")
+
+    def record(self, config: ExtractionConfig, ok: bool, latency: float, download: bool = False) -> None:
+        """1回の抽出の成否を記録する（ワーカースレッドから呼ぶ）"""
+        key = config.stats_key(download)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                return
+            before = self._ordered_locked(download)[0]
+            window.samples.append((time.time(), ok, latency))
+            after = self._ordered_locked(download)[0]
+        if after != before:
+            mode = "ダウンロード" if download else "情報取得"
+            logger.warning(f"抽出設定の第一候補を切り替えます（{mode}）: {before.key} → {after.key}")
+        if self.persist:
+            try:
+                history_db.add_extraction_sample(key, ok, latency, STATS_WINDOW)
+            except Exception as e:
+                logger.warning(f"抽出設定の実績の保存に失敗: {e}")
+
+    def ordered(self, download: bool = False) -> List[ExtractionConfig]:
+        """試す順。経路を実績順に並べ、各経路の中はフォーマット指定の決まった順。'best' はすべての経路の後"""
+        with self._lock:
+            return self._ordered_locked(download)
+
+    def _ordered_locked(self, download: bool) -> List[ExtractionConfig]:
+        routes = self._ranked_routes(download, time.time())
+        route_rank = {route: i for i, route in enumerate(routes)}
+        return sorted(self.configs, key=lambda c: (
+            c.format_selector == LAST_RESORT_FORMAT,
+            route_rank[c.route],
+            _format_rank(c.format_selector),
+            self._rank[c],
+        ))
+
+    def _ranked_routes(self, download: bool, now: float) -> List[Tuple[Optional[str], bool]]:
+        """経路を期待所要時間の小さい順に（同じなら候補の並び順）。クッキーありの経路が使えるうちはクッキーなしを後ろに回す"""
+        routes = list(dict.fromkeys(c.route for c in self.configs))
+        summaries = {route: self._estimate(self._route_samples(route, download, now)) for route in routes}
+        cookies_usable = any(
+            use_cookies and summaries[(client, use_cookies)][1] >= COOKIELESS_FALLBACK_SUCCESS_RATE
+            for client, use_cookies in routes
+        )
+        order = {route: i for i, route in enumerate(routes)}
+        return sorted(routes, key=lambda r: (
+            cookies_usable and not r[1],
+            _cost(summaries[r]),
+            order[r],
+        ))
+
+    def _route_samples(
+        self, route: Tuple[Optional[str], bool], download: bool, now: float
+    ) -> List[Tuple[float, bool, float]]:
+        return [
+            sample
+            for config in self.configs if config.route == route
+            for sample in self._windows[config.stats_key(download)].fresh(now)
+        ]
+
+    def _summary(self, config: ExtractionConfig, download: bool, now: float) -> Tuple[int, float, float]:
+        return self._estimate(self._windows[config.stats_key(download)].fresh(now))
+
+    @staticmethod
+    def _estimate(samples: List[Tuple[float, bool, float]]) -> Tuple[int, float, float]:
+        """(件数, 見込み成功率, 成功時の所要時間の中央値) — 記録が少ないほど事前の見込みに寄せる"""
+        successes = sorted(latency for _, ok, latency in samples if ok)
+        rate = (len(successes) + PRIOR_WEIGHT * PRIOR_SUCCESS_RATE) / (len(samples) + PRIOR_WEIGHT)
+        median = successes[len(successes) // 2] if successes else PRIOR_LATENCY_SECONDS
+        return len(samples), rate, median
+
+    def _expected_cost(self, config: ExtractionConfig, download: bool, now: float) -> float:
+        return _cost(self._summary(config, download, now))
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.time()
+            result = {}
+            for name, download in (("order", False), ("download_order", True)):
+                rows = []
+                for config in self._ordered_locked(download):
+                    count, rate, median = self._summary(config, download, now)
+                    rows.append({
+                        "config": config.key,
+                        "samples": count,
+                        "success_rate": round(rate, 3),
+                        "median_latency": round(median, 2),
+                        "expected_cost": round(self._expected_cost(config, download, now), 2),
+                    })
+                result[name] = rows
+        return result
+
+
+def _cost(summary: Tuple[int, float, float]) -> float:
+    _, rate, median = summary
+    return median + (1 - rate) * FAILURE_PENALTY_SECONDS
+
+
+def _format_rank(format_selector: Optional[str]) -> int:
+    try:
+        return FORMAT_SELECTORS.index(format_selector)
+    except ValueError:
+        return len(FORMAT_SELECTORS)
+
+
+def build_candidate_configs() -> List[ExtractionConfig]:
+    """設定から候補を作る（player_client は既定 + MUSIC_ALT_PLAYER_CLIENTS、クッキーは設定されていればあり/なし両方）"""
+    clients: List[Optional[str]] = [None]
+    clients += [c.strip() for c in settings.music.alt_player_clients.split(';') if c.strip()]
+    cookie_modes = [True, False] if settings.music.cookies_file else [True]
+    return [
+        ExtractionConfig(fmt, client, cookies)
+        for cookies in cookie_modes
+        for client in clients
+        for fmt in FORMAT_SELECTORS
+    ]
+
+
+# 戦略（遅延初期化、スレッドセーフ）
+_strategy: Optional[ExtractionStrategy] = None
+_strategy_lock = threading.Lock()
+
+
+def get_extraction_strategy() -> ExtractionStrategy:
+    """プロセス共通の抽出戦略を取得する"""
+    global _strategy
+    if _strategy is None:
+        with _strategy_lock:
+            if _strategy is None:
+                _strategy = ExtractionStrategy(build_candidate_configs())
+    return _strategy
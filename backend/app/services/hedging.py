@@ -0,0 +1,182 @@
+"""
+yt-dlp の抽出のヘッジ（遅い呼び出しに対する予備の同時実行）
+
+抽出はほとんど 1〜2 秒で終わるが、まれに特定の player_client で 20 秒以上止まってから成功することがある。
+ここでは最初の試行が「最近の抽出の遅い方の分位点（既定は p90）」を過ぎても返らないときだけ、
+別の設定（player_client 違い）で2本目を走らせ、先に成功した方の結果を使う。
+閾値は観測した所要時間から決めるので、普段は2本目はほとんど走らず負荷は増えない。
+
+負けた方はまだ始まっていなければ取り消す。始まってしまった yt-dlp は途中で止められないので、
+結果を捨てるだけ（インスタンスは終わり次第プールへ戻る）。
+
+2本目はスケジューラのワーカー1つ分の枠を借りて走らせ、空きが無ければヘッジせずに主を待つ。
+借りた枠は主と予備の両方が終わるまで返さないので、負けて走り続ける分も含めて同時に動く yt-dlp は
+extraction_workers を超えない。
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Optional, Protocol, Tuple, TypeVar
+
+from ..config import get_settings
+from .extraction_scheduler import get_extraction_scheduler
+from ..logging import get_logger
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+# 所要時間の観測窓と、閾値を分位点から決め始めるのに必要な件数
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 20
+# 観測が少ない間の閾値と、閾値の下限/上限（秒）
+DEFAULT_THRESHOLD_SECONDS = 5.0
+MIN_THRESHOLD_SECONDS = 2.0
+MAX_THRESHOLD_SECONDS = 15.0
+
+
+class LatencyTracker:
+    """直近の所要時間から、ヘッジを始める閾値を決める（スレッドセーフ）"""
+
+    def __init__(self, percentile: float, window: int = LATENCY_WINDOW):
+        self.percentile = min(max(percentile, 0.5), 0.999)
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def threshold(self) -> float:
+        with self._lock:
+            count = len(self._samples)
+        if count < MIN_SAMPLES:
+            return DEFAULT_THRESHOLD_SECONDS
+        value = self.quantile(self.percentile) or DEFAULT_THRESHOLD_SECONDS
+        return min(MAX_THRESHOLD_SECONDS, max(MIN_THRESHOLD_SECONDS, value))
+
+    def stats(self) -> dict:
+        with self._lock:
+            count = len(self._samples)
+        return {
+            "samples": count,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "threshold": self.threshold(),
+        }
+
+
+class SlotPool(Protocol):
+    """予備の抽出に貸す枠（ExtractionScheduler）"""
+
+    max_workers: int
+
+    def borrow_slot(self) -> bool: ...
+
+    def release_slot(self) -> None: ...
+
+
+class HedgedRunner:
+    """主の呼び出しが閾値を過ぎたら予備を同時に走らせ、先に成功した方を返す"""
+
+    def __init__(self, tracker: LatencyTracker, slots: SlotPool):
+        self.tracker = tracker
+        self.slots = slots
+        # 主はスケジューラの仕事1つにつき1本、予備と負けて残った分は借りた枠の数だけなので、ワーカー数で足りる
+        self._executor = ThreadPoolExecutor(max_workers=slots.max_workers, thread_name_prefix="hedge")
+        self._lock = threading.Lock()
+        self._hedged = 0
+        self._hedge_wins = 0
+        self._skipped = 0
+
+    def run(self, primary: Callable[[], T], alternate: Callable[[], T], label: str = "") -> Tuple[T, bool]:
+        """(結果, 予備の方が勝ったか) を返す。両方失敗したら主の例外を投げる"""
+        started = time.monotonic()
+        primary_future = self._executor.submit(primary)
+        primary_future.add_done_callback(lambda f: self._record(f, started))
+
+        threshold = self.tracker.threshold()
+        done, _ = wait([primary_future], timeout=threshold)
+        if done:
+            return primary_future.result(), False
+
+        if not self.slots.borrow_slot():
+            with self._lock:
+                self._skipped += 1
+            logger.info(f"抽出が {threshold:.1f} 秒を過ぎましたが、ワーカーに空きが無いため別の設定は試しません: {label}")
+            return primary_future.result(), False
+
+        logger.info(f"抽出が {threshold:.1f} 秒を過ぎたため別の設定でも同時に試します: {label}")
+        alternate_future = self._executor.submit(alternate)
+        with self._lock:
+            self._hedged += 1
+        # 借りた枠は両方が終わってから返す（負けた方も終わるまでは yt-dlp が動いている）
+        remaining = [2]
+
+        def release(_: Future) -> None:
+            with self._lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self.slots.release_slot()
+
+        primary_future.add_done_callback(release)
+        alternate_future.add_done_callback(release)
+
+        pending = {primary_future, alternate_future}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    continue
+                for loser in pending:
+                    loser.cancel()  # 始まっていれば止められないので結果を捨てるだけ
+                won_by_alternate = future is alternate_future
+                if won_by_alternate:
+                    with self._lock:
+                        self._hedge_wins += 1
+                    logger.info(f"別の設定の抽出が先に成功しました ({time.monotonic() - started:.1f} 秒): {label}")
+                return future.result(), won_by_alternate
+        # 両方失敗
+        return primary_future.result(), False
+
+    def _record(self, future: Future, started: float) -> None:
+        # 閾値は主の設定そのものの所要時間の分布から決める（ヘッジで早く終わった分は含めない）
+        if not future.cancelled() and future.exception() is None:
+            self.tracker.record(time.monotonic() - started)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.tracker.stats(),
+                "hedged": self._hedged, "hedge_wins": self._hedge_wins, "hedge_skipped": self._skipped,
+            }
+
+
+# ヘッジ実行器（遅延初期化、スレッドセーフ）
+_runner: Optional[HedgedRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_hedged_runner() -> HedgedRunner:
+    """プロセス共通のヘッジ実行器を取得する"""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = HedgedRunner(
+                    LatencyTracker(settings.music.hedge_percentile),
+                    get_extraction_scheduler(),
+                )
+    return _runner
@@ -0,0 +1,132 @@
+"""
+/play のキーワードを ytmusicapi の検索で video_id に解決する
+
+以前はキーワードを yt-dlp の ytsearch1: に渡しており、検索結果ページの取得に加えて
+1件目の動画の完全な抽出（署名解読・PO Token）まで曲追加の時点で行っていたため、/search から選ぶより大幅に遅かった。
+ここでは /search と同じ ytmusicapi の検索で曲（songs）を優先して1件選び、video_id と
+メタデータキャッシュ用の情報（タイトル・アーティスト・サムネイル・長さ）を保存する。
+以降の曲追加はメタデータキャッシュに当たるので yt-dlp を呼ばず、抽出は再生準備の1回だけになる。
+
+キーワード → video_id の対応は SQLite（search_resolutions）に TTL 付きで保存する。
+ytmusicapi で見つからない・失敗したときは None を返し、呼び出し側は従来どおり yt-dlp の検索を使う。
+"""
+
+import os
+import re
+import threading
+from typing import Optional
+
+from ytmusicapi import YTMusic
+
+from ..config import get_settings
+from .. import db as history_db
+from ..logging import get_logger
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+# yt-dlp の検索 URL（ytsearch:キーワード / ytsearch1:キーワード）。複数件の検索（ytsearch5: など）は対象外
+_SEARCH_PREFIX_RE = re.compile(r'^ytsearch1?:', re.IGNORECASE)
+# スキームの無い URL（youtube.com/watch?v=... など）
+_BARE_URL_RE = re.compile(r'^(?:www\.)?[\w-]+(?:\.[\w-]+)*\.[a-z]{2,}/', re.IGNORECASE)
+
+# ytmusicapi の検索で見る件数
+SEARCH_LIMIT = 5
+
+
+def is_keyword_query(text: str) -> bool:
+    """URL やローカルパスではなく、検索キーワードとして扱う文字列か"""
+    text = text.strip()
+    if not text:
+        return False
+    if _SEARCH_PREFIX_RE.match(text):
+        return True
+    if text.lower().startswith('ytsearch') or '://' in text or os.path.isabs(text):
+        return False
+    return not _BARE_URL_RE.match(text)
+
+
+def normalize_query(text: str) -> str:
+    """ytsearch: の接頭辞を外し、大文字小文字と空白の違いを無視したキー"""
+    return ' '.join(_SEARCH_PREFIX_RE.sub('', text.strip()).lower().split())
+
+
+class KeywordResolver:
+    """キーワード → video_id（ytmusicapi の検索 + SQLite の TTL 付きキャッシュ）"""
+
+    def __init__(self, ttl_hours: int):
+        self.ttl_hours = ttl_hours
+        self._ytmusic: Optional[YTMusic] = None
+        self._lock = threading.Lock()
+
+    def _client(self) -> YTMusic:
+        # language='ja' だと filter 付き search が空になるため en 固定（main.py の ytmusic と同じ理由）
+        with self._lock:
+            if self._ytmusic is None:
+                self._ytmusic = YTMusic(language='en', location='JP')
+            return self._ytmusic
+
+    def resolve(self, text: str) -> Optional[str]:
+        """video_id を返す。見つからない・検索に失敗したら None（同期。asyncio.to_thread で呼ぶ）"""
+        query = normalize_query(text)
+        if not query:
+            return None
+        try:
+            cached = history_db.get_search_resolution(query, self.ttl_hours)
+        except Exception as e:
+            logger.warning(f"キーワード検索キャッシュの参照に失敗: {e}")
+            cached = None
+        if cached:
+            logger.info(f"キーワード検索キャッシュを使用: {query!r} → {cached}")
+            return cached
+
+        try:
+            hit = self._search(query)
+        except Exception as e:
+            logger.warning(f"ytmusicapi の検索に失敗（yt-dlp の検索にフォールバック）: {query!r}: {e}")
+            return None
+        if hit is None:
+            logger.info(f"ytmusicapi の検索で見つかりませんでした（yt-dlp の検索にフォールバック）: {query!r}")
+            return None
+
+        video_id = hit['videoId']
+        thumbnails = hit.get('thumbnails') or []
+        artists = ', '.join(a['name'] for a in hit.get('artists') or [] if a.get('name'))
+        try:
+            history_db.upsert_search_resolution(query, video_id)
+            history_db.upsert_track_metadata([{
+                'video_id': video_id,
+                'title': hit.get('title') or '',
+                'uploader': artists or None,
+                'thumbnail': thumbnails[-1]['url'] if thumbnails else None,
+                'duration': hit.get('duration_seconds'),
+                'webpage_url': f"https://www.youtube.com/watch?v={video_id}",
+            }])
+        except Exception as e:
+            logger.warning(f"キーワード検索結果の保存に失敗: {e}")
+        logger.info(f"キーワードを解決: {query!r} → {video_id} ({hit.get('title')})")
+        return video_id
+
+    def _search(self, query: str) -> Optional[dict]:
+        """曲（songs）を優先し、無ければ動画（videos）から、videoId とタイトルのある最初の結果"""
+        client = self._client()
+        for filter_type in ('songs', 'videos'):
+            for result in client.search(query, filter=filter_type, limit=SEARCH_LIMIT) or []:
+                if result.get('videoId') and result.get('title'):
+                    return result
+        return None
+
+
+# リゾルバ（遅延初期化、スレッドセーフ）
+_resolver: Optional[KeywordResolver] = None
+_resolver_lock = threading.Lock()
+
+
+def get_keyword_resolver() -> KeywordResolver:
+    """プロセス共通のキーワードリゾルバを取得する"""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = KeywordResolver(settings.music.search_cache_ttl_hours)
+    return _resolver
@@ -0,0 +1,194 @@
+"""
+曲ごとのラウドネス正規化
+
+キャッシュ済みの曲とアップロード曲の統合ラウドネス（EBU R128, FFmpeg の loudnorm 解析）を一度だけ測り、
+目標ラウドネスとの差を固定ゲインとして SQLite（track_loudness）に保存する。
+再生時はメモリ上の辞書を引いて、そのゲインを FFmpeg の volume フィルタに掛けるだけ（解析は再生を待たせない）。
+まだ解析されていない曲はそのままの音量で再生される。
+無音や loudnorm が結果を出さない曲は「解析できない曲」として印を保存し、再生のたびに解析し直さない（音量はそのまま）。
+
+解析は nice を下げた FFmpeg を少数のワーカースレッドで順番に実行する（イベントループには載せない）。
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Set
+
+from ..config import get_settings
+from .. import db as history_db
+from ..logging import get_logger
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+# ゲインの上限（静かな曲を持ち上げすぎてノイズを目立たせない）
+MAX_GAIN_DB = 12.0
+# ゲイン適用後のトゥルーピークの上限（クリップ防止）
+TRUE_PEAK_CEILING_DB = -1.0
+# これより小さいゲインは聞き分けられないので掛けない（Opus キャッシュのパススルー再生を優先する）
+MIN_APPLIED_GAIN_DB = 1.0
+
+_ANALYZE_TIMEOUT_SECONDS = 600
+
+
+def track_key(video_id: Optional[str], path: Optional[str]) -> Optional[str]:
+    """解析結果のキー: YouTube の曲は video_id、アップロード曲は upload:<アップロードID>"""
+    if video_id:
+        return video_id
+    if path and os.path.isabs(path):
+        upload_dir = os.path.abspath(settings.music.upload_directory)
+        if os.path.dirname(os.path.abspath(path)) == upload_dir:
+            return "upload:" + os.path.splitext(os.path.basename(path))[0]
+    return None
+
+
+def compute_gain_db(integrated_lufs: float, true_peak_db: Optional[float], target_lufs: float) -> float:
+    """目標ラウドネスまでのゲイン（トゥルーピークと上限で抑える）"""
+    gain = target_lufs - integrated_lufs
+    if true_peak_db is not None:
+        gain = min(gain, TRUE_PEAK_CEILING_DB - true_peak_db)
+    return max(-MAX_GAIN_DB, min(MAX_GAIN_DB, gain))
+
+
+class LoudnessAnalyzer:
+    """ラウドネス解析のワーカーと、解析結果（key → ゲイン dB）のメモリ上の索引"""
+
+    def __init__(self, target_lufs: float, workers: int):
+        self.target_lufs = target_lufs
+        self._gains: Dict[str, float] = {}
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="loudness")
+        self._ffmpeg = shutil.which("ffmpeg")
+        if self._ffmpeg is None:
+            logger.warning("ffmpeg が見つからないためラウドネス解析を無効にします")
+
+    def load(self) -> None:
+        """保存済みの解析結果を読み込む（同期。起動時に asyncio.to_thread で呼ぶ）"""
+        rows = history_db.get_all_track_loudness()
+        with self._lock:
+            self._gains = {key: row["gain_db"] for key, row in rows.items()}
+        logger.info(f"ラウドネス解析結果を読み込み: {len(rows)} 曲")
+
+    def gain_db(self, key: Optional[str]) -> float:
+        """再生時に掛けるゲイン（未解析・微小なら 0.0）。辞書を引くだけなのでイベントループから呼んでよい"""
+        if not key:
+            return 0.0
+        with self._lock:
+            gain = self._gains.get(key, 0.0)
+        return gain if abs(gain) >= MIN_APPLIED_GAIN_DB else 0.0
+
+    def submit(self, key: Optional[str], path: Optional[str]) -> None:
+        """未解析なら解析を予約する"""
+        if not key or not path or self._ffmpeg is None:
+            return
+        with self._lock:
+            if key in self._gains or key in self._pending:
+                return
+            self._pending.add(key)
+        self._executor.submit(self._run, key, path)
+
+    def forget(self, key: str) -> None:
+        """曲が削除されたときに解析結果も消す"""
+        with self._lock:
+            self._gains.pop(key, None)
+        history_db.delete_track_loudness(key)
+
+    def _run(self, key: str, path: str) -> None:
+        try:
+            try:
+                measured = self._analyze(path)
+            except (RuntimeError, ValueError, KeyError, subprocess.TimeoutExpired) as e:
+                # FFmpeg が読めない・loudnorm の結果が壊れている → 何度やっても同じなので印を付ける
+                logger.warning(f"ラウドネス解析に失敗（以後この曲は解析しません）: {path}: {e}")
+                self._mark_unanalyzable(key)
+                return
+            if measured is None:
+                return
+            integrated, true_peak = measured
+            if integrated is None:
+                logger.info(f"ラウドネス解析: {key} は無音のため正規化しません")
+                self._mark_unanalyzable(key)
+                return
+            gain = compute_gain_db(integrated, true_peak, self.target_lufs)
+            history_db.upsert_track_loudness(key, integrated, true_peak, gain)
+            with self._lock:
+                self._gains[key] = gain
+            logger.info(f"ラウドネス解析: {key} {integrated:.1f} LUFS → ゲイン {gain:+.1f} dB")
+        except Exception as e:
+            logger.warning(f"ラウドネス解析に失敗: {path}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def _mark_unanalyzable(self, key: str) -> None:
+        """解析できない曲の印を保存する（ゲイン 0 として扱い、submit() で再び予約しない）"""
+        history_db.upsert_track_loudness(key, None, None, 0.0)
+        with self._lock:
+            self._gains[key] = 0.0
+
+    def _analyze(self, path: str) -> Optional[tuple]:
+        """(統合ラウドネス LUFS, トゥルーピーク dBTP) を返す。無音で測れなければ (None, None)、
+        ファイルが無ければ None。FFmpeg の失敗や結果が読めないときは例外"""
+        if not os.path.exists(path):
+            return None  # 掃除済み/変換で置き換え済み → 次に再生したときに改めて解析する
+        args = [
+            self._ffmpeg, "-nostdin", "-hide_banner", "-nostats", "-i", path, "-vn",
+            "-af", f"loudnorm=I={self.target_lufs}:print_format=json", "-f", "null", "-",
+        ]
+        result = subprocess.run(
+            args,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            timeout=_ANALYZE_TIMEOUT_SECONDS,
+            preexec_fn=(lambda: os.nice(15)) if os.name == "posix" else None,
+        )
+        stderr = result.stderr.decode(errors="replace")
+        if result.returncode != 0:
+            raise RuntimeError(stderr.strip()[-300:])
+        # loudnorm は最後に JSON を stderr へ出力する
+        start, end = stderr.rfind("{"), stderr.rfind("}")
+        if start < 0 or end < start:
+            raise RuntimeError("loudnorm の結果が見つかりません")
+        data = json.loads(stderr[start:end + 1])
+        integrated = float(data["input_i"])
+        if integrated == float("-inf") or integrated < -70:
+            return None, None
+        true_peak = float(data["input_tp"]) if data.get("input_tp") not in (None, "-inf") else None
+        return integrated, true_peak
+
+
+# 解析器（遅延初期化、スレッドセーフ）
+_analyzer: Optional[LoudnessAnalyzer] = None
+_analyzer_lock = threading.Lock()
+
+
+def get_loudness_analyzer() -> Optional[LoudnessAnalyzer]:
+    """プロセス共通の解析器を取得する（MUSIC_LOUDNESS_NORMALIZATION=false なら None）"""
+    global _analyzer
+    if not settings.music.loudness_normalization:
+        return None
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                _analyzer = LoudnessAnalyzer(settings.music.loudness_target_lufs, settings.music.loudness_workers)
+    return _analyzer
+
+
+def schedule_loudness_analysis(video_id: Optional[str], path: Optional[str]) -> None:
+    """曲のラウドネス解析を予約する（どのスレッドからでも呼べる）"""
+    analyzer = get_loudness_analyzer()
+    if analyzer is not None:
+        analyzer.submit(track_key(video_id, path), path)
+
+
+def playback_gain_db(video_id: Optional[str], path: Optional[str]) -> float:
+    """再生時に掛けるゲイン（dB）。正規化が無効・未解析なら 0.0"""
+    analyzer = get_loudness_analyzer()
+    if analyzer is None:
+        return 0.0
+    return analyzer.gain_db(track_key(video_id, path))
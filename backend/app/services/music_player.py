@@ -1,17 +1,37 @@
 import asyncio
+import math
 import os
+import random
+import re
 import uuid
 import threading
+import time
+import weakref
+from urllib.parse import parse_qs, urlparse
 import yt_dlp
 import discord
-from concurrent.futures import ThreadPoolExecutor
 from collections import deque
-from typing import Optional, List, Callable, Any
-from dataclasses import dataclass
+from itertools import islice
+from contextlib import contextmanager
+from typing import Optional, List, Callable, Any, Iterator
+from dataclasses import dataclass, field, replace
 
 from ..config import get_settings
 from .. import db as history_db
 from ..logging import get_logger
+from .audio_cache import get_audio_cache, parse_cache_filename
+from .cache_fill import CacheFill, find_active_fill, get_or_start_fill
+from .opus_cache import is_opus_file, schedule_opus_transcode
+from .loudness import playback_gain_db, schedule_loudness_analysis
+from .transition import PreparedNext, TransitionSource
+from .extraction_scheduler import JobPriority, get_extraction_scheduler
+from .single_flight import SingleFlight
+from .song_queue import SongQueue
+from .pot_provider import get_pot_extractor_args, pot_provider_fingerprint
+from .extraction_errors import PermanentExtractionError, get_failure_cache, is_transient_error, permanent_reason
+from .extraction_strategy import ExtractionConfig, get_extraction_strategy
+from .hedging import get_hedged_runner
+from .keyword_search import get_keyword_resolver, is_keyword_query
 
 # 設定を取得
 settings = get_settings()
@@ -19,6 +39,22 @@ settings = get_settings()
 # ロガーを設定
 logger = get_logger(__name__)
 
+def resolve_cookies_path(cookies_path: str) -> Optional[str]:
+    """COOKIES_FILE の実ファイルのパス（ディレクトリ指定ならその中の最初のファイル）。見つからなければ None"""
+    if not cookies_path:
+        return None
+    if os.path.isfile(cookies_path):
+        # 直接ファイルが指定された場合
+        return cookies_path
+    if os.path.isdir(cookies_path):
+        # ディレクトリの場合（Cloud Run Secret Manager）
+        # ディレクトリ内のファイルを探す
+        for filename in sorted(os.listdir(cookies_path)):
+            file_path = os.path.join(cookies_path, filename)
+            if os.path.isfile(file_path):
+                return file_path
+    return None
+
 def get_ytdl_format_options() -> dict:
     """
     yt-dlp の設定オプションを取得
@@ -34,10 +70,6 @@ def get_ytdl_format_options() -> dict:
     # bestaudio* はフィルター付きベストオーディオ、bestaudioはフィルターなし、bestは全形式
     format_string = 'bestaudio*/bestaudio/best'
 
-    # bgutil-ytdlp-pot-provider のスクリプトパス
-    # Docker環境: /opt/bgutil-pot/server/build/generate_once.js
-    pot_script_path = '/opt/bgutil-pot/server/build/generate_once.js'
-
     options = {
         'format': format_string,
         'outtmpl': f'{settings.music.directory}/%(title)s-%(id)s.%(ext)s',
@@ -65,33 +97,18 @@ def get_ytdl_format_options() -> dict:
         },
     }
 
-    # bgutil-ytdlp-pot-provider のスクリプトパス設定
-    # Docker環境（Cloud Run）の場合のみ設定
-    if os.path.exists(pot_script_path):
-        options['extractor_args'] = {
-            'youtubepot-bgutilscript': {
-                'script_path': [pot_script_path]
-            }
-        }
-        logger.info(f"PO Token provider script configured: {pot_script_path}")
+    # bgutil-ytdlp-pot-provider の設定
+    # 常駐サーバーが動いていれば HTTP で問い合わせ、スクリプト（Docker環境のみ）はフォールバックに残す
+    pot_extractor_args = get_pot_extractor_args()
+    if pot_extractor_args:
+        options['extractor_args'] = pot_extractor_args
+        logger.info(f"PO Token providers configured: {', '.join(pot_extractor_args)}")
 
     # YouTube認証用クッキーファイル（環境変数COOKIES_FILEで設定）
     cookies_path = settings.music.cookies_file
     logger.info(f"COOKIES_FILE env value: '{cookies_path}'")
     if cookies_path:
-        actual_cookies_path = None
-
-        if os.path.isfile(cookies_path):
-            # 直接ファイルが指定された場合
-            actual_cookies_path = cookies_path
-        elif os.path.isdir(cookies_path):
-            # ディレクトリの場合（Cloud Run Secret Manager）
-            # ディレクトリ内のファイルを探す
-            for filename in os.listdir(cookies_path):
-                file_path = os.path.join(cookies_path, filename)
-                if os.path.isfile(file_path):
-                    actual_cookies_path = file_path
-                    break
+        actual_cookies_path = resolve_cookies_path(cookies_path)
 
         if actual_cookies_path:
             options['cookiefile'] = actual_cookies_path
@@ -126,62 +143,306 @@ def get_ffmpeg_options(is_local_file: bool = False) -> dict:
             'options': '-vn'
         }
 
-# yt-dlp インスタンス（遅延初期化、スレッドセーフ）
-_ytdl_instance = None
-_ytdl_lock = threading.Lock()
-
-def get_ytdl():
-    """yt-dlpインスタンスを遅延初期化して取得（スレッドセーフ）"""
-    global _ytdl_instance
-    if _ytdl_instance is None:
-        with _ytdl_lock:
-            if _ytdl_instance is None:
-                options = get_ytdl_format_options()
-                _ytdl_instance = yt_dlp.YoutubeDL(options)
-                print(f"[STARTUP] yt-dlp initialized with cookiefile: {options.get('cookiefile', 'NOT SET')}")
-    return _ytdl_instance
+class YtdlPool:
+    """YoutubeDL インスタンスのプール。
 
+    YoutubeDL は同時に複数スレッドから使う前提で作られていないので、ジョブごとに1つ借りて返す。
+    インスタンスは (フォーマット指定, フラット展開か) ごとに作り置きし、フォールバックのたびに作り直さない。
+    オプションは1回だけ組み立て、クッキーファイルが差し替えられた（パスか更新時刻が変わった）ときと、
+    PO Token サーバーが使える/使えないが切り替わったときだけ作り直す。
+    """
 
-def build_temp_ytdl_with_format(format_selector: str) -> yt_dlp.YoutubeDL:
-    """指定したフォーマットで一時的な yt-dlp インスタンスを生成する"""
-    options = get_ytdl_format_options()
-    options['format'] = format_selector
-    return yt_dlp.YoutubeDL(options)
+    def __init__(self, max_idle_per_key: int):
+        self.max_idle_per_key = max(1, max_idle_per_key)
+        self._lock = threading.Lock()
+        self._idle: dict[tuple, list[yt_dlp.YoutubeDL]] = {}
+        self._base_options: Optional[dict] = None
+        self._options_key: Optional[tuple] = None
+        self._generation = 0
+
+    @staticmethod
+    def _options_fingerprint() -> tuple:
+        path = resolve_cookies_path(settings.music.cookies_file)
+        try:
+            mtime = os.stat(path).st_mtime_ns if path else None
+        except OSError:
+            mtime = None
+        return path, mtime, pot_provider_fingerprint()
+
+    def _current_options(self) -> tuple[int, dict]:
+        fingerprint = self._options_fingerprint()
+        with self._lock:
+            if self._base_options is None or fingerprint != self._options_key:
+                if self._base_options is not None:
+                    logger.info("クッキーファイルか PO Token プロバイダーの変更を検知したため yt-dlp の設定を読み直します")
+                self._base_options = get_ytdl_format_options()
+                self._options_key = fingerprint
+                self._generation += 1
+                self._idle.clear()
+                logger.info(f"yt-dlp initialized with cookiefile: {self._base_options.get('cookiefile', 'NOT SET')}")
+            return self._generation, self._base_options
+
+    @contextmanager
+    def checkout(
+        self,
+        format_selector: Optional[str] = None,
+        *,
+        flat: bool = False,
+        player_client: Optional[str] = None,
+        cookies: bool = True,
+    ) -> Iterator[yt_dlp.YoutubeDL]:
+        """インスタンスを1つ借りる（with を抜けたらプールへ返す）。
+        player_client を渡すと YouTube の player_client（カンマ区切り）をその指定に差し替え、
+        cookies=False ならクッキーファイルを使わない"""
+        generation, base_options = self._current_options()
+        key = (format_selector, flat, player_client, cookies)
+        with self._lock:
+            idle = self._idle.get(key)
+            ydl = idle.pop() if idle else None
+        if ydl is None:
+            options = dict(base_options)
+            if format_selector is not None:
+                options['format'] = format_selector
+            if flat:
+                # プレイリスト展開用（各エントリを個別に解決せず、ID とタイトル程度の簡易エントリのまま返す）
+                options['extract_flat'] = 'in_playlist'
+            if not cookies:
+                options.pop('cookiefile', None)
+            if player_client:
+                extractor_args = dict(options.get('extractor_args') or {})
+                extractor_args['youtube'] = {
+                    **extractor_args.get('youtube', {}),
+                    'player_client': [c.strip() for c in player_client.split(',') if c.strip()],
+                }
+                options['extractor_args'] = extractor_args
+            ydl = yt_dlp.YoutubeDL(options)
+        try:
+            yield ydl
+        finally:
+            with self._lock:
+                # クッキー更新前の設定で作ったインスタンスは返さずに捨てる
+                if generation == self._generation:
+                    idle = self._idle.setdefault(key, [])
+                    if len(idle) < self.max_idle_per_key:
+                        idle.append(ydl)
+
+
+# プール（遅延初期化、スレッドセーフ）
+_ytdl_pool: Optional[YtdlPool] = None
+_ytdl_pool_lock = threading.Lock()
+
+
+def get_ytdl_pool() -> YtdlPool:
+    """プロセス共通の YoutubeDL プールを取得する"""
+    global _ytdl_pool
+    if _ytdl_pool is None:
+        with _ytdl_pool_lock:
+            if _ytdl_pool is None:
+                _ytdl_pool = YtdlPool(settings.music.extraction_workers)
+    return _ytdl_pool
+
+
+def is_playlist_url(url: str) -> bool:
+    """YouTube のプレイリスト/ミックスの URL か（watch?v=...&list=... は noplaylist により単曲扱い）"""
+    parsed = urlparse(url)
+    if not parsed.netloc.endswith(('youtube.com', 'youtu.be')):
+        return False
+    query = parse_qs(parsed.query)
+    return 'list' in query and ('v' not in query or parsed.path.rstrip('/').endswith('/playlist'))
+
+
+def _extract_once(url: str, config: ExtractionConfig, download: bool) -> tuple[dict, yt_dlp.YoutubeDL]:
+    """1つの設定で1回抽出し、成否と所要時間を抽出戦略に記録する（情報取得とダウンロードは別々に。
+    動画側の恒久的な失敗は設定のせいではないので記録しない）"""
+    strategy = get_extraction_strategy()
+    started = time.monotonic()
+    try:
+        with get_ytdl_pool().checkout(
+            config.format_selector, player_client=config.player_client, cookies=config.use_cookies
+        ) as ydl:
+            info = ydl.extract_info(url, download=download)
+        if info is None:
+            raise Exception("動画情報の取得に失敗しました")
+    except Exception as e:
+        if permanent_reason(e) is None:
+            strategy.record(config, False, time.monotonic() - started, download=download)
+        raise
+    strategy.record(config, True, time.monotonic() - started, download=download)
+    return info, ydl
+
+
+def _extract_hedged(
+    url: str, config: ExtractionConfig, alternate: Optional[ExtractionConfig], download: bool
+) -> tuple[dict, yt_dlp.YoutubeDL]:
+    """1回分の抽出。情報取得だけなら、遅いときに alternate の設定でも同時に試す
+    （ダウンロードは同じファイルへ2本書き込むことになるのでヘッジしない）"""
+    if download or alternate is None or not settings.music.hedge_extraction:
+        return _extract_once(url, config, download)
+    (info, ydl), _ = get_hedged_runner().run(
+        lambda: _extract_once(url, config, download),
+        lambda: _extract_once(url, alternate, download),
+        label=url,
+    )
+    return info, ydl
 
 
 def extract_info_with_fallback(url: str, download: bool = False) -> tuple[dict, yt_dlp.YoutubeDL]:
-    """format指定を切り替えながら情報取得を行う。"""
-    fallback_formats = [
-        None,  # 通常設定
-        'bestaudio/best',
-        'best',
-    ]
-
+    """抽出戦略が選んだ順に設定を切り替えながら情報取得を行う。
+    返す YoutubeDL はプールへ返却済みなので、prepare_filename のような読み取りだけに使うこと"""
+    candidates = get_extraction_strategy().ordered(download)
+    tried: List[ExtractionConfig] = []
     last_error = None
-    for fmt in fallback_formats:
-        ydl = get_ytdl() if fmt is None else build_temp_ytdl_with_format(fmt)
+    for config in candidates[:EXTRACTION_ATTEMPTS_PER_CALL]:
+        tried.append(config)
+        # ヘッジには player_client かクッキーの有無が違う設定を使う（フォーマット違いだけでは同じところで詰まる）
+        alternate = next(
+            (c for c in candidates if c not in tried
+             and (c.player_client, c.use_cookies) != (config.player_client, config.use_cookies)),
+            None,
+        )
         try:
-            if fmt is not None:
-                logger.warning(f"yt-dlp フォーマットフォールバックを試行: {fmt}")
-            info = ydl.extract_info(url, download=download)
-            if info is None:
-                raise Exception("動画情報の取得に失敗しました")
-            return info, ydl
-
+            if len(tried) > 1:
+                logger.warning(f"yt-dlp 抽出設定のフォールバックを試行: {config.key}")
+            return _extract_hedged(url, config, alternate, download)
         except Exception as e:
             last_error = e
-            message = str(e)
-            retriable = (
-                'The page needs to be reloaded' in message
-                or 'Requested format is not available' in message
-            )
-            if not retriable or fmt == fallback_formats[-1]:
-                raise
-            logger.warning(f"yt-dlp抽出失敗 (format={fmt}): {message}")
+            if permanent_reason(e) is not None:
+                raise  # 非公開・削除済みなどは設定を変えても取得できない
+            logger.warning(f"yt-dlp抽出失敗 ({config.key}): {e}")
 
-    # 到達しない想定
     raise last_error or Exception('yt-dlp抽出に失敗しました')
 
+def resolved_info_expiry(info: dict) -> float:
+    """抽出結果のストリーム URL の失効時刻（UNIX 時刻）。URL の expire パラメータの最小値、なければ既定の寿命"""
+    urls = [info.get('url')] + [f.get('url') for f in info.get('requested_formats') or []]
+    expiries = [int(m.group(1)) for url in urls if url for m in [_EXPIRE_RE.search(url)] if m]
+    return min(expiries) if expiries else time.time() + RESOLVED_INFO_DEFAULT_TTL_SECONDS
+
+
+def keep_resolved_info(song: "Song", info: dict) -> None:
+    """フォーマット選択済みの抽出結果を、音源準備で使えるよう曲に持たせる（重いキーは落とす）"""
+    if not info.get('format_id'):
+        return  # フラット展開などフォーマットが選ばれていない結果
+    song.resolved_info = {k: v for k, v in info.items() if k not in _RESOLVED_INFO_DROP_KEYS}
+    song.resolved_expires_at = resolved_info_expiry(info)
+
+
+def select_direct_stream(info: dict) -> Optional[dict]:
+    """抽出結果が単一の HTTP(S) ファイルとして直接取得できる音声なら、その URL/ヘッダ/サイズを返す。
+    HLS/DASH 断片や映像+音声の結合が必要な形式は None（通常のダウンロードに任せる）"""
+    if info.get('requested_formats'):
+        return None
+    url = info.get('url')
+    if not url or (info.get('protocol') or '') not in ('http', 'https'):
+        return None
+    return {
+        'url': url,
+        'http_headers': info.get('http_headers') or {},
+        'filesize': info.get('filesize'),
+    }
+
+# 追加時の抽出結果を持っておくときに落とすキー（キューの曲数分メモリに載るため。ダウンロードには使わない）
+_RESOLVED_INFO_DROP_KEYS = frozenset({
+    'formats', 'thumbnails', 'automatic_captions', 'subtitles', 'heatmap', 'chapters', 'description', 'tags',
+    'categories', 'requested_subtitles',
+})
+# ストリーム URL の失効時刻（?expire=... または /expire/.../）
+_EXPIRE_RE = re.compile(r'[?&/]expire[=/](\d+)')
+# 失効時刻が分からないときの寿命と、失効間際の URL を使わないための余裕（ダウンロード中に切れないように）
+RESOLVED_INFO_DEFAULT_TTL_SECONDS = 3 * 3600
+RESOLVED_INFO_EXPIRY_MARGIN_SECONDS = 10 * 60
+
+# 1回の抽出で試す設定の数（抽出戦略の順に。一時的な失敗のときだけ次へ進む）
+EXTRACTION_ATTEMPTS_PER_CALL = 3
+
+# プレイリスト展開: 最初の数曲はすぐ再生できるよう小さく、以降はまとめてキューへ入れる
+PLAYLIST_FIRST_BATCH = 10
+PLAYLIST_BATCH = 50
+
+# 一括追加: 差し替えが続くときのクライアント通知の間隔（秒）。最初の差し替えはすぐ通知する
+BULK_NOTIFY_INTERVAL_SECONDS = 0.5
+
+# 音源準備の試行回数の上限（一時的な失敗のみ再試行。非公開・削除済みなどは1回で諦める）
+PREPARE_MAX_ATTEMPTS = 3
+
+# ストリーム再生開始時に最初のデータを待つ上限（超えたら再生側のパイプで待つ）
+STREAM_START_TIMEOUT_SECONDS = 15
+# キャッシュ書き込み中のストリーム URL 再抽出を待つ上限（スケジューラの順番待ちを含む）
+STREAM_REFRESH_TIMEOUT_SECONDS = 120
+
+# 音量変更を FFmpeg の作り直しに反映するまでの待ち（スライダー操作が続く間はまとめて1回にする）
+VOLUME_RESTART_DEBOUNCE_SECONDS = 0.3
+
+
+class TrackAudioSource(discord.FFmpegOpusAudio):
+    """1曲分の音源。FFmpeg が Opus パケットまで作るので、Python 側は 20ms ごとにそれを受け渡すだけ。
+
+    - Opus キャッシュを音量 100% で再生するときはパケットをそのまま送る（-c:a copy、デコードもエンコードもしない）
+    - それ以外は FFmpeg のフィルタ（-af volume）で音量とラウドネス正規化のゲインを掛け、FFmpeg 内の libopus でエンコードする
+    FFmpegOpusAudio の codec は「入力のコーデック」で、'opus'/'libopus'/'copy' はどれも -c:a copy になる。
+    エンコードする経路では codec=None を渡して -c:a libopus にする。
+    discord.py は libopus に -fec true -packet_loss 15 を付けるが、これだけで変更前の Python 側エンコードより
+    重くなるので、出力オプション（後に書いた方が効く）で FEC を切り、計算量（compression_level）を抑える。
+    音量は FFmpeg の起動時にしか決められないので、送ったフレーム数から再生位置を数えておき、
+    音量が変わったら同じ位置から作り直して差し替える（PCMVolumeTransformer のようなフレームごとの処理はしない）。
+    途中からの再生（シーク・音量変更）は、ローカルファイルなら入力側の -ss でその位置へ直接飛び、
+    URL やキャッシュ書き込み中のパイプは位置を指定して読めないので出力側の -ss（先頭からデコードして捨てる）にする。
+    """
+
+    FRAME_SECONDS = 0.02
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        volume: float = 1.0,
+        gain_db: float = 0.0,
+        start_seconds: float = 0.0,
+        fill: Optional[CacheFill] = None,
+    ):
+        self.path = path
+        self.volume = volume
+        self.gain_db = gain_db
+        self.start_seconds = start_seconds
+        self.frames_sent = 0
+        # キャッシュ書き込み中の曲は、書き込み済みの部分をパイプで渡す
+        is_local = fill is not None or not path.startswith(('http://', 'https://'))
+        factor = volume * 10 ** (gain_db / 20)
+        self.passthrough = fill is None and is_local and is_opus_file(path) and factor == 1.0
+
+        ffmpeg_opts = get_ffmpeg_options(is_local_file=is_local)
+        before_options = ffmpeg_opts['before_options']
+        options = ffmpeg_opts['options']
+        if start_seconds > 0:
+            if fill is None and is_local:
+                before_options = f'-ss {start_seconds:.2f} ' + before_options
+            else:
+                options = f'-ss {start_seconds:.2f} ' + options
+        if not self.passthrough:
+            if factor != 1.0:
+                options += f' -af volume={factor:.4f}'
+            options += f' -fec false -packet_loss 0 -compression_level {settings.music.opus_compression_level}'
+
+        super().__init__(
+            fill.open_reader() if fill is not None else path,
+            pipe=fill is not None,
+            codec='opus' if self.passthrough else None,
+            bitrate=settings.music.opus_bitrate_kbps,
+            before_options=before_options,
+            options=options,
+        )
+
+    def read(self) -> bytes:
+        data = super().read()
+        if data:
+            self.frames_sent += 1
+        return data
+
+    @property
+    def position_seconds(self) -> float:
+        """曲の先頭からの再生位置（秒）"""
+        return self.start_seconds + self.frames_sent * self.FRAME_SECONDS
+
 # 後方互換性のための定数
 MUSIC_DIR = settings.music.directory
 OAUTH2_USERNAME = settings.music.oauth2_username
@@ -198,8 +459,18 @@ class Song:
     added_by: Optional[Any] = None  # User オブジェクトまたは None
     video_id: Optional[str] = None  # YouTubeのビデオID（キャッシュ検索用）
     pending: bool = False  # 追加直後で yt-dlp の情報取得がまだ終わっていないプレースホルダ
+    duration: Optional[float] = None  # 曲の長さ（秒）。分かっていればクロスフェード/次の曲の用意の時期に使う
+    lazy: bool = False  # プレイリストのフラット展開で入った簡易エントリ（音源を準備するときに詳細を埋める）
+    # ストリーム再生中のキャッシュ書き込み（完了するまで source のファイルは .part のまま）
+    cache_fill: Optional[CacheFill] = field(default=None, repr=False, compare=False)
+    # 追加時の抽出結果（選ばれたフォーマットとストリーム URL）。期限内なら音源準備で抽出し直さずに使う
+    resolved_info: Optional[dict] = field(default=None, repr=False, compare=False)
+    resolved_expires_at: Optional[float] = field(default=None, repr=False, compare=False)
+    # キュー内でこの曲オブジェクトを指す ID（replace() で複製した曲には新しい ID が振られる）
+    entry_id: str = field(init=False, compare=False)
 
     def __post_init__(self):
+        self.entry_id = uuid.uuid4().hex[:12]
         # デフォルト値の設定
         if not self.title:
             self.title = "Unknown Title"
@@ -208,6 +479,85 @@ class Song:
         if not self.thumbnail:
             self.thumbnail = ""
 
+class StaleQueueEntryError(LookupError):
+    """ID で指定したキュー項目がもう無い（他のクライアントの操作や再生の進行で消えた）"""
+
+
+# 稼働中のプレイヤー（キャッシュ掃除で「使用中の曲」を集めるため。bot.py の music_players を参照せずに済ませる）
+_active_players: "weakref.WeakSet[MusicPlayer]" = weakref.WeakSet()
+
+# 同じ曲の情報取得/音源準備は全ギルドで同時に1回だけ（video_id、なければ URL 単位）。後から来た呼び出しは結果を共有する
+_info_flights = SingleFlight("song-info")
+_prepare_flights = SingleFlight("prepare")
+
+# 同時に走るキャッシュ掃除は1つまで（ダウンロード完了が続いても積み上がらないようにする）
+_eviction_task: Optional[asyncio.Task] = None
+
+
+def referenced_video_ids() -> set[str]:
+    """キュー・再生中・履歴の曲の video_id（キャッシュ掃除で消してはいけない曲）。イベントループ上で呼ぶ"""
+    ids: set[str] = set()
+    for player in list(_active_players):
+        if player.shutdown_flag:
+            continue
+        songs = [*player.queue, *player.history]
+        if player.current:
+            songs.append(player.current)
+        for song in songs:
+            if song.video_id:
+                ids.add(song.video_id)
+            elif song.source:
+                parsed = parse_cache_filename(os.path.basename(song.source))
+                if parsed:
+                    ids.add(parsed[0])
+    return ids
+
+
+async def evict_audio_cache(reason: str) -> dict:
+    """キャッシュを容量予算内に収める。消した容量などの結果を返す"""
+    protected = referenced_video_ids()
+    loop = asyncio.get_running_loop()
+
+    async def _referenced(video_id: str) -> bool:
+        return video_id in referenced_video_ids()
+
+    def is_protected(video_id: str) -> bool:
+        # 掃除のスレッドから、消す直前にその時点のキュー・再生中・履歴を確かめる
+        try:
+            return asyncio.run_coroutine_threadsafe(_referenced(video_id), loop).result(timeout=5)
+        except Exception:
+            return True  # 確かめられなければ消さない
+
+    music = settings.music
+    result = await asyncio.to_thread(
+        get_audio_cache().evict,
+        max_bytes=music.cache_max_mb * 1024 * 1024,
+        min_free_bytes=music.cache_min_free_mb * 1024 * 1024,
+        protected_ids=protected,
+        load_play_stats=history_db.get_play_stats_by_video,
+        half_life_days=music.cache_recency_half_life_days,
+        is_protected=is_protected,
+    )
+    if result["removed_files"]:
+        logger.info(f"キャッシュ掃除（{reason}）: {result['reclaimed_bytes']} bytes を回収")
+    return result
+
+
+def schedule_cache_eviction(loop: asyncio.AbstractEventLoop, reason: str) -> None:
+    """どのスレッドからでも呼べるキャッシュ掃除の予約（実行中なら今回は見送る）"""
+    def _start() -> None:
+        global _eviction_task
+        if _eviction_task is not None and not _eviction_task.done():
+            return
+        _eviction_task = loop.create_task(evict_audio_cache(reason))
+        _eviction_task.add_done_callback(
+            lambda t: t.cancelled() or t.exception() is None
+            or logger.warning(f"キャッシュ掃除に失敗: {t.exception()}")
+        )
+
+    loop.call_soon_threadsafe(_start)
+
+
 class MusicPlayer:
     """音楽プレイヤークラス"""
 
@@ -217,14 +567,14 @@ class MusicPlayer:
         self.guild_id = guild_id
         self.notify_clients = notify_clients
 
-        self.queue: deque[Song] = deque()
+        self.queue: SongQueue[Song] = SongQueue()  # 常にその場で変更する（差し替えない）
         self.history: deque[Song] = deque(maxlen=50)
         self.next = asyncio.Event()
         self.current: Optional[Song] = None
         self.volume: float = 1.0  # ボリューム（0.0 - 1.0）
 
         self.voice_client = guild.voice_client
-        self.executor = ThreadPoolExecutor(max_workers=3)
+        self.scheduler = get_extraction_scheduler()  # yt-dlp の仕事は全ギルド共通のワーカーで実行する
         self.shutdown_flag = False  # シャットダウンフラグ
 
         # 状態バージョン管理（フロントエンドとの同期用）
@@ -236,6 +586,21 @@ class MusicPlayer:
         # 音源準備中（yt-dlp 抽出/ダウンロード中）フラグ。UI のバッファリング表示用
         self.is_preparing: bool = False
 
+        # 先読み: 再生中に次の prefetch_depth 曲をバックグラウンドで準備しておき、曲間の待ちをなくす
+        self.prefetch_depth: int = max(0, settings.music.prefetch_depth)
+        self._prefetch_task: Optional[asyncio.Task] = None
+        self._prefetch_target: Optional[Song] = None  # 先読み中の曲
+        self._prefetch_failed: set[str] = set()  # 先読みに失敗した曲の entry_id。先頭に来たときに通常経路で再試行する
+        # id(song) -> 準備中の Future。先頭の準備と先読みが同じ曲を二重にダウンロードしないよう共有する
+        self._preparing: dict[int, asyncio.Future] = {}
+        # entry_id -> 先読みとして投入した準備の Future。先読み範囲から外れたら、まだ始まっていなければ取り消す
+        self._prefetch_jobs: dict[str, asyncio.Future] = {}
+        # 音量変更の反映待ちタスク（FFmpeg を再生位置から作り直す）
+        self._volume_task: Optional[asyncio.Task] = None
+        # 曲追加のバックグラウンドタスク（一括追加のプレースホルダの解決、クライアントの曲情報の確認）
+        self._enqueue_tasks: set[asyncio.Task] = set()
+
+        _active_players.add(self)
         logger.info(f"音楽プレイヤーを初期化 (Guild: {guild.name}, ID: {guild_id})")
         
         # 非同期で音楽ループを開始
@@ -289,8 +654,12 @@ class MusicPlayer:
                     logger.debug(f"音源を準備中: {song.title}")
                     self.is_preparing = True
                     await self.notify_clients(self.guild_id)
-                    song = await self.bot.loop.run_in_executor(self.executor, self.prepare_source, song)
-                    self.queue[0] = song
+                    # 先読み中なら同じ Future を待つ（shield: このループが止まっても準備自体は続ける）
+                    song = await asyncio.shield(self._prepare_in_background(song))
+                    if self.queue and self.queue[0] is not song:
+                        # 準備中にキューが編集され、先頭が別の曲になった → 改めて先頭から
+                        self.is_preparing = False
+                        continue
                     consecutive_errors = 0  # 成功したらリセット
                 except Exception as e:
                     self.is_preparing = False
@@ -300,7 +669,8 @@ class MusicPlayer:
                         logger.error(f"連続エラー上限 ({max_consecutive_errors}) に達しました。一時停止します。")
                         await asyncio.sleep(10)  # 10秒待機
                         consecutive_errors = 0
-                    self.queue.popleft()
+                    # 待っている間にキューが編集されているかもしれないので、先頭ではなく準備に失敗した曲を取り除く
+                    self.queue.discard(song)
                     await self.notify_clients(self.guild_id)
                     continue
 
@@ -313,28 +683,16 @@ class MusicPlayer:
                 self.voice_client.stop()
 
             try:
-                # ファイルパスの絶対パス化
-                source_path = song.source
-                if not source_path.startswith(('http://', 'https://')) and not os.path.isabs(source_path):
-                    source_path = os.path.abspath(source_path)
-                
-                # ローカルファイルの存在確認
-                if not source_path.startswith(('http://', 'https://')) and not os.path.exists(source_path):
-                    logger.error(f"ファイルが見つかりません: {source_path}")
-                    self.queue.popleft()
+                # ローカルファイルの存在確認（キャッシュ書き込み中の曲は書き込み済み部分から再生する）
+                if not self._source_available(song):
+                    logger.error(f"ファイルが見つかりません: {song.source}")
+                    if song.video_id:
+                        get_audio_cache().discard(song.video_id)  # 外部で消されたキャッシュを索引から外す
+                    self.queue.discard(song)
                     continue
 
-                # ローカルファイルかどうかを判定
-                is_local = not source_path.startswith(('http://', 'https://'))
-                ffmpeg_opts = get_ffmpeg_options(is_local_file=is_local)
-                audio_source = discord.FFmpegPCMAudio(
-                    source_path,
-                    before_options=ffmpeg_opts['before_options'],
-                    options=ffmpeg_opts['options']
-                )
-                
-                transformed_source = discord.PCMVolumeTransformer(audio_source, volume=self.volume)
-                
+                transformed_source = self._create_playback(song)
+
                 if self.current:
                     self.history.append(self.current)
                 
@@ -347,9 +705,10 @@ class MusicPlayer:
                 )
                 await self._record_play_history(song)
                 await self.notify_clients(self.guild_id)
+                self._schedule_prefetch()
             except Exception as e:
                 logger.error(f"再生エラー: {e}", exc_info=True)
-                self.queue.popleft()
+                self.queue.discard(song)
                 continue
 
             # 曲が本当に終わる（after コールバック）まで待つ。
@@ -370,7 +729,8 @@ class MusicPlayer:
         """次の曲を再生する（voice_client の after コールバック。曲の終了/停止時にのみ呼ばれる）"""
         if error:
             logger.error(f"再生中にエラーが発生: {error}")
-        if self.queue:
+        # 終わったのが先頭の曲のときだけ取り除く（previous() で先頭に前の曲を入れた場合などは残す）
+        if self.queue and (self.current is None or self.queue[0] is self.current):
             self.queue.popleft()
         # 再生終了時に現在の曲をリセットする
         self.current = None
@@ -389,80 +749,582 @@ class MusicPlayer:
         
         self.volume = volume
         
-        # 現在再生中の場合はボリュームを即座に適用
-        if self.voice_client and hasattr(self.voice_client.source, 'volume'):
-            self.voice_client.source.volume = volume
+        # 現在再生中の場合は、少し待ってから再生位置で FFmpeg を作り直して適用する
+        if self._volume_task is None or self._volume_task.done():
+            self._volume_task = self.bot.loop.create_task(self._apply_volume_to_current())
         
         await self.notify_clients(self.guild_id)
         logger.info(f"ボリュームを{int(volume * 100)}%に設定しました (Guild: {self.guild_id})")
 
+    async def _apply_volume_to_current(self) -> None:
+        """再生中の音源を、現在の音量で同じ位置から作り直して差し替える（after は呼ばれないので曲は進まない）"""
+        await asyncio.sleep(VOLUME_RESTART_DEBOUNCE_SECONDS)
+        vc = self.voice_client
+        playing = vc.source if vc else None
+        transition = playing if isinstance(playing, TransitionSource) else None
+        old = transition.main_source if transition else playing
+        song = transition.song if transition else self.current
+        if not isinstance(old, TrackAudioSource) or old.volume == self.volume or song is None:
+            return
+        if transition is not None and transition.fading:
+            # クロスフェード中は差し替えない（フェード後にもう一度）
+            self._volume_task = self.bot.loop.create_task(self._apply_volume_to_current())
+            return
+        try:
+            new = self._create_audio_source(song, start_seconds=old.position_seconds)
+            if transition is not None:
+                transition.clear_next()  # 用意済みの次の曲も古い音量で開いている
+                if transition.swap_main(new) is None:
+                    new.cleanup()
+                    return
+            else:
+                self._swap_source(vc, new)
+        except Exception as e:
+            logger.warning(f"音量変更の反映に失敗（次の曲から反映されます）: {e}")
+            return
+        old.cleanup()
+        logger.debug(f"音量変更を反映: {int(self.volume * 100)}% ({new.start_seconds:.1f}s から)")
+
+    @staticmethod
+    def _swap_source(vc: discord.VoiceClient, source: discord.AudioSource) -> None:
+        """再生中の音源を差し替える（after は呼ばれないので曲は進まない）。
+        AudioPlayer.set_source は差し替えの後に必ず resume するので、一時停止中だったら止め直す"""
+        paused = vc.is_paused()
+        vc.source = source
+        if paused:
+            vc.pause()
+
     def get_volume(self) -> float:
         """現在のボリュームを取得する"""
         return self.volume
 
-    def prepare_source(self, song: Song, max_retries: int = 3) -> Song:
-        """音楽ソースを準備する（リトライ機能付き）"""
-        import glob as glob_module
-        last_error = None
+    def _playing_song(self) -> Optional[Song]:
+        """実際に流れている曲（乗り継ぎ直後で current の更新がまだでも正しい曲を返す）"""
+        vc = self.voice_client
+        source = vc.source if vc else None
+        if isinstance(source, TransitionSource):
+            return source.song
+        return self.current
+
+    def get_position(self) -> float:
+        """再生中の曲の再生位置（秒）。再生していなければ 0.0"""
+        vc = self.voice_client
+        source = vc.source if vc else None
+        return float(getattr(source, 'position_seconds', 0.0)) if source is not None else 0.0
+
+    def get_duration(self) -> Optional[float]:
+        """再生中の曲の長さ（秒）。分からなければ None"""
+        song = self._playing_song()
+        return song.duration if song else None
+
+    async def seek(self, position_seconds: float) -> float:
+        """再生中の曲の指定位置へ移動する。移動後の位置を返す（一時停止中なら一時停止のまま）"""
+        vc = self.voice_client
+        song = self._playing_song()
+        if not vc or song is None or not (vc.is_playing() or vc.is_paused()):
+            raise ValueError("再生中の曲がありません")
+        if not math.isfinite(position_seconds) or position_seconds < 0:
+            raise ValueError("位置は 0 秒以上で指定してください")
+        if song.duration and position_seconds >= song.duration:
+            raise ValueError("曲の長さを超えています")
+
+        old = vc.source
+        new = self._create_playback(song, start_seconds=position_seconds)
+        self._swap_source(vc, new)
+        old.cleanup()
+        logger.info(f"シーク: {song.title} → {position_seconds:.1f}s (Guild: {self.guild_id})")
+        await self.notify_clients(self.guild_id)
+        return position_seconds
+
+    @staticmethod
+    def _resolve_source_path(source: str) -> str:
+        """ローカルファイルなら絶対パスにする（URL はそのまま）"""
+        if not source.startswith(('http://', 'https://')) and not os.path.isabs(source):
+            return os.path.abspath(source)
+        return source
+
+    def _refresh_cached_source(self, song: Song) -> None:
+        """キャッシュが Opus へ変換されて元ファイルが消えていたら、索引の新しいパスへ付け替える"""
+        fill = song.cache_fill
+        if not song.video_id or not song.source or (fill is not None and not fill.finished):
+            return
+        if not os.path.isabs(self._resolve_source_path(song.source)):
+            return
+        entry = get_audio_cache().lookup(song.video_id)
+        if entry is not None and entry.path != song.source:
+            song.source = entry.path
+
+    def _source_available(self, song: Song) -> bool:
+        """再生できる音源があるか（URL・キャッシュ書き込み中・存在するローカルファイル）"""
+        fill = song.cache_fill
+        if fill is not None and not fill.finished:
+            return True
+        self._refresh_cached_source(song)
+        source_path = self._resolve_source_path(song.source)
+        return source_path.startswith(('http://', 'https://')) or os.path.exists(source_path)
+
+    def _create_audio_source(self, song: Song, start_seconds: float = 0.0) -> TrackAudioSource:
+        """曲の音源から再生用の AudioSource を作る（音量は FFmpeg 側で掛ける）。
+        キャッシュ書き込み中ならダウンロード済みの部分をパイプで FFmpeg に渡してストリーム再生する"""
+        fill = song.cache_fill
+        if fill is not None and fill.done:
+            song.cache_fill = fill = None  # 書き込み完了済み → 以降は普通のキャッシュファイル
+        self._refresh_cached_source(song)
+        path = self._resolve_source_path(song.source)
+        if fill is None and not path.startswith(('http://', 'https://')):
+            schedule_loudness_analysis(song.video_id, path)  # 未解析なら次回の再生から正規化される
+        return TrackAudioSource(
+            path,
+            volume=self.volume,
+            gain_db=playback_gain_db(song.video_id, path),
+            start_seconds=start_seconds,
+            fill=fill,
+        )
+
+    def _create_pcm_source(self, song: Song, start_seconds: float = 0.0) -> discord.FFmpegPCMAudio:
+        """クロスフェード用の PCM 音源（音量・ラウドネスのゲインは FFmpeg 側で掛ける）"""
+        fill = song.cache_fill if song.cache_fill is not None and not song.cache_fill.done else None
+        self._refresh_cached_source(song)
+        path = self._resolve_source_path(song.source)
+        ffmpeg_opts = get_ffmpeg_options(is_local_file=fill is not None or not path.startswith(('http://', 'https://')))
+        before_options = ffmpeg_opts['before_options']
+        options = ffmpeg_opts['options']
+        if start_seconds > 0:
+            if fill is None and not path.startswith(('http://', 'https://')):
+                before_options = f'-ss {start_seconds:.2f} ' + before_options
+            else:
+                options = f'-ss {start_seconds:.2f} ' + options
+        factor = self.volume * 10 ** (playback_gain_db(song.video_id, path) / 20)
+        if factor != 1.0:
+            options += f' -af volume={factor:.4f}'
+        return discord.FFmpegPCMAudio(
+            fill.open_reader() if fill is not None else path,
+            pipe=fill is not None,
+            before_options=before_options,
+            options=options,
+        )
+
+    def _create_playback(self, song: Song, start_seconds: float = 0.0) -> discord.AudioSource:
+        """vc.play() に渡す音源。ギャップレス有効時は次の曲へ乗り継げる TransitionSource で包む"""
+        source = self._create_audio_source(song, start_seconds=start_seconds)
+        if not settings.music.gapless:
+            return source
+        loop = self.bot.loop
+        return TransitionSource(
+            song,
+            source,
+            crossfade_seconds=max(0.0, settings.music.crossfade_seconds),
+            request_next=lambda t: loop.call_soon_threadsafe(self._open_next_for_transition, t),
+            on_switch=lambda old, new: loop.call_soon_threadsafe(self._on_transition, old, new),
+            bitrate_kbps=settings.music.opus_bitrate_kbps,
+        )
+
+    def _active_transition(self) -> Optional[TransitionSource]:
+        vc = self.voice_client
+        source = vc.source if vc else None
+        return source if isinstance(source, TransitionSource) else None
+
+    def _transition_candidate(self, transition: TransitionSource) -> Optional[Song]:
+        """乗り継ぎ先: 再生中の曲がキュー先頭なら、その次の曲"""
+        if len(self.queue) < 2 or self.queue[0] is not transition.song:
+            return None
+        candidate = self.queue[1]
+        return None if candidate.pending else candidate
+
+    def _open_next_for_transition(self, transition: TransitionSource) -> None:
+        """再生中の曲の終わりが近づいたとき（TransitionSource から要求される）: 次の曲の音源を開いて渡す"""
+        if transition is not self._active_transition() or not transition.awaiting_next:
+            return
+        nxt = self._transition_candidate(transition)
+        if nxt is None:
+            return  # キューが変わったら _refresh_transition で改めて
+        if nxt.source is None:
+            # まだ準備できていない → 準備が終わったらもう一度
+            fut = self._prepare_in_background(nxt)
+            fut.add_done_callback(
+                lambda f: f.cancelled() or f.exception() is not None or self._open_next_for_transition(transition)
+            )
+            return
+        if not self._source_available(nxt):
+            return
+        current = transition.song
+        crossfade = transition.crossfade_seconds
+        try:
+            if crossfade > 0 and current.duration and current.duration > crossfade and (nxt.duration or 0) > crossfade:
+                fade_start = current.duration - crossfade
+                prepared = PreparedNext(
+                    song=nxt,
+                    main=self._create_audio_source(nxt, start_seconds=crossfade),
+                    fade_out=self._create_pcm_source(current, start_seconds=fade_start),
+                    fade_in=self._create_pcm_source(nxt),
+                    fade_start=fade_start,
+                    for_song=current,
+                )
+            else:
+                prepared = PreparedNext(song=nxt, main=self._create_audio_source(nxt), for_song=current)
+        except Exception as e:
+            logger.warning(f"次の曲の音源を開けませんでした（曲間は通常どおり切り替えます）: {nxt.title}: {e}")
+            return
+        if transition.set_next(prepared):
+            logger.debug(f"次の曲を用意: {nxt.title}")
+
+    def _refresh_transition(self) -> None:
+        """キュー編集後: 用意済みの次の曲がキューの次でなくなっていたら捨てる（必要なら改めて開く）"""
+        transition = self._active_transition()
+        if transition is None or transition.fading:
+            return
+        held = transition.next_song
+        if held is not None and held is not self._transition_candidate(transition):
+            transition.clear_next()
+        elif transition.awaiting_next:
+            self._open_next_for_transition(transition)
+
+    def _on_transition(self, old: Song, new: Song) -> None:
+        """TransitionSource が次の曲へ乗り継いだ: キュー・現在の曲・履歴を合わせる"""
+        if self.queue and self.queue[0] is old:
+            self.queue.popleft()
+        if not (self.queue and self.queue[0] is new):
+            # 乗り継いだ後にキューが編集されていた → 再生中の曲を先頭に置き直す
+            self.queue.discard(new)
+            self.queue.appendleft(new)
+        self.current = new
+        self.history.append(new)
+        logger.info(f"再生開始（乗り継ぎ）: {new.title}")
+        self.bot.loop.create_task(self._after_transition(new))
+
+    async def _after_transition(self, song: Song) -> None:
+        await self._record_play_history(song)
+        await self.notify_clients(self.guild_id)
+        self._schedule_prefetch()
+
+    def prepare_source(self, song: Song) -> Song:
+        """音楽ソースを準備する（1回だけ試す。一時的な失敗の再試行はスケジューラが間隔を空けて行う）。
+        非公開・削除済みなど恒久的な失敗は video_id ごとに記録し、PermanentExtractionError を投げる"""
+        if self.is_local_path(song.url):
+            if not os.path.exists(song.url):
+                raise PermanentExtractionError(f"ファイルが存在しません: {song.url}", "missing_file")
+            song.source = song.url
+            logger.debug(f"ローカルファイルを使用: {song.url}")
+            return song
+
+        # キャッシュチェック: video_id でキャッシュ索引を引く（extract_info もディレクトリ走査も不要）
+        if song.video_id:
+            cached = get_audio_cache().lookup(song.video_id)
+            if cached is not None:
+                logger.info(f"キャッシュを使用: {cached.path}")
+                song.source = cached.path
+                schedule_opus_transcode(song.video_id, cached.path)  # 変換前からのキャッシュ
+                return song
+
+            # 別のキュー項目/ギルドがこの曲をストリーム再生中ならその書き込みに相乗りする
+            fill = find_active_fill(song.video_id)
+            if fill is not None:
+                logger.info(f"進行中のキャッシュ書き込みを共有: {fill.final_path}")
+                song.source = fill.final_path
+                song.cache_fill = fill
+                return song
+
+        failures = get_failure_cache()
+        failures.check(song.video_id)
+        try:
+            return self._download_source(song)
+        except Exception as e:
+            permanent = failures.remember(song.video_id, e)
+            if permanent is not None:
+                logger.error(f"再生できない動画です: {song.title}: {permanent}")
+                raise permanent from e
+            logger.warning(f"ソース準備エラー: {song.title}: {e}")
+            raise
+
+    def _download_source(self, song: Song) -> Song:
+        """未キャッシュの曲をストリーム再生（キャッシュへ並行書き込み）または全体ダウンロードで準備する。
+        追加時の抽出結果が期限内ならそれを使い、抽出はしない"""
+        info = self._take_resolved_info(song)
+        if settings.music.stream_first:
+            fill, info = self._start_cache_fill(song, info)
+            if fill is not None:
+                song.source = fill.final_path
+                song.cache_fill = fill
+                logger.info(f"ストリーム再生を開始（キャッシュへ並行書き込み）: {song.title}")
+                return song
 
-        for attempt in range(max_retries):
+        filename = None
+        if info is not None:
             try:
-                if self.is_local_path(song.url):
-                    if not os.path.exists(song.url):
-                        raise FileNotFoundError(f"ファイルが存在しません: {song.url}")
-                    song.source = song.url
-                    logger.debug(f"ローカルファイルを使用: {song.url}")
-                else:
-                    if attempt > 0:
-                        logger.info(f"ダウンロードリトライ ({attempt + 1}/{max_retries}): {song.title}")
+                filename = self._download_resolved(info)
+            except Exception as e:
+                if permanent_reason(e) is not None:
+                    raise
+                logger.warning(f"取得済みの情報でのダウンロードに失敗したため抽出し直します: {song.title}: {e}")
 
-                    # キャッシュチェック: video_idを使ってファイルを検索（extract_info不要）
-                    if song.video_id:
-                        cache_pattern = os.path.join(
-                            settings.music.directory,
-                            f"*-{song.video_id}.*"
-                        )
-                        cached_files = glob_module.glob(cache_pattern)
-                        if cached_files:
-                            # 最新のキャッシュファイルを使用
-                            cached_file = cached_files[0]
-                            logger.info(f"キャッシュを使用: {cached_file}")
-                            song.source = cached_file
-                            return song
-
-                    logger.debug(f"音楽をダウンロード中: {song.title} ({song.url})")
-
-                    # ダウンロード実行（1回のextract_info呼び出しのみ）
-                    info, used_ytdl = extract_info_with_fallback(song.url, download=True)
-                    if info is None:
-                        raise Exception("動画情報の取得に失敗しました")
+        if filename is None:
+            logger.debug(f"音楽をダウンロード中: {song.title} ({song.url})")
 
-                    if 'entries' in info:
-                        info = info['entries'][0] if info['entries'] else None
-                        if info is None:
-                            raise Exception("プレイリストに有効な動画がありません")
+            # ダウンロード実行（1回のextract_info呼び出しのみ）
+            info, used_ytdl = extract_info_with_fallback(song.url, download=True)
+            if info is None:
+                raise Exception("動画情報の取得に失敗しました")
 
-                    # 元のファイル名をそのまま使用（拡張子変換なし）
-                    filename = used_ytdl.prepare_filename(info)
+            if 'entries' in info:
+                info = info['entries'][0] if info['entries'] else None
+                if info is None:
+                    raise Exception("プレイリストに有効な動画がありません")
+
+            self._apply_resolved_info(song, info)
+            # 元のファイル名をそのまま使用（拡張子変換なし）
+            filename = used_ytdl.prepare_filename(info)
+
+        if not os.path.exists(filename):
+            logger.error(f"ダウンロードされたファイルが見つかりません: {filename}")
+            raise FileNotFoundError(f"ダウンロードされたファイルが見つかりません: {filename}")
+
+        video_id = info.get('id') or song.video_id
+        get_audio_cache().add(video_id, filename)
+        schedule_opus_transcode(video_id, filename)
+        schedule_cache_eviction(self.bot.loop, "ダウンロード完了")
+        song.source = filename
+
+        logger.debug(f"音源準備完了: {song.source}")
+        return song
+
+    @staticmethod
+    def _take_resolved_info(song: Song) -> Optional[dict]:
+        """追加時の抽出結果を取り出す（曲からは外す）。失効間際なら None"""
+        info, expires_at = song.resolved_info, song.resolved_expires_at
+        song.resolved_info = song.resolved_expires_at = None
+        if info is None or expires_at is None:
+            return None
+        if expires_at - RESOLVED_INFO_EXPIRY_MARGIN_SECONDS <= time.time():
+            logger.info(f"追加時に取得したストリーム URL が失効間際のため抽出し直します: {song.title}")
+            return None
+        return info
+
+    @staticmethod
+    def _download_resolved(info: dict) -> str:
+        """フォーマット選択済みの抽出結果から、抽出し直さずにダウンロードする。保存先のパスを返す"""
+        with get_ytdl_pool().checkout() as ydl:
+            ydl.process_info(dict(info))
+            return ydl.prepare_filename(info)
+
+    def _submit_prepare(self, song: Song, priority: JobPriority) -> asyncio.Future:
+        """prepare_source をスケジューラへ投入する（一時的な失敗は間隔を空けて最大 PREPARE_MAX_ATTEMPTS 回）"""
+        return self.scheduler.submit(
+            self.prepare_source, song, priority=priority, guild_id=self.guild_id, label=song.title,
+            retry=is_transient_error, max_attempts=PREPARE_MAX_ATTEMPTS,
+        )
 
-                    if not os.path.exists(filename):
-                        logger.error(f"ダウンロードされたファイルが見つかりません: {filename}")
-                        raise FileNotFoundError(f"ダウンロードされたファイルが見つかりません: {filename}")
+    def _prepare_in_background(self, song: Song, priority: JobPriority = JobPriority.HEAD) -> asyncio.Future:
+        """prepare_source をスケジューラで実行する。同じ曲の準備が進行中ならその Future を共有する
+        （先読みとして待っていた曲が先頭になったら優先度を引き上げる）"""
+        key = id(song)
+        fut = self._preparing.get(key)
+        if fut is not None:
+            self.scheduler.promote(fut, priority)
+        else:
+            leader = _prepare_flights.get(song.video_id)
+            if leader is not None:
+                # 同じ曲を別の呼び出し（他ギルドを含む）が準備中 → 二重にダウンロードせず結果を共有する
+                self.scheduler.promote(leader, priority)
+                fut = self.bot.loop.create_task(self._follow_prepare(song, leader, priority))
+            else:
+                fut = _prepare_flights.register(song.video_id, self._submit_prepare(song, priority))
+            self._preparing[key] = fut
 
-                    song.source = filename
+            def _done(f: asyncio.Future, k: int = key) -> None:
+                self._preparing.pop(k, None)
+                if not f.cancelled():
+                    f.exception()  # 誰も待っていない先読み失敗で "never retrieved" 警告を出さない
 
-                logger.debug(f"音源準備完了: {song.source}")
-                return song
+            fut.add_done_callback(_done)
+        return fut
 
+    async def _follow_prepare(self, song: Song, leader: asyncio.Future, priority: JobPriority) -> Song:
+        """同じ曲の準備が終わるのを待って結果（キャッシュファイル/書き込み中のキャッシュ）を song に写す。
+        先行の準備が取り消された（そのギルドの終了など）ときだけ自分で準備し直す"""
+        try:
+            prepared = await asyncio.shield(leader)
+        except asyncio.CancelledError:
+            if not leader.cancelled():
+                raise
+            return await self._submit_prepare(song, priority)
+        song.source = prepared.source
+        song.cache_fill = prepared.cache_fill
+        logger.info(f"同じ曲の準備結果を共有: {song.title}")
+        return song
+
+    async def _fetch_song_info(
+        self, url: str, added_by=None, priority: JobPriority = JobPriority.INTERACTIVE
+    ) -> List[Song]:
+        """get_song_info をスケジューラで実行する。同じ URL の取得が進行中ならその結果を共有する
+        （進行中の取得の優先度が priority より低ければ引き上げる）"""
+        key = history_db.extract_video_id(url) or url
+        leader = _info_flights.get(key)
+        if leader is not None:
+            self.scheduler.promote(leader, priority)
+            try:
+                songs = await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                if not leader.cancelled():
+                    raise
+            else:
+                # キュー項目は別オブジェクトにする（追加したユーザーはこちらの呼び出しのもの）
+                return [replace(s, added_by=added_by) for s in songs]
+        fut = _info_flights.register(key, self.scheduler.submit(
+            self.get_song_info, url, added_by, priority=priority, guild_id=self.guild_id, label=url
+        ))
+        return await fut
+
+    def _prefetch_window(self) -> List[Song]:
+        """先読みする範囲。再生中の先頭を除き、情報取得済みの次の prefetch_depth 件（キュー順）"""
+        return [s for s in islice(self.queue, 1, None) if not s.pending][:self.prefetch_depth]
+
+    def _prefetch_candidates(self) -> List[Song]:
+        """先読み対象。先読みする範囲のうち未準備のもの（キュー順）"""
+        return [
+            s for s in self._prefetch_window()
+            if s.source is None and not self.is_local_path(s.url) and s.entry_id not in self._prefetch_failed
+        ]
+
+    def _cancel_stale_prefetch(self) -> None:
+        """削除・並べ替えで先読みする範囲から外れた曲の準備を、スケジューラでまだ始まっていなければ取り消す。
+        先頭に来た曲は再生ループが同じ Future を待つので取り消さない"""
+        keep = {s.entry_id for s in self._prefetch_window()}
+        if len(self.queue) > 0:
+            keep.add(self.queue[0].entry_id)
+        for entry_id, fut in list(self._prefetch_jobs.items()):
+            if fut.done():
+                del self._prefetch_jobs[entry_id]
+            elif entry_id not in keep:
+                del self._prefetch_jobs[entry_id]
+                # 同じ曲の先行の準備に合流しているだけならその待ちをやめる（先行の準備はそちらの持ち主のもの）
+                cancelled = fut.cancel() if isinstance(fut, asyncio.Task) else self.scheduler.cancel(fut)
+                if cancelled:
+                    logger.info(f"先読みの範囲から外れたため準備を取り消しました: {entry_id}")
+
+    def _schedule_prefetch(self) -> None:
+        """再生開始・キュー変更のたびに呼び、先読みを計画し直す。
+
+        先読み中の曲が先頭候補でなくなった（削除・並べ替え）ときは待つのをやめて、新しい先頭候補から始め直す。
+        範囲から外れた曲の準備は、まだ始まっていなければスケジューラから取り消す
+        （実行中のダウンロード自体は止められないが、完了すれば結果は曲に残り、後で同じ Future に合流できる）
+        """
+        self._refresh_transition()
+        if self.prefetch_depth <= 0 or self.shutdown_flag:
+            return
+        self._prefetch_failed = {e for e in self._prefetch_failed if self.queue.get(e) is not None}
+        self._cancel_stale_prefetch()
+
+        candidates = self._prefetch_candidates()
+        task = self._prefetch_task
+        if task and not task.done():
+            if candidates and candidates[0] is self._prefetch_target:
+                return
+            task.cancel()
+        self._prefetch_task = self.bot.loop.create_task(self._prefetch_loop()) if candidates else None
+
+    async def _prefetch_loop(self) -> None:
+        """キュー順に1曲ずつ準備する。1曲終わるごとに候補を見直すのでキュー変更に追従する"""
+        while not self.shutdown_flag:
+            candidates = self._prefetch_candidates()
+            if not candidates:
+                break
+            song = candidates[0]
+            self._prefetch_target = song
+            was_lazy = song.lazy
+            try:
+                fut = self._prepare_in_background(song, JobPriority.PREFETCH)
+                self._prefetch_jobs[song.entry_id] = fut
+                await asyncio.shield(fut)
+                logger.info(f"先読み完了: {song.title}")
+                if was_lazy and not song.lazy:
+                    await self.notify_clients(self.guild_id)  # 簡易エントリの詳細が埋まった
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                last_error = e
-                logger.warning(f"ソース準備エラー (試行 {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    import time
-                    time.sleep(2 ** attempt)  # 指数バックオフ: 1秒, 2秒, 4秒...
+                self._prefetch_failed.add(song.entry_id)
+                logger.warning(f"先読みに失敗（先頭に来たときに再試行します）: {song.title}: {e}")
+            finally:
+                if self._prefetch_target is song:
+                    self._prefetch_target = None
+
+    def _start_cache_fill(self, song: Song, info: Optional[dict] = None) -> tuple[Optional[CacheFill], dict]:
+        """ストリーム URL を抽出し（info があればそれを使う）、キャッシュファイルへの書き込みを開始する（最初のデータ到着まで待つ）。
+        (書き込み, 使った抽出結果) を返す。直接取得できない形式なら書き込みは None で、
+        呼び出し側は同じ抽出結果で従来どおり全体をダウンロードする"""
+        if info is None:
+            info = self._extract_stream_info(song.url)
+            self._apply_resolved_info(song, info)
+        else:
+            logger.info(f"追加時に取得したストリーム URL を使用: {song.title}")
+        stream = select_direct_stream(info)
+        if stream is None:
+            logger.info(f"直接ストリームできない形式のため通常ダウンロードします: {song.title} ({info.get('protocol')})")
+            return None, info
+        with get_ytdl_pool().checkout() as ydl:
+            final_path = ydl.prepare_filename(info)
+        video_id = info.get('id') or song.video_id
+
+        def _refresh() -> tuple[str, dict]:
+            # 書き込みスレッドから呼ばれる。抽出は他の抽出と同じくスケジューラのワーカーで行う
+            job = asyncio.run_coroutine_threadsafe(self._submit_stream_refresh(song), self.bot.loop)
+            try:
+                fresh = job.result(timeout=STREAM_REFRESH_TIMEOUT_SECONDS)
+            except TimeoutError:
+                job.cancel()
+                raise
+            fresh_stream = select_direct_stream(fresh)
+            if fresh_stream is None:
+                raise Exception("ストリーム URL を再取得できませんでした")
+            return fresh_stream['url'], fresh_stream['http_headers']
+
+        fill = get_or_start_fill(final_path, lambda: CacheFill(
+            stream['url'],
+            stream['http_headers'],
+            final_path,
+            refresh=_refresh,
+            total_size=stream['filesize'],
+            on_done=lambda f: self._on_cache_fill_done(video_id, f),
+        ))
+        if not fill.wait_for_data(timeout=STREAM_START_TIMEOUT_SECONDS):
+            logger.warning(f"ストリームの最初のデータが届くのを待ちきれませんでした（再生側で待機します）: {song.title}")
+        return fill, info
+
+    @staticmethod
+    def _extract_stream_info(url: str) -> dict:
+        """単曲の URL からフォーマット選択済みの抽出結果を得る"""
+        info, _ = extract_info_with_fallback(url, download=False)
+        if 'entries' in info:
+            info = info['entries'][0] if info['entries'] else None
+            if info is None:
+                raise Exception("プレイリストに有効な動画がありません")
+        return info
 
-        logger.error(f"ソース準備に{max_retries}回失敗しました: {last_error}", exc_info=True)
-        raise last_error
+    async def _submit_stream_refresh(self, song: Song) -> dict:
+        """キャッシュ書き込み中に失効したストリーム URL の再抽出をスケジューラへ投入する（再生中の曲なので HEAD）"""
+        return await self.scheduler.submit(
+            self._reextract_stream, song, priority=JobPriority.HEAD, guild_id=self.guild_id, label=song.title
+        )
+
+    @staticmethod
+    def _reextract_stream(song: Song) -> dict:
+        """ストリーム URL の再抽出（ワーカースレッド）。再生できないと分かっている動画は抽出せず、
+        恒久的な失敗は失敗キャッシュへ記録する"""
+        failures = get_failure_cache()
+        failures.check(song.video_id)
+        try:
+            return MusicPlayer._extract_stream_info(song.url)
+        except Exception as e:
+            permanent = failures.remember(song.video_id, e)
+            if permanent is not None:
+                raise permanent from e
+            raise
+
+    def _on_cache_fill_done(self, video_id: str, fill: CacheFill) -> None:
+        """キャッシュ書き込み完了（書き込みスレッドから呼ばれる）: 索引へ登録し、容量超過なら掃除する"""
+        get_audio_cache().add(video_id, fill.final_path)
+        schedule_opus_transcode(video_id, fill.final_path)
+        schedule_loudness_analysis(video_id, fill.final_path)
+        schedule_cache_eviction(self.bot.loop, "ダウンロード完了")
 
     def is_local_path(self, path: str) -> bool:
         """パスがローカルファイルパスかどうか判定する"""
@@ -488,11 +1350,12 @@ class MusicPlayer:
         self.queue.append(placeholder)
         await self.notify_clients(self.guild_id)
 
-        loop = asyncio.get_event_loop()
+        if is_playlist_url(url):
+            await self._add_playlist_incrementally(url, added_by, placeholder)
+            return
+
         try:
-            songs = await loop.run_in_executor(self.executor, self.get_song_info, url, added_by)
-            if not songs:
-                raise Exception("楽曲情報が空でした")
+            songs = await self._resolve_url(url, added_by)
         except Exception as e:
             logger.error(f"曲の追加に失敗（プレースホルダを削除）: {url}: {e}")
             self._replace_in_queue(placeholder, [])
@@ -503,23 +1366,289 @@ class MusicPlayer:
 
         self._replace_in_queue(placeholder, songs)
         await self.notify_clients(self.guild_id)
+        self._schedule_prefetch()
         # 再生中/一時停止中でなければ再生ループを再開する（一時停止中に起こすと現在の曲が飛ぶ）
         if self.voice_client and not self.voice_client.is_playing() and not self.voice_client.is_paused():
             self.next.set()
 
-    def _replace_in_queue(self, placeholder: "Song", songs: List["Song"]) -> None:
-        """キュー内のプレースホルダを songs（0件なら削除）に置き換える。見つからなければ末尾に追加"""
-        items = list(self.queue)
+    async def _resolve_url(self, url: str, added_by=None) -> List[Song]:
+        """曲追加の URL（またはキーワード）を Song にする。取得できなければ例外"""
+        if settings.music.ytmusic_keyword_search and is_keyword_query(url):
+            # キーワードは ytmusicapi の検索で video_id に解決し、以降は URL と同じ経路
+            # （見つからなければキーワードのまま yt-dlp の検索へ）
+            video_id = await asyncio.to_thread(get_keyword_resolver().resolve, url)
+            if video_id:
+                url = f"https://www.youtube.com/watch?v={video_id}"
+        # 再生できないと分かっている動画は抽出せずに即座に失敗させる
+        get_failure_cache().check(history_db.extract_video_id(url))
+        # メタデータキャッシュに当たれば yt-dlp のワーカー待ちに並ばずに済ませる
+        cached_song = await asyncio.to_thread(self._song_from_metadata_cache, url, added_by)
+        songs = [cached_song] if cached_song is not None else await self._fetch_song_info(url, added_by)
+        if not songs:
+            raise Exception("楽曲情報が空でした")
+        return songs
+
+    async def add_track_to_queue(self, track: dict, added_by=None) -> str:
+        """検索結果など、クライアントが曲情報（title/artist/thumbnail/url）を持っている曲をすぐにキューへ入れる。
+
+        プレースホルダを経ず、その曲情報（メタデータキャッシュにあればそちら）で作った曲をそのまま入れて1回だけ通知する。
+        yt-dlp の抽出は音源を準備するときの1回だけで、それまでにクライアントの曲情報は
+        急がない仕事として yt-dlp の情報と突き合わせる（_verify_client_track）。
+        エントリ ID を返す。単曲の動画 URL でなければ ValueError（呼び出し側は add_to_queue を使う）、
+        再生できないと分かっている動画なら PermanentExtractionError
+        """
+        url = (track.get('url') or '').strip()
+        if not history_db.extract_video_id(url) or is_playlist_url(url):
+            raise ValueError(f"not a single video URL: {url!r}")
+        song = await asyncio.to_thread(self._song_from_metadata_cache, url, added_by)
+        if song is None:
+            song = self._song_from_client_track(track, added_by)
+        else:
+            get_failure_cache().check(song.video_id)
+        self.queue.append(song)
+        await self.notify_clients(self.guild_id)
+        self._schedule_prefetch()
+        if self.voice_client and not self.voice_client.is_playing() and not self.voice_client.is_paused():
+            self.next.set()
+        if song.lazy:
+            self._start_enqueue_task(self._verify_client_track(song))
+        return song.entry_id
+
+    async def _verify_client_track(self, song: Song) -> None:
+        """クライアントの曲情報で入れた曲を yt-dlp の情報と突き合わせる。
+
+        フラット展開の簡易エントリを音源準備で埋めるとき（_apply_resolved_info）と同じく yt-dlp の情報を正とし、
+        表示が変わったときだけ通知する。再生できない動画ならキューから外す。
+        取得した抽出結果は曲に持たせ、音源準備で使い回す。先に音源の準備で詳細が埋まった曲は何もしない。
+        """
+        try:
+            # 同じ動画の曲追加・確認が進行中ならその結果を使う（同じ URL を二重に抽出しない）
+            infos = await self._fetch_song_info(song.url, song.added_by, priority=JobPriority.WARMUP)
+        except PermanentExtractionError as e:
+            if song in self.queue and not (self.queue[0] is song and self.current is song):
+                logger.warning(f"再生できない動画のためキューから外します: {song.title}: {e}")
+                self.queue.remove(song)
+                self._schedule_prefetch()
+                await self.notify_clients(self.guild_id)
+            return
+        except Exception as e:
+            logger.info(f"曲情報の確認に失敗（音源準備で改めて取得します）: {song.title}: {e}")
+            return
+        if not infos or song not in self.queue or not song.lazy:
+            return
+        resolved = infos[0]
+        if resolved.video_id and resolved.video_id != song.video_id:
+            logger.warning(f"クライアントの URL と取得した動画が異なります: {song.video_id} → {resolved.video_id}")
+        before = (song.title, song.artist, song.thumbnail)
+        song.title = resolved.title or song.title
+        song.artist = resolved.artist or song.artist
+        song.thumbnail = resolved.thumbnail or song.thumbnail
+        song.duration = resolved.duration or song.duration
+        if resolved.resolved_info is not None and song.resolved_info is None:
+            song.resolved_info = resolved.resolved_info
+            song.resolved_expires_at = resolved.resolved_expires_at
+        song.lazy = False
+        if (song.title, song.artist, song.thumbnail) != before:
+            await self.notify_clients(self.guild_id)
+
+    async def add_many_to_queue(self, tracks: List[dict], added_by=None) -> List[str]:
+        """複数の曲（URL と分かっている曲情報）をまとめてキューへ追加する。
+
+        全曲分のプレースホルダをその順で一度に入れて1回だけ通知し、情報の取得はバックグラウンドで
+        bulk_enqueue_concurrency 曲ずつ並行して（キュー順に始めて）行う。取得できた曲からその場で差し替えるので、
+        先頭の曲は自分の情報が取れた時点で再生でき、後続の曲を待たない。
+        プレースホルダの entry_id を順に返す。
+        """
+        placeholders = [
+            Song(
+                source=None,
+                title=track.get('title') or "読み込み中…",
+                url=track['url'].strip(),
+                thumbnail=track.get('thumbnail') or '',
+                artist=track.get('artist') or '',
+                added_by=added_by,
+                pending=True,
+            )
+            for track in tracks
+            if (track.get('url') or '').strip()
+        ]
+        if not placeholders:
+            return []
+        self.queue.extend(placeholders)
+        await self.notify_clients(self.guild_id)
+
+        self._start_enqueue_task(self._resolve_placeholders(placeholders, added_by))
+        return [placeholder.entry_id for placeholder in placeholders]
+
+    def _start_enqueue_task(self, coro) -> None:
+        task = self.bot.loop.create_task(coro)
+        self._enqueue_tasks.add(task)
+        task.add_done_callback(self._enqueue_tasks.discard)
+
+    async def _resolve_placeholders(self, placeholders: List[Song], added_by) -> None:
+        """一括追加のプレースホルダを並行数を抑えて解決し、取得できた曲から差し替える（失敗した曲は取り除く）"""
+        semaphore = asyncio.Semaphore(max(1, settings.music.bulk_enqueue_concurrency))
+        changed = asyncio.Event()
+
+        async def _notifier() -> None:
+            # 差し替えが続いても通知は BULK_NOTIFY_INTERVAL_SECONDS に1回まで
+            while True:
+                await changed.wait()
+                changed.clear()
+                await self.notify_clients(self.guild_id)
+                await asyncio.sleep(BULK_NOTIFY_INTERVAL_SECONDS)
+
+        async def _resolve(placeholder: Song) -> None:
+            async with semaphore:  # 待ちは先着順なので、キューの前の曲から取得が始まる
+                if placeholder not in self.queue:
+                    return  # 取得を始める前に削除された
+                if is_playlist_url(placeholder.url):
+                    try:
+                        await self._add_playlist_incrementally(placeholder.url, added_by, placeholder)
+                    except Exception as e:
+                        logger.error(f"一括追加のプレイリストの展開に失敗: {placeholder.url}: {e}")
+                    return
+                try:
+                    songs = await self._resolve_url(placeholder.url, added_by)
+                except Exception as e:
+                    logger.error(f"一括追加の曲の取得に失敗（プレースホルダを削除）: {placeholder.url}: {e}")
+                    songs = []
+            if placeholder not in self.queue:
+                return  # 取得中に削除された
+            self._replace_in_queue(placeholder, songs)
+            changed.set()
+            self._schedule_prefetch()
+            if self.voice_client and not self.voice_client.is_playing() and not self.voice_client.is_paused():
+                self.next.set()
+
+        notifier = asyncio.create_task(_notifier())
         try:
-            idx = next(i for i, s in enumerate(items) if s is placeholder)
-        except StopIteration:
-            idx = None
-        if idx is None:
-            items.extend(songs)
+            await asyncio.gather(*(_resolve(placeholder) for placeholder in placeholders))
+        finally:
+            notifier.cancel()
+        await self.notify_clients(self.guild_id)  # 間引いた分も含めた最終状態
+
+    async def _add_playlist_incrementally(self, url: str, added_by, placeholder: Song) -> None:
+        """プレイリストをフラットに展開し、取得できた順にまとめてキューへ入れる。
+
+        最初のまとまりでプレースホルダを置き換え、以降は直前に入れた曲の後ろへ足していくので、
+        展開中に別の曲が追加されてもプレイリストの順序は崩れない。各曲の詳細（サムネイル等）と音源は
+        キューの先頭に近づいて準備されるときに取得する。
+        """
+        loop = asyncio.get_running_loop()
+        batches: asyncio.Queue = asyncio.Queue()
+
+        def _produce() -> int:
+            with get_ytdl_pool().checkout(flat=True) as ydl:
+                info = ydl.extract_info(url, download=False, process=False)
+                if info and info.get('_type') in ('url', 'url_transparent') and info.get('url'):
+                    info = ydl.extract_info(info['url'], download=False, process=False)  # 別 URL への転送
+            if info is None:
+                raise Exception(f"プレイリストの取得に失敗しました: {url}")
+            total = 0
+            batch: List[Song] = []
+            limit = PLAYLIST_FIRST_BATCH
+            for entry in info.get('entries') or []:  # 続きのページは反復に合わせて取得される
+                song = self._song_from_flat_entry(entry, added_by) if entry else None
+                if song is None:
+                    continue
+                batch.append(song)
+                if len(batch) >= limit:
+                    loop.call_soon_threadsafe(batches.put_nowait, batch)
+                    total += len(batch)
+                    batch, limit = [], PLAYLIST_BATCH
+            if batch:
+                loop.call_soon_threadsafe(batches.put_nowait, batch)
+                total += len(batch)
+            return total
+
+        job = self.scheduler.submit(_produce, priority=JobPriority.INTERACTIVE, guild_id=self.guild_id, label=url)
+        job.add_done_callback(lambda _f: batches.put_nowait(None))
+
+        anchor: Optional[Song] = placeholder
+        inserted = 0
+        while True:
+            batch = await batches.get()
+            if batch is None:
+                break
+            if anchor is placeholder:
+                self._replace_in_queue(placeholder, batch)
+            else:
+                self._insert_after(anchor, batch)
+            anchor = batch[-1]
+            inserted += len(batch)
+            await self.notify_clients(self.guild_id)
+            self._schedule_prefetch()
+            if self.voice_client and not self.voice_client.is_playing() and not self.voice_client.is_paused():
+                self.next.set()
+
+        error = job.exception() if not job.cancelled() else None
+        if inserted == 0:
+            logger.error(f"プレイリストの追加に失敗（プレースホルダを削除）: {url}: {error}")
+            self._replace_in_queue(placeholder, [])
+            await self.notify_clients(self.guild_id)
+            raise error or Exception("プレイリストから有効な曲を取得できませんでした")
+        if error is not None:
+            logger.warning(f"プレイリストの展開が途中で失敗（{inserted} 曲まで追加済み）: {error}")
         else:
-            items[idx:idx + 1] = songs
-        self.queue.clear()
-        self.queue.extend(items)
+            logger.info(f"プレイリストから {inserted} 曲を追加")
+
+    def _song_from_flat_entry(self, entry: dict, added_by=None) -> Optional[Song]:
+        """フラット展開の簡易エントリから Song を作る（メタデータキャッシュにあればそちらを使う）"""
+        video_id = entry.get('id')
+        if not video_id:
+            return None
+        try:
+            row = history_db.get_track_metadata(video_id, settings.music.metadata_ttl_hours)
+        except Exception:
+            row = None
+        if row is not None:
+            return Song(
+                source=None,
+                title=row['title'],
+                url=row['webpage_url'],
+                thumbnail=row['thumbnail'] or '',
+                artist=row['uploader'] or '',
+                added_by=added_by,
+                video_id=video_id,
+                duration=row['duration'],
+            )
+        url = entry.get('url') or ''
+        if not url.startswith(('http://', 'https://')):
+            url = f"https://www.youtube.com/watch?v={video_id}"
+        thumbnails = entry.get('thumbnails') or []
+        thumbnail = entry.get('thumbnail') or (thumbnails[-1].get('url') if thumbnails else '')
+        return Song(
+            source=None,
+            title=entry.get('title') or '',
+            url=url,
+            thumbnail=thumbnail or '',
+            artist=entry.get('uploader') or entry.get('channel') or '',
+            added_by=added_by,
+            video_id=video_id,
+            duration=entry.get('duration') or None,
+            lazy=True,
+        )
+
+    def _apply_resolved_info(self, song: Song, info: dict) -> None:
+        """音源準備で取得した yt-dlp の情報で、フラット展開の簡易エントリの詳細を埋める（ワーカースレッドから呼ぶ）"""
+        self._remember_metadata([info])
+        if not song.lazy:
+            return
+        song.title = info.get('title') or song.title
+        song.artist = info.get('uploader') or song.artist
+        song.thumbnail = info.get('thumbnail') or song.thumbnail
+        song.duration = info.get('duration') or song.duration
+        song.url = info.get('webpage_url') or song.url
+        song.lazy = False
+
+    def _insert_after(self, anchor: Song, songs: List[Song]) -> None:
+        """anchor の直後に songs を入れる。anchor がキューから消えていれば末尾に追加"""
+        self.queue.insert_after(anchor, songs)
+
+    def _replace_in_queue(self, placeholder: "Song", songs: List["Song"]) -> None:
+        """キュー内のプレースホルダを songs（0件なら削除）に置き換える。見つからなければ末尾に追加"""
+        self.queue.replace(placeholder, songs)
 
     def get_song_info(self, url: str, added_by=None) -> List[Song]:
         """URLから楽曲情報を取得する"""
@@ -540,6 +1669,7 @@ class MusicPlayer:
                         raise Exception("検索結果のエントリが無効です")
                 else:
                     raise Exception("検索結果が見つかりません")
+                self._remember_metadata([info])
                 return [self.build_song(info, added_by)]
             except Exception as e:
                 logger.error(f"検索エラー: {e}", exc_info=True)
@@ -557,6 +1687,16 @@ class MusicPlayer:
                 added_by=added_by
             )]
 
+        video_id = history_db.extract_video_id(url)
+        failures = get_failure_cache()
+        failures.check(video_id)
+
+        # 最近取得した曲ならメタデータキャッシュから組み立てる（yt-dlp もネットワークも使わない）
+        cached_song = self._song_from_metadata_cache(url, added_by)
+        if cached_song is not None:
+            logger.info(f"メタデータキャッシュを使用: {cached_song.title}")
+            return [cached_song]
+
         # YouTube/外部URLの処理
         try:
             logger.debug(f"yt-dlpで情報を取得中: {url}")
@@ -586,14 +1726,21 @@ class MusicPlayer:
                 if not songs:
                     raise Exception("プレイリストから有効な曲を取得できませんでした")
 
+                self._remember_metadata([e for e in entries if e is not None])
+
                 logger.info(f"プレイリストから {len(songs)} 曲を取得")
                 return songs
             else:
                 # 単一の動画
                 logger.info(f"単一動画を取得: {info.get('title', 'Unknown')}")
+                self._remember_metadata([info])
                 return [self.build_song(info, added_by)]
 
         except yt_dlp.utils.DownloadError as e:
+            permanent = failures.remember(video_id, e)
+            if permanent is not None:
+                logger.error(f"再生できない動画です: {url}: {permanent}")
+                raise permanent from e
             logger.error(f"yt-dlp ダウンロードエラー: {e}", exc_info=True)
             raise Exception(f"動画のダウンロードに失敗しました: {str(e)}")
         except Exception as e:
@@ -607,22 +1754,192 @@ class MusicPlayer:
         thumbnail = info.get('thumbnail', '')
         artist = info.get('uploader', 'Unknown Artist')
         video_id = info.get('id', '')  # YouTubeのビデオIDを保存
-        return Song(
+        song = Song(
             source=None,
             title=title,
             url=webpage_url,
             thumbnail=thumbnail,
             artist=artist,
             added_by=added_by,
-            video_id=video_id
+            video_id=video_id,
+            duration=info.get('duration') or None,
+        )
+        # 抽出で選ばれたストリーム URL を持たせ、再生時の2回目の抽出を省く
+        keep_resolved_info(song, info)
+        return song
+
+    def _song_from_metadata_cache(self, url: str, added_by=None) -> Optional[Song]:
+        """URL の video_id が TTL 内にメタデータキャッシュにあれば Song を返す"""
+        video_id = history_db.extract_video_id(url)
+        if not video_id:
+            return None
+        try:
+            row = history_db.get_track_metadata(video_id, settings.music.metadata_ttl_hours)
+        except Exception as e:
+            logger.warning(f"メタデータキャッシュの参照に失敗: {e}")
+            return None
+        if row is None:
+            return None
+        return Song(
+            source=None,
+            title=row['title'],
+            url=row['webpage_url'],
+            thumbnail=row['thumbnail'] or '',
+            artist=row['uploader'] or '',
+            added_by=added_by,
+            video_id=video_id,
+            duration=row['duration'],
         )
 
+    @staticmethod
+    def _remember_metadata(infos: List[dict]) -> None:
+        """yt-dlp の結果をメタデータキャッシュへ保存する（タイトル/URL が欠けた簡易エントリは保存しない）"""
+        rows = [
+            {
+                'video_id': info['id'],
+                'title': info['title'],
+                'uploader': info.get('uploader'),
+                'thumbnail': info.get('thumbnail'),
+                'duration': info.get('duration'),
+                'webpage_url': info['webpage_url'],
+            }
+            for info in infos
+            if info.get('id') and info.get('title') and info.get('webpage_url')
+        ]
+        try:
+            history_db.upsert_track_metadata(rows)
+        except Exception as e:
+            logger.warning(f"メタデータキャッシュの保存に失敗: {e}")
+
     async def remove_from_queue(self, position: int) -> None:
         """指定した位置のトラックをキューから削除する"""
         if 0 <= position < len(self.queue):
-            queue_list = list(self.queue)
-            del queue_list[position]
-            self.queue = deque(queue_list)
+            self.queue.remove(self.queue[position])
+            self._schedule_prefetch()
+
+    def _editable_entry(self, entry_id: Optional[str]) -> Optional[Song]:
+        """ID で指定された、編集してよいキュー項目（再生中の先頭は除く）。無ければ None"""
+        song = self.queue.get(entry_id) if entry_id else None
+        if song is None or (self.queue and self.queue[0] is song):
+            return None
+        return song
+
+    async def remove_entry(self, entry_id: str) -> bool:
+        """ID で指定したキュー項目を削除する。見つからない（既に消えた/再生中になった）なら False"""
+        song = self._editable_entry(entry_id)
+        if song is None:
+            return False
+        self.queue.remove(song)
+        self._schedule_prefetch()
+        return True
+
+    async def move_entry(self, entry_id: str, after_id: Optional[str] = None) -> bool:
+        """ID で指定したキュー項目を after_id の直後へ移す（None なら再生中の曲の直後）。
+        どちらかが見つからなければ False"""
+        song = self._editable_entry(entry_id)
+        if song is None:
+            return False
+        if after_id is None:
+            anchor = self.queue[0]
+        else:
+            anchor = self.queue.get(after_id)
+            if anchor is None:
+                return False
+        self.queue.move_after(song, anchor)
+        self._schedule_prefetch()
+        return True
+
+    async def apply_queue_operations(self, operations: List[dict], added_by=None) -> List[List[str]]:
+        """キューへの複数の操作をまとめて適用する（途中で失敗したら何もしなかった状態に戻す）。
+
+        操作は {"op": ..., ...} の辞書で、上から順に適用する:
+        - insert: tracks（title/artist/thumbnail/url）を after_id の直後へ入れる（after_id が無ければ末尾）
+        - remove: entry_id の曲を取り除く
+        - move: entry_id の曲を after_id の直後へ移す（after_id が無ければ再生中の曲の直後）
+        - clear: 再生中の曲以外をすべて取り除く
+        - shuffle: 再生中の曲以外を並べ替える
+        再生中の先頭は remove/move の対象にできない。間に await を挟まないので、他の操作や再生ループが
+        途中の状態を見ることはない。通知は呼び出し側が最後に1回だけ行う。
+
+        insert で入れた曲のエントリ ID を insert ごとに返す。ID が見つからなければ StaleQueueEntryError、
+        操作の内容がおかしければ ValueError（どちらもキューは元のまま）。
+        insert の曲情報はクライアントのものなので、add_track_to_queue と同じく後から yt-dlp の情報と突き合わせる。
+        """
+        snapshot = list(self.queue)
+        inserted: List[List[str]] = []
+        inserted_songs: List[Song] = []
+        try:
+            for operation in operations:
+                op = operation.get('op')
+                if op == 'insert':
+                    songs = [self._song_from_client_track(track, added_by) for track in operation.get('tracks') or []]
+                    after_id = operation.get('after_id')
+                    if after_id is None:
+                        self.queue.extend(songs)
+                    else:
+                        anchor = self.queue.get(after_id)
+                        if anchor is None:
+                            raise StaleQueueEntryError(after_id)
+                        self.queue.insert_after(anchor, songs)
+                    inserted.append([song.entry_id for song in songs])
+                    inserted_songs.extend(songs)
+                elif op == 'remove':
+                    song = self._editable_entry(operation.get('entry_id'))
+                    if song is None:
+                        raise StaleQueueEntryError(operation.get('entry_id'))
+                    self.queue.remove(song)
+                elif op == 'move':
+                    song = self._editable_entry(operation.get('entry_id'))
+                    if song is None:
+                        raise StaleQueueEntryError(operation.get('entry_id'))
+                    after_id = operation.get('after_id')
+                    anchor = self.queue[0] if after_id is None else self.queue.get(after_id)
+                    if anchor is None:
+                        raise StaleQueueEntryError(after_id)
+                    self.queue.move_after(song, anchor)
+                elif op == 'clear':
+                    for song in list(islice(self.queue, 1, None)):
+                        self.queue.remove(song)
+                elif op == 'shuffle':
+                    rest = list(islice(self.queue, 1, None))
+                    random.shuffle(rest)
+                    for song in rest:
+                        self.queue.remove(song)
+                    self.queue.extend(rest)
+                else:
+                    raise ValueError(f"unknown queue operation: {op!r}")
+        except Exception:
+            self.queue.clear()
+            self.queue.extend(snapshot)
+            raise
+
+        self._schedule_prefetch()
+        # 空のキューに曲が入ったら再生ループを起こす（一時停止中に起こすと現在の曲が飛ぶ）
+        if inserted and self.voice_client and not self.voice_client.is_playing() and not self.voice_client.is_paused():
+            self.next.set()
+        for song in inserted_songs:
+            if song in self.queue:  # 同じバッチの後の操作で取り除かれた曲は確認しない
+                self._start_enqueue_task(self._verify_client_track(song))
+        return inserted
+
+    def _song_from_client_track(self, track: dict, added_by=None) -> Song:
+        """クライアントが送ってきた曲情報（検索結果など）から Song を作る。
+        yt-dlp は呼ばず、詳細は音源を準備するときに埋める（フラット展開の簡易エントリと同じ扱い）"""
+        url = (track.get('url') or '').strip()
+        video_id = history_db.extract_video_id(url)
+        if not video_id or is_playlist_url(url):
+            raise ValueError(f"not a single video URL: {url!r}")
+        get_failure_cache().check(video_id)
+        return Song(
+            source=None,
+            title=track.get('title') or '',
+            url=url,
+            thumbnail=track.get('thumbnail') or '',
+            artist=track.get('artist') or '',
+            added_by=added_by,
+            video_id=video_id,
+            lazy=True,
+        )
 
     async def pause(self) -> None:
         """再生を一時停止する"""
@@ -643,49 +1960,35 @@ class MusicPlayer:
         await self.notify_clients(self.guild_id)
 
     async def previous(self) -> bool:
-        """前の曲に戻る"""
-        if self.history:
-            if self.voice_client and self.voice_client.is_playing():
-                self.voice_client.stop()
-            if self.current:
-                self.queue.appendleft(self.current)
-            prev_song = self.history.pop()
-            self.current = prev_song
-            if prev_song.source is None:
-                prev_song = await self.bot.loop.run_in_executor(
-                    self.executor, self.prepare_source, prev_song
-                )
-                self.current = prev_song
-            if self.voice_client:
-                # ファイルパスの絶対パス化
-                source_path = prev_song.source
-                if not source_path.startswith(('http://', 'https://')) and not os.path.isabs(source_path):
-                    source_path = os.path.abspath(source_path)
-                
-                # ローカルファイルかどうかを判定
-                is_local = not source_path.startswith(('http://', 'https://'))
-                ffmpeg_opts = get_ffmpeg_options(is_local_file=is_local)
-                audio_source = discord.FFmpegPCMAudio(
-                    source_path,
-                    before_options=ffmpeg_opts['before_options'],
-                    options=ffmpeg_opts['options']
-                )
-                transformed_source = discord.PCMVolumeTransformer(audio_source, volume=self.volume)
-                self.voice_client.play(
-                    transformed_source,
-                    after=lambda _: self.bot.loop.call_soon_threadsafe(self.next.set)
-                )
-            await self.notify_clients(self.guild_id)
-            return True
-        return False
+        """前の曲に戻る（前の曲をキュー先頭へ入れ、今の曲はその次へ戻す。再生はプレイヤーループが行う）"""
+        history = self.history
+        if self.current is not None and history and history[-1] is self.current:
+            if len(history) < 2:
+                return False
+            history.pop()  # 再生開始時に履歴へ入れた今の曲
+        if not history:
+            return False
+        prev_song = history.pop()
+        if self.current is not None and not (self.queue and self.queue[0] is self.current):
+            self.queue.discard(self.current)
+            self.queue.appendleft(self.current)
+        self.queue.discard(prev_song)
+        self.queue.appendleft(prev_song)
+
+        vc = self.voice_client
+        if vc and (vc.is_playing() or vc.is_paused()):
+            vc.stop()  # after → play_next_song は先頭（前の曲）を残したままループを起こす
+        else:
+            self.next.set()
+        await self.notify_clients(self.guild_id)
+        self._schedule_prefetch()
+        return True
 
     async def reorder_queue(self, start_index: int, end_index: int) -> None:
         """キューの順序を変更する"""
         if 0 <= start_index < len(self.queue) and 0 <= end_index < len(self.queue):
-            queue_list = list(self.queue)
-            item = queue_list.pop(start_index)
-            queue_list.insert(end_index, item)
-            self.queue = deque(queue_list)
+            self.queue.move(self.queue[start_index], end_index)
+            self._schedule_prefetch()
 
     def is_playing(self) -> bool:
         """現在再生中かどうかを返す"""
@@ -736,10 +2039,15 @@ class MusicPlayer:
             # プレイヤーループを停止
             self.shutdown_flag = True
             self.next.set()  # ループを終了させる
+
+            # 先読みと曲追加のバックグラウンド処理を止める
+            if self._prefetch_task and not self._prefetch_task.done():
+                self._prefetch_task.cancel()
+            for task in list(self._enqueue_tasks):
+                task.cancel()
             
-            # Executor をシャットダウン
-            if self.executor:
-                self.executor.shutdown(wait=False)
+            # このギルドの未開始の抽出/ダウンロードを取り消す
+            self.scheduler.cancel_guild(self.guild_id)
             
             # ボイスクライアントを切断
             if self.voice_client:
@@ -0,0 +1,150 @@
+"""
+キャッシュ済みの曲を Ogg/Opus に変換する
+
+Discord へ送る音声は Opus なので、キャッシュを一度 Ogg/Opus にしておけば
+再生時は FFmpegOpusAudio(codec='copy') でパケットをそのまま送れる（Python 側でのデコード/エンコードが不要）。
+YouTube の webm はもともと Opus なのでコンテナだけ詰め替え（-c:a copy）、それ以外は libopus で1回だけエンコードする。
+変換後は元ファイルを削除し、キャッシュ索引の video_id を .opus へ差し替える。
+コーデックは作成時点で確定しているので、再生時に from_probe で調べる必要はない。
+
+Raspberry Pi の再生を邪魔しないよう、変換は nice を下げた1本のワーカースレッドで順番に行う。
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Set
+
+from ..config import get_settings
+from ..logging import get_logger
+from .audio_cache import get_audio_cache, is_valid_audio_file
+from .cache_fill import get_active_fill
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+OPUS_EXTENSION = "opus"
+
+# Opus を含み得るコンテナ。まずは再エンコードなしの詰め替えを試す
+_COPY_CANDIDATE_FORMATS = ("webm", "mka", "mkv", "ogg")
+
+# 1曲の変換にかける上限（秒）
+_TRANSCODE_TIMEOUT_SECONDS = 600
+
+
+def is_opus_file(path: Optional[str]) -> bool:
+    """Ogg/Opus キャッシュ（パススルー再生できるファイル）か"""
+    return bool(path) and path.lower().endswith("." + OPUS_EXTENSION)
+
+
+class OpusTranscoder:
+    """キャッシュファイルを Ogg/Opus へ変換するバックグラウンドワーカー"""
+
+    def __init__(self, bitrate_kbps: int):
+        self.bitrate_kbps = bitrate_kbps
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="opus-transcode")
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+        self._ffmpeg = shutil.which("ffmpeg")
+        if self._ffmpeg is None:
+            logger.warning("ffmpeg が見つからないため Opus キャッシュへの変換を無効にします")
+
+    def submit(self, video_id: Optional[str], path: Optional[str]) -> None:
+        """変換を予約する（変換済み・予約済み・ffmpeg なしの場合は何もしない）"""
+        if not video_id or not path or is_opus_file(path) or self._ffmpeg is None:
+            return
+        with self._lock:
+            if video_id in self._pending:
+                return
+            self._pending.add(video_id)
+        self._executor.submit(self._run, video_id, path)
+
+    def _run(self, video_id: str, path: str) -> None:
+        try:
+            self._transcode(video_id, path)
+        except Exception as e:
+            logger.warning(f"Opus キャッシュへの変換に失敗: {path}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(video_id)
+
+    def _transcode(self, video_id: str, path: str) -> None:
+        if not os.path.exists(path) or get_active_fill(path) is not None:
+            return  # 掃除済み、またはまだ書き込み中
+        output = os.path.splitext(path)[0] + "." + OPUS_EXTENSION
+        temp = output + ".part"
+        ext = path.rsplit(".", 1)[-1].lower()
+
+        ok = ext in _COPY_CANDIDATE_FORMATS and self._ffmpeg_run(path, temp, copy=True)
+        if not ok:
+            ok = self._ffmpeg_run(path, temp, copy=False)
+        if not ok:
+            raise RuntimeError("ffmpeg が失敗しました")
+
+        size = os.path.getsize(temp)
+        if not is_valid_audio_file(temp, OPUS_EXTENSION, size):
+            os.remove(temp)
+            raise RuntimeError("変換結果が不正です")
+        os.replace(temp, output)
+        if get_audio_cache().replace_file(video_id, path, output) is None:
+            # 変換中に掃除された → 変換結果も残さない
+            os.remove(output)
+            return
+        logger.info(f"Opus キャッシュを作成: {output} ({'詰め替え' if ext in _COPY_CANDIDATE_FORMATS else 'エンコード'})")
+
+    def _ffmpeg_run(self, source: str, dest: str, *, copy: bool) -> bool:
+        codec_args = (
+            ["-c:a", "copy"] if copy
+            else ["-c:a", "libopus", "-b:a", f"{self.bitrate_kbps}k", "-ar", "48000", "-ac", "2"]
+        )
+        args = [
+            self._ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+            "-i", source, "-map", "0:a:0", "-vn", "-map_metadata", "-1",
+            *codec_args, "-f", "opus", dest,
+        ]
+        try:
+            result = subprocess.run(
+                args,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                timeout=_TRANSCODE_TIMEOUT_SECONDS,
+                preexec_fn=(lambda: os.nice(10)) if os.name == "posix" else None,
+            )
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Opus 変換がタイムアウトしました: {source}")
+            result = None
+        if result is not None and result.returncode == 0:
+            return True
+        if result is not None and not copy:
+            logger.warning(f"Opus 変換エラー: {result.stderr.decode(errors='replace').strip()[:300]}")
+        try:
+            os.remove(dest)
+        except OSError:
+            pass
+        return False
+
+
+# 変換ワーカー（遅延初期化、スレッドセーフ）
+_transcoder: Optional[OpusTranscoder] = None
+_transcoder_lock = threading.Lock()
+
+
+def get_opus_transcoder() -> Optional[OpusTranscoder]:
+    """プロセス共通の変換ワーカーを取得する（MUSIC_OPUS_CACHE=false なら None）"""
+    global _transcoder
+    if not settings.music.opus_cache:
+        return None
+    if _transcoder is None:
+        with _transcoder_lock:
+            if _transcoder is None:
+                _transcoder = OpusTranscoder(settings.music.opus_bitrate_kbps)
+    return _transcoder
+
+
+def schedule_opus_transcode(video_id: Optional[str], path: Optional[str]) -> None:
+    """キャッシュファイルの Opus 変換を予約する（どのスレッドからでも呼べる）"""
+    transcoder = get_opus_transcoder()
+    if transcoder is not None:
+        transcoder.submit(video_id, path)
@@ -0,0 +1,209 @@
+"""
+PO Token（Proof of Origin）プロバイダーの常駐サーバー管理
+
+以前は yt-dlp の youtubepot-bgutilscript に generate_once.js を渡していたため、
+PO Token が必要な抽出のたびに Node プロセスが1つ起動し、Raspberry Pi では毎回数秒の CPU を使っていた。
+ここでは bgutil-ytdlp-pot-provider の HTTP サーバー（build/main.js）をアプリと一緒に1つだけ起動し、
+yt-dlp からは youtubepot-bgutilhttp で問い合わせる。トークンはサーバー側で有効期間（TOKEN_TTL）の間使い回される。
+
+サーバーは一定間隔で /ping を叩いて生死を確認し、落ちていたら間隔を空けながら起動し直す。
+使えない間（起動前・再起動中・Node が無い環境）は従来どおり generate_once.js のスクリプト方式で動く。
+"""
+
+import asyncio
+import os
+import shutil
+import threading
+from typing import Optional
+
+import httpx
+
+from ..config import get_settings
+from ..logging import get_logger
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+# bgutil-ytdlp-pot-provider のビルド済みスクリプト（Docker イメージ内のパス）
+POT_SERVER_DIR = "/opt/bgutil-pot/server/build"
+POT_SCRIPT_PATH = os.path.join(POT_SERVER_DIR, "generate_once.js")
+POT_SERVER_PATH = os.path.join(POT_SERVER_DIR, "main.js")
+
+# 生死確認の間隔と、1回の /ping を待つ上限
+HEALTH_CHECK_INTERVAL_SECONDS = 30
+HEALTH_CHECK_TIMEOUT_SECONDS = 5
+# 起動直後に /ping が通るまで待つ上限
+STARTUP_TIMEOUT_SECONDS = 30
+# 再起動の間隔（失敗が続くたびに倍にし、上限で止める）
+RESTART_BACKOFF_INITIAL_SECONDS = 5
+RESTART_BACKOFF_MAX_SECONDS = 300
+
+
+class PotProviderServer:
+    """bgutil の PO Token サーバーを子プロセスとして起動・監視する"""
+
+    def __init__(self, node: str, server_path: str, port: int, token_ttl_hours: int):
+        self.node = node
+        self.server_path = server_path
+        self.port = port
+        self.token_ttl_hours = token_ttl_hours
+        self.base_url = f"http://127.0.0.1:{port}"
+        self._process: Optional[asyncio.subprocess.Process] = None
+        # yt-dlp のワーカースレッドから読むので、状態の更新はロック越しに行う
+        self._lock = threading.Lock()
+        self._healthy = False
+        self._restarts = 0
+
+    @property
+    def healthy(self) -> bool:
+        """最後の確認でサーバーが応答したか（スレッドセーフ）"""
+        with self._lock:
+            return self._healthy
+
+    def _set_healthy(self, healthy: bool) -> None:
+        with self._lock:
+            changed = healthy != self._healthy
+            self._healthy = healthy
+        if changed:
+            if healthy:
+                logger.info(f"PO Token サーバーを使用します: {self.base_url}")
+            else:
+                logger.warning("PO Token サーバーが応答しないため、スクリプト方式にフォールバックします")
+
+    async def ping(self) -> bool:
+        try:
+            async with httpx.AsyncClient(timeout=HEALTH_CHECK_TIMEOUT_SECONDS) as client:
+                response = await client.get(f"{self.base_url}/ping")
+            return response.status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    async def start(self) -> bool:
+        """サーバーを起動し、/ping が通るまで待つ。既に別のサーバーが同じポートで動いていればそれを使う"""
+        if await self.ping():
+            logger.info(f"起動済みの PO Token サーバーを検出しました: {self.base_url}")
+            self._set_healthy(True)
+            return True
+
+        env = dict(os.environ, TOKEN_TTL=str(self.token_ttl_hours))
+        try:
+            self._process = await asyncio.create_subprocess_exec(
+                self.node, self.server_path, "--port", str(self.port),
+                cwd=os.path.dirname(self.server_path),
+                env=env,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+        except OSError as e:
+            logger.error(f"PO Token サーバーの起動に失敗しました: {e}")
+            self._set_healthy(False)
+            return False
+
+        deadline = asyncio.get_running_loop().time() + STARTUP_TIMEOUT_SECONDS
+        while asyncio.get_running_loop().time() < deadline:
+            if self._process.returncode is not None:
+                logger.error(f"PO Token サーバーが起動直後に終了しました（終了コード {self._process.returncode}）")
+                break
+            if await self.ping():
+                logger.info(f"PO Token サーバーを起動しました (pid {self._process.pid}, port {self.port})")
+                self._set_healthy(True)
+                return True
+            await asyncio.sleep(0.5)
+
+        await self._terminate()
+        self._set_healthy(False)
+        return False
+
+    async def supervise(self) -> None:
+        """定期的に生死を確認し、応答しなければ起動し直す（lifespan の背景タスクとして動かす）"""
+        backoff = RESTART_BACKOFF_INITIAL_SECONDS
+        while True:
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL_SECONDS if self.healthy else backoff)
+            if await self.ping():
+                self._set_healthy(True)
+                backoff = RESTART_BACKOFF_INITIAL_SECONDS
+                continue
+
+            self._set_healthy(False)
+            self._restarts += 1
+            logger.warning(f"PO Token サーバーを再起動します（{self._restarts} 回目）")
+            await self._terminate()
+            if await self.start():
+                backoff = RESTART_BACKOFF_INITIAL_SECONDS
+            else:
+                backoff = min(backoff * 2, RESTART_BACKOFF_MAX_SECONDS)
+
+    async def stop(self) -> None:
+        self._set_healthy(False)
+        await self._terminate()
+
+    async def _terminate(self) -> None:
+        process, self._process = self._process, None
+        if process is None or process.returncode is not None:
+            return
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+    def stats(self) -> dict:
+        return {
+            "mode": "server" if self.healthy else "script",
+            "base_url": self.base_url,
+            "pid": self._process.pid if self._process is not None else None,
+            "restarts": self._restarts,
+        }
+
+
+# サーバー（遅延初期化。サーバー方式を使わない環境では None）
+_server: Optional[PotProviderServer] = None
+_server_initialized = False
+_server_lock = threading.Lock()
+
+
+def get_pot_provider_server() -> Optional[PotProviderServer]:
+    """プロセス共通の PO Token サーバーを取得する（設定で無効・Node やスクリプトが無い場合は None）"""
+    global _server, _server_initialized
+    if not _server_initialized:
+        with _server_lock:
+            if not _server_initialized:
+                _server = _create_server()
+                _server_initialized = True
+    return _server
+
+
+def _create_server() -> Optional[PotProviderServer]:
+    if settings.music.pot_provider_mode != "server":
+        return None
+    node = shutil.which("node")
+    if node is None or not os.path.exists(POT_SERVER_PATH):
+        logger.info("PO Token サーバーを使用できないため、スクリプト方式で動作します")
+        return None
+    return PotProviderServer(
+        node,
+        POT_SERVER_PATH,
+        settings.music.pot_server_port,
+        settings.music.pot_token_ttl_hours,
+    )
+
+
+def get_pot_extractor_args() -> dict:
+    """yt-dlp の extractor_args に入れる PO Token プロバイダーの設定。
+    サーバーが応答している間は HTTP プロバイダーを使い、スクリプトはその失敗時のフォールバックとして残す"""
+    args: dict = {}
+    server = get_pot_provider_server()
+    if server is not None and server.healthy:
+        args["youtubepot-bgutilhttp"] = {"base_url": [server.base_url]}
+    if os.path.exists(POT_SCRIPT_PATH):
+        args["youtubepot-bgutilscript"] = {"script_path": [POT_SCRIPT_PATH]}
+    return args
+
+
+def pot_provider_fingerprint() -> Optional[str]:
+    """yt-dlp の設定の作り直しが必要かを判定するための値（使うプロバイダーが変わると変わる）"""
+    server = get_pot_provider_server()
+    if server is not None and server.healthy:
+        return server.base_url
+    return None
@@ -0,0 +1,41 @@
+"""
+同じキーの処理を同時に1回だけ実行するための登録簿（single-flight）
+
+複数のギルドや連続した /play が同じ曲を同時に要求したとき、最初の呼び出しだけが
+yt-dlp の抽出/ダウンロードを行い、後から来た呼び出しはその Future の完了を待って結果を共有する。
+待つ側はワーカースレッドを占有しない（イベントループ上で await するだけ）。
+"""
+
+import asyncio
+from typing import Dict, Optional
+
+
+class SingleFlight:
+    """キー → 実行中の Future（イベントループのスレッドからのみ使う）"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[str, asyncio.Future] = {}
+
+    def get(self, key: Optional[str]) -> Optional[asyncio.Future]:
+        """key の処理が実行中ならその Future を返す"""
+        if not key:
+            return None
+        fut = self._flights.get(key)
+        return fut if fut is not None and not fut.done() else None
+
+    def register(self, key: Optional[str], fut: asyncio.Future) -> asyncio.Future:
+        """fut を key の処理として登録する（完了したら自動的に外れる）"""
+        if not key:
+            return fut
+        self._flights[key] = fut
+
+        def _done(f: asyncio.Future, k: str = key) -> None:
+            if self._flights.get(k) is f:
+                del self._flights[k]
+
+        fut.add_done_callback(_done)
+        return fut
+
+    def __len__(self) -> int:
+        return sum(1 for f in self._flights.values() if not f.done())
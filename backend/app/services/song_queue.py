@@ -0,0 +1,202 @@
+"""
+再生キューのデータ構造
+
+以前のキューは deque で、プレースホルダの差し替え・削除・並べ替えのたびに全体を list にコピーして
+線形探索し、deque を作り直していた（削除と並べ替えは self.queue 自体を別オブジェクトに差し替えていた）。
+プレイリスト規模のキューに曲追加が重なると二乗の手間になるうえ、再生ループが持っている先頭の参照とずれる。
+
+ここでは双方向連結リストと「エントリ ID → ノード」の辞書でキューを持つ:
+- ID での参照・削除・先頭/末尾への出し入れ・ある曲の前後への挿入/移動は O(1)
+- 位置（インデックス）での操作は先頭から数えるので O(位置)
+- 常にその場で変更する（キューのオブジェクトは MusicPlayer の生存中ずっと同じ）
+
+エントリ ID は Song.entry_id（曲オブジェクトごとに一意）。同じ曲オブジェクトを2回入れることはできない。
+イベントループのスレッドからのみ使う。
+"""
+
+from typing import Dict, Generic, Iterable, Iterator, List, Optional, TypeVar, Protocol
+
+
+class _HasEntryId(Protocol):
+    entry_id: str
+
+
+T = TypeVar("T", bound=_HasEntryId)
+
+
+class _Node(Generic[T]):
+    __slots__ = ("item", "prev", "next")
+
+    def __init__(self, item: Optional[T]):
+        self.item = item
+        self.prev: "_Node[T]" = self
+        self.next: "_Node[T]" = self
+
+
+class SongQueue(Generic[T]):
+    """エントリ ID で O(1) に引ける再生キュー（deque のうち再生ループが使う操作も備える）"""
+
+    def __init__(self, items: Iterable[T] = ()):
+        self._head: _Node[T] = _Node(None)  # 番兵（head.next が先頭、head.prev が末尾）
+        self._nodes: Dict[str, _Node[T]] = {}
+        self.extend(items)
+
+    # ------------------------------------------------------------------
+    # 参照
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __bool__(self) -> bool:
+        return bool(self._nodes)
+
+    def __iter__(self) -> Iterator[T]:
+        # 反復中に変更するときは list(queue) の写しを使うこと（取り除かれたノードは元の次を指したままなので止まりはしない）
+        node = self._head.next
+        while node is not self._head:
+            yield node.item
+            node = node.next
+
+    def __contains__(self, item: object) -> bool:
+        entry_id = getattr(item, "entry_id", None)
+        node = self._nodes.get(entry_id) if entry_id is not None else None
+        return node is not None and node.item is item
+
+    def __getitem__(self, index: int) -> T:
+        return self._node_at(index).item
+
+    def get(self, entry_id: str) -> Optional[T]:
+        """エントリ ID の曲（キューに無ければ None）"""
+        node = self._nodes.get(entry_id)
+        return node.item if node is not None else None
+
+    def index(self, item: T) -> int:
+        """曲の位置（O(位置)）。キューに無ければ ValueError"""
+        if item not in self:
+            raise ValueError("queue entry not found")
+        for i, queued in enumerate(self):
+            if queued is item:
+                return i
+        raise ValueError("queue entry not found")
+
+    # ------------------------------------------------------------------
+    # 変更（すべてその場で行う）
+    # ------------------------------------------------------------------
+
+    def append(self, item: T) -> None:
+        self._link(item, self._head.prev)
+
+    def appendleft(self, item: T) -> None:
+        self._link(item, self._head)
+
+    def extend(self, items: Iterable[T]) -> None:
+        for item in items:
+            self.append(item)
+
+    def popleft(self) -> T:
+        if not self._nodes:
+            raise IndexError("pop from an empty queue")
+        item = self._head.next.item
+        self.remove(item)
+        return item
+
+    def clear(self) -> None:
+        self._head.next = self._head.prev = self._head
+        self._nodes.clear()
+
+    def remove(self, item: T) -> None:
+        """曲を取り除く（O(1)）。キューに無ければ ValueError"""
+        if item not in self:
+            raise ValueError("queue entry not found")
+        self._unlink(self._nodes.pop(item.entry_id))
+
+    def discard(self, item: T) -> bool:
+        """曲がキューにあれば取り除き、取り除いたかを返す"""
+        if item not in self:
+            return False
+        self._unlink(self._nodes.pop(item.entry_id))
+        return True
+
+    def insert_after(self, anchor: Optional[T], items: Iterable[T]) -> None:
+        """anchor の直後に items を順に入れる（anchor が None なら先頭、キューに無ければ末尾）"""
+        if anchor is None:
+            prev = self._head
+        elif anchor in self:
+            prev = self._nodes[anchor.entry_id]
+        else:
+            prev = self._head.prev
+        for item in items:
+            prev = self._link(item, prev)
+
+    def replace(self, item: T, items: List[T]) -> None:
+        """item を items（0件なら削除）に置き換える。item がキューに無ければ末尾に追加"""
+        if item not in self:
+            self.extend(items)
+            return
+        node = self._nodes[item.entry_id]
+        self.insert_after(item, items)
+        self._nodes.pop(item.entry_id)
+        self._unlink(node)
+
+    def move(self, item: T, index: int) -> None:
+        """曲を位置 index へ移す（O(位置)。範囲外は末尾/先頭に寄せる）"""
+        if item not in self:
+            raise ValueError("queue entry not found")
+        node = self._nodes.pop(item.entry_id)
+        self._unlink(node)
+        index = max(0, min(index, len(self._nodes)))
+        prev = self._node_at(index - 1) if index > 0 else self._head
+        self._splice(node, prev)
+        self._nodes[item.entry_id] = node
+
+    def move_after(self, item: T, anchor: Optional[T]) -> None:
+        """曲を anchor の直後へ移す（O(1)。anchor が None なら先頭）"""
+        if item not in self or (anchor is not None and anchor not in self):
+            raise ValueError("queue entry not found")
+        if anchor is item:
+            return
+        node = self._nodes[item.entry_id]
+        self._unlink(node)
+        self._splice(node, self._nodes[anchor.entry_id] if anchor is not None else self._head)
+
+    # ------------------------------------------------------------------
+    # 内部処理
+    # ------------------------------------------------------------------
+
+    def _node_at(self, index: int) -> _Node[T]:
+        size = len(self._nodes)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("queue index out of range")
+        # 近い側の端から数える
+        if index <= size // 2:
+            node = self._head.next
+            for _ in range(index):
+                node = node.next
+        else:
+            node = self._head.prev
+            for _ in range(size - 1 - index):
+                node = node.prev
+        return node
+
+    def _link(self, item: T, prev: _Node[T]) -> _Node[T]:
+        if item.entry_id in self._nodes:
+            raise ValueError(f"queue entry already present: {item.entry_id}")
+        node = _Node(item)
+        self._nodes[item.entry_id] = node
+        self._splice(node, prev)
+        return node
+
+    @staticmethod
+    def _splice(node: _Node[T], prev: _Node[T]) -> None:
+        node.prev = prev
+        node.next = prev.next
+        prev.next.prev = node
+        prev.next = node
+
+    @staticmethod
+    def _unlink(node: _Node[T]) -> None:
+        node.prev.next = node.next
+        node.next.prev = node.prev
@@ -0,0 +1,279 @@
+"""
+曲の切れ目をまたいで再生を続ける音源（ギャップレス / クロスフェード）
+
+従来は曲が終わって after コールバックが来てから次の FFmpeg を起動していたため、曲間に無音ができていた。
+TransitionSource は1回の vc.play() の中で曲を乗り継ぐ:
+
+- 再生中の曲の終わりが近づくと（長さ不明の曲は再生開始直後に）プレイヤーへ次の曲の音源を要求する。
+  プレイヤーはイベントループ上で次の曲の FFmpeg を起動して set_next() で渡す（音声スレッドでは起動しない）
+- ギャップレス: 今の曲の音源が尽きたフレームで、開いておいた次の曲へ切り替える
+- クロスフェード: 終わりの crossfade_seconds 秒は両方の曲を PCM で読み、フレームごとに重み付けして足し合わせ、
+  この音源が持つ Opus エンコーダで Opus にしてから返す。
+  フェードが終わったら、次の曲はフェード長の位置から起動しておいた Opus の音源へ戻す
+
+is_opus() は常に True（VoiceClient は再生開始時の音源が Opus だとエンコーダを作らないので、
+途中で PCM を返すと送信側でエンコードできない）。PCM を返す音源が混じったらここでエンコードする。
+
+曲が切り替わったら on_switch でプレイヤーへ知らせ、キュー・現在の曲・履歴はイベントループ側で更新する。
+次の曲の準備が間に合わなければ従来どおり音源が終わり、after コールバック経由で次の曲へ進む。
+"""
+
+import audioop  # Python 3.13 以降は audioop-lts（pyproject.toml で宣言）
+import sys
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+import discord
+
+from ..logging import get_logger
+
+logger = get_logger(__name__)
+
+FRAME_SECONDS = 0.02
+# 20ms の 48kHz/16bit/ステレオ PCM
+PCM_FRAME_BYTES = discord.opus.Encoder.FRAME_SIZE
+# 切り替え（クロスフェード開始）のこの秒数前に次の曲の音源を用意する
+LOOKAHEAD_SECONDS = 8.0
+
+
+@dataclass
+class PreparedNext:
+    """次の曲のために開いておいた音源"""
+    song: Any
+    main: discord.AudioSource  # 切り替え後に流し続ける音源（クロスフェード時はフェード長の位置から）
+    fade_out: Optional[discord.AudioSource] = None  # 今の曲の PCM（fade_start から）
+    fade_in: Optional[discord.AudioSource] = None  # 次の曲の PCM（先頭から）
+    fade_start: float = 0.0  # 今の曲のこの位置（秒）でクロスフェードを始める
+    for_song: Any = None  # どの曲の次として用意したか
+
+    def cleanup(self) -> None:
+        for source in (self.main, self.fade_out, self.fade_in):
+            if source is not None:
+                try:
+                    source.cleanup()
+                except Exception:
+                    pass
+
+
+def _pad(frame: bytes) -> bytes:
+    if len(frame) < PCM_FRAME_BYTES:
+        return frame + b"\x00" * (PCM_FRAME_BYTES - len(frame))
+    return frame
+
+
+def mix_frames(outgoing: bytes, incoming: bytes, t: float) -> bytes:
+    """16bit ステレオ PCM の2フレームを (1 - t) : t で足し合わせる。
+    音声スレッドで 20ms ごとに呼ぶので、サンプルごとの計算は audioop（C 実装）に任せる"""
+    outgoing, incoming = _pad(outgoing), _pad(incoming)
+    if sys.byteorder == "big":
+        # PCM は s16le、audioop はネイティブのバイト順
+        outgoing, incoming = audioop.byteswap(outgoing, 2), audioop.byteswap(incoming, 2)
+    # 重みの和が 1 なので範囲からはみ出さない（はみ出しても audioop は飽和させる）
+    mixed = audioop.add(audioop.mul(outgoing, 2, 1.0 - t), audioop.mul(incoming, 2, t), 2)
+    if sys.byteorder == "big":
+        mixed = audioop.byteswap(mixed, 2)
+    return mixed
+
+
+class TransitionSource(discord.AudioSource):
+    """曲を乗り継ぎながら1本の音声として流す AudioSource。
+
+    read() は常に Opus のパケットを返す。クロスフェード中に混ぜた PCM（と PCM を返す音源のフレーム）は
+    自前のエンコーダ（最初に必要になったとき音声スレッドで作る）でエンコードする。
+    """
+
+    def __init__(
+        self,
+        song: Any,
+        source: discord.AudioSource,
+        *,
+        crossfade_seconds: float,
+        request_next: Callable[["TransitionSource"], None],
+        on_switch: Callable[[Any, Any], None],
+        bitrate_kbps: int = 128,
+    ):
+        self.song = song
+        self._main = source
+        self._next: Optional[PreparedNext] = None
+        self._fade: Optional[PreparedNext] = None
+        self._fade_frames = max(0, int(crossfade_seconds / FRAME_SECONDS))
+        self._fade_pos = 0
+        self._next_requested = False
+        self._request_next = request_next
+        self._on_switch = on_switch
+        self._bitrate_kbps = bitrate_kbps
+        self._encoder: Optional[discord.opus.Encoder] = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # プレイヤー（イベントループ）側から使う
+    # ------------------------------------------------------------------
+
+    @property
+    def crossfade_seconds(self) -> float:
+        return self._fade_frames * FRAME_SECONDS
+
+    @property
+    def main_source(self) -> discord.AudioSource:
+        return self._main
+
+    @property
+    def fading(self) -> bool:
+        return self._fade is not None
+
+    @property
+    def next_song(self) -> Any:
+        """用意済みの次の曲（なければ None）"""
+        prepared = self._next
+        return prepared.song if prepared is not None else None
+
+    @property
+    def awaiting_next(self) -> bool:
+        """次の曲を要求済みで、まだ用意されていない"""
+        return self._next_requested and self._next is None and self._fade is None
+
+    @property
+    def position_seconds(self) -> float:
+        """今の曲の先頭からの再生位置（秒）"""
+        with self._lock:
+            if self._fade is not None:
+                return self._fade_pos * FRAME_SECONDS
+            return getattr(self._main, "position_seconds", 0.0)
+
+    def set_next(self, prepared: PreparedNext) -> bool:
+        """次の曲の音源を渡す。今の曲が変わっていた・既に用意済みなら受け取らずに False"""
+        with self._lock:
+            accepted = self._fade is None and self._next is None and prepared.for_song is self.song
+            if accepted:
+                self._next = prepared
+        if not accepted:
+            prepared.cleanup()
+        return accepted
+
+    def clear_next(self) -> None:
+        """用意済みの次の曲を捨てる（キュー編集・音量変更時）。必要になれば改めて要求される"""
+        with self._lock:
+            prepared, self._next = self._next, None
+            if self._fade is None:
+                self._next_requested = False
+        if prepared is not None:
+            prepared.cleanup()
+
+    def swap_main(self, source: discord.AudioSource) -> Optional[discord.AudioSource]:
+        """今の曲の音源を差し替えて古い方を返す（クロスフェード中は差し替えず None）"""
+        with self._lock:
+            if self._fade is not None:
+                return None
+            old, self._main = self._main, source
+            return old
+
+    # ------------------------------------------------------------------
+    # AudioSource（音声スレッドから呼ばれる）
+    # ------------------------------------------------------------------
+
+    def is_opus(self) -> bool:
+        return True
+
+    def read(self) -> bytes:
+        with self._lock:
+            if self._fade is not None:
+                return self._read_fade()
+            self._maybe_request_next()
+            prepared = self._next
+            if (
+                prepared is not None
+                and prepared.fade_in is not None
+                and getattr(self._main, "position_seconds", 0.0) >= prepared.fade_start
+            ):
+                self._start_fade()
+                return self._read_fade()
+
+            data = self._main.read()
+            if data:
+                return self._as_opus(data, self._main)
+
+            # 今の曲の終わり → 用意済みの次の曲へそのまま続ける（ギャップレス）
+            if prepared is None:
+                return b""
+            self._next = None
+            self._main.cleanup()
+            self._switch(prepared.song, prepared.main)
+            return self._as_opus(self._main.read(), self._main)
+
+    def cleanup(self) -> None:
+        with self._lock:
+            sources = [self._main]
+            for prepared in (self._next, self._fade):
+                if prepared is not None:
+                    sources.extend(s for s in (prepared.main, prepared.fade_out, prepared.fade_in) if s is not None)
+            self._next = self._fade = None
+        for source in sources:
+            try:
+                source.cleanup()
+            except Exception:
+                pass
+
+    # ------------------------------------------------------------------
+    # 内部処理（ロック取得済み）
+    # ------------------------------------------------------------------
+
+    def _maybe_request_next(self) -> None:
+        if self._next_requested or self._next is not None:
+            return
+        duration = getattr(self.song, "duration", None)
+        if duration:
+            position = getattr(self._main, "position_seconds", 0.0)
+            if position < duration - self.crossfade_seconds - LOOKAHEAD_SECONDS:
+                return
+        self._next_requested = True
+        self._request_next(self)
+
+    def _switch(self, song: Any, main: discord.AudioSource) -> None:
+        previous = self.song
+        self.song = song
+        self._main = main
+        self._next_requested = False
+        self._on_switch(previous, song)
+
+    def _start_fade(self) -> None:
+        prepared = self._next
+        self._next = None
+        self._main.cleanup()  # ここからは今の曲を fade_out の PCM で読む
+        self._fade = prepared
+        self._fade_pos = 0
+        previous = self.song
+        self.song = prepared.song
+        self._on_switch(previous, prepared.song)
+
+    def _read_fade(self) -> bytes:
+        prepared = self._fade
+        outgoing = prepared.fade_out.read() if prepared.fade_out is not None else b""
+        incoming = prepared.fade_in.read()
+        self._fade_pos += 1
+        if not incoming or self._fade_pos >= self._fade_frames:
+            # フェード完了（または次の曲がフェードより短い）→ 次の曲の Opus 音源へ戻す
+            self._finish_fade()
+            if not incoming:
+                return self._as_opus(self._main.read(), self._main)
+        t = min(1.0, self._fade_pos / max(1, self._fade_frames))
+        return self._encode(mix_frames(outgoing, incoming, t))
+
+    def _as_opus(self, data: bytes, source: discord.AudioSource) -> bytes:
+        if not data or source.is_opus():
+            return data
+        return self._encode(_pad(data))
+
+    def _encode(self, pcm: bytes) -> bytes:
+        if self._encoder is None:
+            self._encoder = discord.opus.Encoder(bitrate=self._bitrate_kbps)
+        return self._encoder.encode(pcm, discord.opus.Encoder.SAMPLES_PER_FRAME)
+
+    def _finish_fade(self) -> None:
+        prepared = self._fade
+        self._fade = None
+        for source in (prepared.fade_out, prepared.fade_in):
+            if source is not None:
+                source.cleanup()
+        self._main = prepared.main
+        self._next_requested = False
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+1ストリームあたりの音声処理 CPU 使用量を比較するベンチマーク
+
+再生ループと同じように 20ms フレームを読み出し、Python プロセスと FFmpeg 子プロセスの CPU 時間を
+音声の長さで割って「実時間再生1本あたり何 % のコアを使うか」を出す（ペーシングなしで一気に読む）。
+
+    uv run python scripts/bench_audio_cpu.py music/song.webm --seconds 60 --volume 0.5
+
+モード:
+  legacy       FFmpegPCMAudio + PCMVolumeTransformer + Python 側の Opus エンコード（変更前の再生経路）
+  ffmpeg       FFmpegOpusAudio(-c:a libopus) + -af volume（音量を FFmpeg 側で掛ける。FEC なし・--compression-level）
+  passthrough  FFmpegOpusAudio(-c:a copy)（Ogg/Opus の入力のみ。音量 100% のキャッシュ再生）
+"""
+
+import argparse
+import resource
+import sys
+import time
+
+import discord
+from discord.opus import Encoder
+
+FRAME_SECONDS = 0.02
+
+
+def build_source(mode: str, path: str, volume: float, compression_level: int = 4) -> discord.AudioSource:
+    if mode == "legacy":
+        pcm = discord.FFmpegPCMAudio(path, before_options="-analyzeduration 0", options="-vn")
+        return discord.PCMVolumeTransformer(pcm, volume=volume)
+    if mode == "ffmpeg":
+        options = "-vn" + (f" -af volume={volume:.3f}" if volume != 1.0 else "")
+        # TrackAudioSource と同じく discord.py 既定の -fec true -packet_loss 15 を後ろの出力オプションで打ち消す
+        options += f" -fec false -packet_loss 0 -compression_level {compression_level}"
+        # codec は入力のコーデック。"libopus" を渡すと -c:a copy になってしまうので None（= -c:a libopus）
+        return discord.FFmpegOpusAudio(path, codec=None, before_options="-analyzeduration 0", options=options)
+    if mode == "passthrough":
+        return discord.FFmpegOpusAudio(path, codec="copy", before_options="-analyzeduration 0", options="-vn")
+    raise ValueError(mode)
+
+
+def run(mode: str, path: str, seconds: float, volume: float, compression_level: int = 4) -> dict:
+    encoder = Encoder() if mode == "legacy" else None
+    max_frames = int(seconds / FRAME_SECONDS)
+
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_before = time.process_time()
+    wall_before = time.perf_counter()
+
+    source = build_source(mode, path, volume, compression_level)
+    frames = 0
+    try:
+        while frames < max_frames:
+            data = source.read()
+            if not data:
+                break
+            if encoder is not None:
+                encoder.encode(data, encoder.SAMPLES_PER_FRAME)  # AudioPlayer が PCM 音源に対して行う処理
+            frames += 1
+    finally:
+        source.cleanup()  # 子プロセスを回収して RUSAGE_CHILDREN に反映させる
+
+    python_cpu = time.process_time() - cpu_before
+    children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    ffmpeg_cpu = (children_after.ru_utime + children_after.ru_stime) - (children_before.ru_utime + children_before.ru_stime)
+    audio_seconds = frames * FRAME_SECONDS
+    return {
+        "mode": mode,
+        "audio_seconds": audio_seconds,
+        "wall_seconds": time.perf_counter() - wall_before,
+        "python_cpu": python_cpu,
+        "ffmpeg_cpu": ffmpeg_cpu,
+        "core_percent": (python_cpu + ffmpeg_cpu) / audio_seconds * 100 if audio_seconds else 0.0,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="音声ファイル（passthrough は Ogg/Opus のみ）")
+    parser.add_argument("--seconds", type=float, default=60.0, help="計測する音声の長さ（秒）")
+    parser.add_argument("--volume", type=float, default=0.5, help="音量（0.0 - 1.0）")
+    parser.add_argument("--compression-level", type=int, default=4, help="ffmpeg モードの libopus の計算量（0-10）")
+    parser.add_argument("--modes", default="legacy,ffmpeg,passthrough", help="カンマ区切りのモード")
+    args = parser.parse_args()
+
+    if not discord.opus.is_loaded():
+        discord.opus._load_default()
+
+    print(f"{'mode':<12} {'audio[s]':>9} {'wall[s]':>8} {'python[s]':>10} {'ffmpeg[s]':>10} {'core%/stream':>13}")
+    for mode in args.modes.split(","):
+        mode = mode.strip()
+        if mode == "passthrough" and not args.path.lower().endswith((".opus", ".ogg")):
+            print(f"{mode:<12} スキップ（Ogg/Opus の入力が必要）")
+            continue
+        result = run(mode, args.path, args.seconds, args.volume, args.compression_level)
+        print(
+            f"{result['mode']:<12} {result['audio_seconds']:>9.1f} {result['wall_seconds']:>8.2f} "
+            f"{result['python_cpu']:>10.2f} {result['ffmpeg_cpu']:>10.2f} {result['core_percent']:>12.2f}%"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+import os
+import sys
+from pathlib import Path
+
+# app.config は DISCORD_TOKEN が無いと読み込めない（テストでは Discord に接続しない）
+os.environ.setdefault("DISCORD_TOKEN", "test-token")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+import discord  # noqa: E402
+import pytest  # noqa: E402
+from discord.utils import MISSING  # noqa: E402
+
+
+@pytest.fixture
+def ffmpeg_args(monkeypatch):
+    """FFmpeg を起動せず、FFmpeg 系の AudioSource が組み立てた引数だけを取り出す（最後に作られたものの引数）"""
+    captured = {}
+
+    def fake_init(self, source, *, executable="ffmpeg", args, **kwargs):
+        captured["args"] = args
+        self._process = self._stdout = self._stdin = self._stderr = MISSING
+        self._stopped = False
+
+    monkeypatch.setattr(discord.player.FFmpegAudio, "__init__", fake_init)
+    return captured
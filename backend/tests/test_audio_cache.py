@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services import music_player
+from app.services.audio_cache import AudioCacheIndex
+from app.services.music_player import Song
+from app.services.song_queue import SongQueue
+
+WEBM_MAGIC = b"\x1a\x45\xdf\xa3"
+
+
+def write_cache(directory, video_id: str, size: int, age_days: float, index: AudioCacheIndex) -> str:
+    path = directory / f"title-{video_id}.webm"
+    path.write_bytes(WEBM_MAGIC + b"\x00" * (size - len(WEBM_MAGIC)))
+    entry = index.add(video_id, str(path))
+    entry.last_access = time.time() - age_days * 86400
+    return str(path)
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = AudioCacheIndex(str(tmp_path))
+    index.build()
+    return index
+
+
+def evict(index, *, max_bytes, protected_ids=(), load_play_stats=dict, is_protected=None):
+    return index.evict(
+        max_bytes=max_bytes, min_free_bytes=0, protected_ids=set(protected_ids),
+        load_play_stats=load_play_stats, half_life_days=7.0, is_protected=is_protected,
+    )
+
+
+def test_evicts_least_valuable_unprotected_entries(tmp_path, index):
+    for i, video_id in enumerate(["oldest00000", "middle00000", "newest00000"]):
+        write_cache(tmp_path, video_id, 4096, age_days=30 - i * 10, index=index)
+
+    result = evict(index, max_bytes=5000, protected_ids={"oldest00000"})
+    assert result["removed_files"] == 2
+    assert [e.video_id for e in index.entries()] == ["oldest00000"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["title-oldest00000.webm"]
+
+
+def test_entry_looked_up_during_eviction_is_kept(tmp_path, index):
+    write_cache(tmp_path, "lookedup000", 4096, age_days=30, index=index)
+    write_cache(tmp_path, "unused00000", 4096, age_days=10, index=index)
+
+    def is_protected(video_id):
+        # キューの確認の後、ファイルを消すまでの間に再生の準備がこの曲のキャッシュを使う
+        if video_id == "lookedup000":
+            assert index.lookup(video_id) is not None
+        return False
+
+    result = evict(index, max_bytes=5000, is_protected=is_protected)
+    assert (result["removed_files"], result["skipped_files"]) == (1, 1)
+    assert [e.video_id for e in index.entries()] == ["lookedup000"]
+    assert (tmp_path / "title-lookedup000.webm").exists()
+
+
+def test_is_protected_is_checked_per_file(tmp_path, index):
+    for i, video_id in enumerate(["queued00000", "other100000", "other200000"]):
+        write_cache(tmp_path, video_id, 4096, age_days=30 - i * 10, index=index)
+    checked = []
+
+    def is_protected(video_id):
+        checked.append(video_id)
+        return video_id == "queued00000"
+
+    result = evict(index, max_bytes=9000, is_protected=is_protected)
+    assert checked == ["queued00000", "other100000"]  # 予算に収まったら残りは確かめない
+    assert result["removed_files"] == 1
+    assert sorted(e.video_id for e in index.entries()) == ["other200000", "queued00000"]
+
+
+def test_song_enqueued_after_snapshot_is_not_evicted(tmp_path, index, monkeypatch):
+    for i, video_id in enumerate(["enqueued000", "stale100000", "stale200000"]):
+        write_cache(tmp_path, video_id, 600 * 1024, age_days=30 - i * 10, index=index)
+    monkeypatch.setattr(music_player, "get_audio_cache", lambda: index)
+    monkeypatch.setattr(music_player.settings.music, "cache_max_mb", 1)
+    monkeypatch.setattr(music_player.settings.music, "cache_min_free_mb", 0)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        player = type("Player", (), {})()
+        player.shutdown_flag = False
+        player.queue = SongQueue()
+        player.history = []
+        player.current = None
+        monkeypatch.setattr(music_player, "_active_players", [player])
+
+        async def enqueue():
+            player.queue.append(Song(source=None, title="t", url="u", thumbnail="", artist="", video_id="enqueued000"))
+
+        def load_play_stats():
+            # 保護する曲の写しを取った後（掃除のスレッドで再生統計を読んでいる間）に曲が追加される
+            asyncio.run_coroutine_threadsafe(enqueue(), loop).result(timeout=2)
+            return {}
+
+        monkeypatch.setattr(music_player.history_db, "get_play_stats_by_video", load_play_stats)
+        return await music_player.evict_audio_cache("テスト")
+
+    result = asyncio.run(main())
+    assert result["removed_files"] == 2
+    assert [e.video_id for e in index.entries()] == ["enqueued000"]
+    assert (tmp_path / "title-enqueued000.webm").exists()
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services import music_player
+from app.services.cache_fill import CacheFill
+from app.services.extraction_errors import PermanentExtractionError, get_failure_cache
+from app.services.extraction_scheduler import ExtractionScheduler
+from app.services.music_player import MusicPlayer, Song
+
+
+def make_fill(tmp_path) -> CacheFill:
+    # start() しない: 書き込みスレッドの代わりにテストから状態を進める
+    return CacheFill("http://example.invalid/audio", None, str(tmp_path / "song-abc.webm"))
+
+
+def finish(fill: CacheFill, data: bytes) -> None:
+    with open(fill.part_path, "wb") as out:
+        out.write(data)
+    with fill._cond:
+        fill.bytes_written = len(data)
+        fill.done = True
+        fill._cond.notify_all()
+
+
+def test_reader_waits_for_part_file_to_appear(tmp_path):
+    fill = make_fill(tmp_path)
+    reader = fill.open_reader()  # まだ .part も本来のファイルも無い
+
+    timer = threading.Timer(0.1, finish, (fill, b"audio-bytes"))
+    timer.start()
+    try:
+        assert reader.read(1024) == b"audio-bytes"
+        assert reader.read(1024) == b""
+    finally:
+        timer.join()
+        reader.close()
+
+
+def test_reader_ends_when_fill_fails_before_file_exists(tmp_path):
+    fill = make_fill(tmp_path)
+    reader = fill.open_reader()
+    with fill._cond:
+        fill.error = RuntimeError("network down")
+        fill._cond.notify_all()
+
+    assert reader.read(1024) == b""
+    reader.close()
+
+
+@pytest.fixture
+def player():
+    player = MusicPlayer.__new__(MusicPlayer)
+    player.guild_id = "g"
+    player.scheduler = ExtractionScheduler(1)
+    return player
+
+
+def make_song() -> Song:
+    return Song(
+        source=None, title="t", url="https://www.youtube.com/watch?v=abcdefghijk", thumbnail="", artist="",
+        video_id="abcdefghijk",
+    )
+
+
+def run_refresh(player: MusicPlayer, song: Song):
+    async def main():
+        player.bot = type("Bot", (), {"loop": asyncio.get_running_loop()})()
+        return await player._submit_stream_refresh(song)
+
+    return asyncio.run(main())
+
+
+def test_stream_refresh_runs_on_scheduler(player, monkeypatch):
+    threads = []
+
+    def fake_extract(url, download=False):
+        threads.append(threading.current_thread().name)
+        return {"id": "abc", "url": "http://example.invalid/fresh"}, None
+
+    monkeypatch.setattr(music_player, "extract_info_with_fallback", fake_extract)
+    song = make_song()
+
+    assert run_refresh(player, song)["url"] == "http://example.invalid/fresh"
+    assert threads and threads[0].startswith("extraction-")
+
+
+def test_stream_refresh_respects_failure_cache(player, monkeypatch):
+    calls = []
+
+    def fake_extract(url, download=False):
+        calls.append(url)
+        raise Exception("ERROR: [youtube] abcdefghijk: Private video. Sign in if you've been granted access")
+
+    monkeypatch.setattr(music_player, "extract_info_with_fallback", fake_extract)
+    song = make_song()
+    try:
+        with pytest.raises(PermanentExtractionError):
+            run_refresh(player, song)
+        with pytest.raises(PermanentExtractionError):
+            run_refresh(player, song)
+        assert len(calls) == 1  # 2回目は失敗キャッシュで止まり、抽出しない
+    finally:
+        get_failure_cache().forget(song.video_id)
@@ -0,0 +1,199 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services import extraction_scheduler
+from app.services.extraction_scheduler import ExtractionScheduler, JobPriority
+
+
+class Transient(Exception):
+    pass
+
+
+async def block(scheduler: ExtractionScheduler) -> tuple:
+    """ワーカーを塞ぐ仕事を入れて、始まるまで待つ（以降の仕事は待ち行列に溜まる）"""
+    release = threading.Event()
+    blocker = scheduler.submit(release.wait, priority=JobPriority.INTERACTIVE, guild_id="blocker")
+    while scheduler.stats()["running"] == 0:
+        await asyncio.sleep(0.005)
+    return release, blocker
+
+
+def submit_recorder(scheduler, order, name, priority, guild_id="g"):
+    return scheduler.submit(order.append, name, priority=priority, guild_id=guild_id, label=name)
+
+
+def test_jobs_run_in_priority_order():
+    order = []
+
+    async def main():
+        scheduler = ExtractionScheduler(1)
+        release, blocker = await block(scheduler)
+        futures = [
+            submit_recorder(scheduler, order, "warmup", JobPriority.WARMUP),
+            submit_recorder(scheduler, order, "prefetch", JobPriority.PREFETCH),
+            submit_recorder(scheduler, order, "head", JobPriority.HEAD),
+            submit_recorder(scheduler, order, "interactive", JobPriority.INTERACTIVE),
+            submit_recorder(scheduler, order, "prefetch2", JobPriority.PREFETCH),
+        ]
+        assert scheduler.stats()["pending"] == {"interactive": 1, "head": 1, "prefetch": 2, "warmup": 1}
+        release.set()
+        await asyncio.gather(blocker, *futures)
+
+    asyncio.run(main())
+    assert order == ["interactive", "head", "prefetch", "prefetch2", "warmup"]
+
+
+def test_guilds_take_turns_within_a_priority():
+    order = []
+
+    async def main():
+        scheduler = ExtractionScheduler(1)
+        release, blocker = await block(scheduler)
+        futures = [submit_recorder(scheduler, order, f"a{i}", JobPriority.PREFETCH, "a") for i in range(4)]
+        futures += [submit_recorder(scheduler, order, f"b{i}", JobPriority.PREFETCH, "b") for i in range(2)]
+        futures += [submit_recorder(scheduler, order, "c0", JobPriority.PREFETCH, "c")]
+        release.set()
+        await asyncio.gather(blocker, *futures)
+
+    asyncio.run(main())
+    # 大きなプレイリストを入れたギルド a が b・c を待たせない
+    assert order == ["a0", "b0", "c0", "a1", "b1", "a2", "a3"]
+
+
+def test_promote_moves_job_ahead():
+    order = []
+
+    async def main():
+        scheduler = ExtractionScheduler(1)
+        release, blocker = await block(scheduler)
+        futures = [submit_recorder(scheduler, order, f"p{i}", JobPriority.PREFETCH) for i in range(3)]
+        head = submit_recorder(scheduler, order, "head", JobPriority.HEAD)
+        scheduler.promote(futures[2], JobPriority.HEAD)  # 先読み中の曲がキュー先頭になった
+        scheduler.promote(futures[0], JobPriority.WARMUP)  # 下げる方向には動かさない
+        assert scheduler.stats()["pending"]["head"] == 2
+        release.set()
+        await asyncio.gather(blocker, head, *futures)
+
+    asyncio.run(main())
+    assert order == ["p2", "head", "p0", "p1"]
+
+
+def test_cancel_guild_cancels_only_that_guilds_pending_jobs():
+    order = []
+
+    async def main():
+        scheduler = ExtractionScheduler(1)
+        release, blocker = await block(scheduler)
+        gone = [
+            submit_recorder(scheduler, order, "gone-head", JobPriority.HEAD, "gone"),
+            submit_recorder(scheduler, order, "gone-prefetch", JobPriority.PREFETCH, "gone"),
+        ]
+        kept = submit_recorder(scheduler, order, "kept", JobPriority.PREFETCH, "kept")
+        assert scheduler.cancel_guild("gone") == 2
+        release.set()
+        await asyncio.gather(blocker, kept)
+        await asyncio.sleep(0)
+        assert all(f.cancelled() for f in gone)
+        assert not blocker.cancelled()  # 実行中の仕事は止めない
+        assert scheduler.stats()["pending"] == {p.name.lower(): 0 for p in JobPriority}
+
+    asyncio.run(main())
+    assert order == ["kept"]
+
+
+def test_cancel_skips_job_that_has_not_started():
+    order = []
+
+    async def main():
+        scheduler = ExtractionScheduler(1)
+        release, blocker = await block(scheduler)
+        first = submit_recorder(scheduler, order, "first", JobPriority.PREFETCH)
+        second = submit_recorder(scheduler, order, "second", JobPriority.PREFETCH)
+        assert scheduler.cancel(first) is True
+        release.set()
+        await asyncio.gather(blocker, second)
+        assert first.cancelled()
+        assert scheduler.cancel(second) is False  # 終わった仕事は取り消せない
+
+    asyncio.run(main())
+    assert order == ["second"]
+
+
+def test_transient_failure_is_requeued_without_holding_a_worker(monkeypatch):
+    monkeypatch.setattr(extraction_scheduler, "RETRY_BASE_DELAY_SECONDS", 0.05)
+    calls = []
+    order = []
+
+    def flaky():
+        calls.append(threading.current_thread().name)
+        if len(calls) < 3:
+            raise Transient("429")
+        return "ok"
+
+    async def main():
+        scheduler = ExtractionScheduler(1)
+        future = scheduler.submit(
+            flaky, priority=JobPriority.HEAD, guild_id="g",
+            retry=lambda e: isinstance(e, Transient), max_attempts=3,
+        )
+        while scheduler.stats()["retrying"] == 0:
+            await asyncio.sleep(0.005)
+        # 待ち時間中はワーカーが空いていて、他の仕事が先に進む
+        await asyncio.wait_for(submit_recorder(scheduler, order, "other", JobPriority.WARMUP), 1)
+        assert not future.done()
+        assert await asyncio.wait_for(future, 2) == "ok"
+        assert scheduler.stats()["retrying"] == 0
+
+    asyncio.run(main())
+    assert len(calls) == 3
+    assert order == ["other"]
+
+
+def test_retry_gives_up_after_max_attempts_or_permanent_error(monkeypatch):
+    monkeypatch.setattr(extraction_scheduler, "RETRY_BASE_DELAY_SECONDS", 0.01)
+    attempts = {"transient": 0, "permanent": 0}
+
+    def always(kind):
+        attempts[kind] += 1
+        raise Transient(kind) if kind == "transient" else ValueError(kind)
+
+    async def main():
+        scheduler = ExtractionScheduler(1)
+        retry = lambda e: isinstance(e, Transient)
+        transient = scheduler.submit(always, "transient", priority=JobPriority.HEAD, guild_id="g",
+                                     retry=retry, max_attempts=2)
+        permanent = scheduler.submit(always, "permanent", priority=JobPriority.HEAD, guild_id="g",
+                                     retry=retry, max_attempts=5)
+        with pytest.raises(Transient):
+            await asyncio.wait_for(transient, 2)
+        with pytest.raises(ValueError):
+            await asyncio.wait_for(permanent, 2)
+
+    asyncio.run(main())
+    assert attempts == {"transient": 2, "permanent": 1}
+
+
+def test_cancel_during_retry_wait_is_not_requeued(monkeypatch):
+    monkeypatch.setattr(extraction_scheduler, "RETRY_BASE_DELAY_SECONDS", 0.05)
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise Transient("503")
+
+    async def main():
+        scheduler = ExtractionScheduler(1)
+        future = scheduler.submit(failing, priority=JobPriority.PREFETCH, guild_id="g",
+                                  retry=lambda e: True, max_attempts=5)
+        while scheduler.stats()["retrying"] == 0:
+            await asyncio.sleep(0.005)
+        assert scheduler.cancel_guild("g") == 1
+        await asyncio.sleep(0.15)  # 待ち時間が明けても並び直さない
+        assert future.cancelled()
+        assert scheduler.stats()["retrying"] == 0
+        assert sum(scheduler.stats()["pending"].values()) == 0
+
+    asyncio.run(main())
+    assert len(calls) == 1
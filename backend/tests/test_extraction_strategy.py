@@ -0,0 +1,76 @@
+from app import db as history_db
+from app.services.extraction_strategy import ExtractionConfig, ExtractionStrategy
+
+
+FAST = ExtractionConfig(player_client="tv")
+SLOW = ExtractionConfig(player_client="web")
+
+
+def configs(*, cookies_modes=(True,), clients=(None, "tv")):
+    return [
+        ExtractionConfig(fmt, client, cookies)
+        for cookies in cookies_modes
+        for client in clients
+        for fmt in (None, "bestaudio/best", "best")
+    ]
+
+
+def test_download_latencies_do_not_reorder_info_extraction():
+    strategy = ExtractionStrategy([SLOW, FAST], persist=False)
+    for _ in range(10):
+        strategy.record(FAST, True, 0.5)
+        strategy.record(SLOW, True, 2.0)
+        # ダウンロードでは FAST の方が遅い（ファイルが大きい等）
+        strategy.record(FAST, True, 30.0, download=True)
+        strategy.record(SLOW, True, 10.0, download=True)
+
+    assert strategy.ordered()[0] == FAST
+    assert strategy.ordered(download=True)[0] == SLOW
+    stats = strategy.stats()
+    assert stats["order"][0]["median_latency"] == 0.5
+    assert stats["download_order"][0]["median_latency"] == 10.0
+
+
+def test_format_order_is_fixed_and_best_is_last_resort():
+    candidates = configs()
+    strategy = ExtractionStrategy(candidates, persist=False)
+    for config in candidates:
+        # 動画込みの 'best' が一番速く、tv の経路が既定より速い
+        latency = 0.2 if config.format_selector == "best" else 1.0 if config.player_client == "tv" else 2.0
+        for _ in range(10):
+            strategy.record(config, True, latency)
+
+    order = [(c.format_selector, c.player_client) for c in strategy.ordered()]
+    assert order == [
+        (None, "tv"), ("bestaudio/best", "tv"),
+        (None, None), ("bestaudio/best", None),
+        ("best", "tv"), ("best", None),
+    ]
+
+
+def test_cookieless_routes_only_lead_when_cookie_routes_fail():
+    candidates = configs(cookies_modes=(True, False), clients=(None,))
+    with_cookies, without_cookies = candidates[0], candidates[3]
+    strategy = ExtractionStrategy(candidates, persist=False)
+    for _ in range(10):
+        strategy.record(with_cookies, True, 3.0)
+        strategy.record(without_cookies, True, 0.5)  # 速いが Premium のフォーマットが選べない
+    assert strategy.ordered()[0] == with_cookies
+
+    for _ in range(20):
+        strategy.record(with_cookies, False, 3.0)  # クッキーの期限切れなど
+    assert strategy.ordered()[0] == without_cookies
+
+
+def test_extraction_samples_are_pruned_per_key(tmp_path, monkeypatch):
+    monkeypatch.setattr(history_db, "DB_NAME", str(tmp_path / "test.db"))
+    history_db.init_db()
+    for i in range(10):
+        history_db.add_extraction_sample("a", True, float(i), keep=3)
+        history_db.add_extraction_sample("b", True, float(i), keep=3)
+
+    with history_db._connect() as conn:
+        rows = conn.execute(
+            "SELECT config_key, latency FROM extraction_samples ORDER BY config_key, id"
+        ).fetchall()
+    assert rows == [("a", 7.0), ("a", 8.0), ("a", 9.0), ("b", 7.0), ("b", 8.0), ("b", 9.0)]
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+
+from app.services.extraction_scheduler import ExtractionScheduler, JobPriority
+from app.services.hedging import HedgedRunner, LatencyTracker
+
+
+class ConcurrencyProbe:
+    """同時に動いている呼び出しの数の最大値を数える"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.current = 0
+        self.peak = 0
+
+    def call(self, seconds: float, result: str):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+        try:
+            time.sleep(seconds)
+            return result
+        finally:
+            with self._lock:
+                self.current -= 1
+
+
+def make_runner(workers: int) -> tuple[ExtractionScheduler, HedgedRunner]:
+    scheduler = ExtractionScheduler(workers)
+    tracker = LatencyTracker(0.9)
+    tracker.threshold = lambda: 0.02  # すぐヘッジする
+    return scheduler, HedgedRunner(tracker, scheduler)
+
+
+def test_hedge_counts_against_scheduler_workers():
+    scheduler, runner = make_runner(2)
+    probe = ConcurrencyProbe()
+
+    def job():
+        # 主は遅く、予備はすぐ勝つ → 負けた主が走り続ける
+        result, _ = runner.run(lambda: probe.call(0.3, "primary"), lambda: probe.call(0.05, "alternate"))
+        return result
+
+    async def main():
+        # 1件目は枠が空いているのでヘッジし、負けた主が走っている間に残りを流す
+        first = await scheduler.submit(job, priority=JobPriority.PREFETCH, guild_id="a")
+        rest = [scheduler.submit(job, priority=JobPriority.PREFETCH, guild_id=str(i % 2)) for i in range(5)]
+        return [first, *await asyncio.gather(*rest)]
+
+    results = asyncio.run(main())
+    deadline = time.monotonic() + 2
+    while probe.current and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert results[0] == "alternate"
+    assert len(results) == 6
+    assert probe.peak <= 2
+    assert runner.stats()["hedged"] >= 1
+    assert scheduler.stats()["borrowed"] == 0
+
+
+def test_hedge_is_skipped_when_workers_are_busy():
+    scheduler, runner = make_runner(1)
+    probe = ConcurrencyProbe()
+
+    async def main():
+        return await scheduler.submit(
+            lambda: runner.run(lambda: probe.call(0.1, "primary"), lambda: probe.call(0.0, "alternate")),
+            priority=JobPriority.INTERACTIVE,
+            guild_id="g",
+        )
+
+    result, won_by_alternate = asyncio.run(main())
+
+    assert (result, won_by_alternate) == ("primary", False)
+    assert probe.peak == 1
+    assert runner.stats()["hedged"] == 0
@@ -0,0 +1,103 @@
+import sqlite3
+import subprocess
+
+import pytest
+
+from app import db as history_db
+from app.services import loudness
+from app.services.loudness import LoudnessAnalyzer
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(history_db, "DB_NAME", str(tmp_path / "test.db"))
+    history_db.init_db()
+
+
+def make_analyzer(analyze) -> tuple:
+    analyzer = LoudnessAnalyzer(-14.0, 1)
+    analyzer._ffmpeg = "ffmpeg"
+    calls = []
+
+    def counting(path):
+        calls.append(path)
+        return analyze(path)
+
+    analyzer._analyze = counting
+    return analyzer, calls
+
+
+def run(analyzer, key, path):
+    analyzer.submit(key, path)
+    analyzer._executor.shutdown(wait=True)
+
+
+def test_silent_track_is_marked_and_not_analyzed_again(db, tmp_path):
+    path = tmp_path / "silence.webm"
+    path.write_bytes(b"")
+    analyzer, calls = make_analyzer(lambda p: (None, None))
+    run(analyzer, "silent00000", str(path))
+
+    assert history_db.get_all_track_loudness()["silent00000"]["integrated_lufs"] is None
+    assert analyzer.gain_db("silent00000") == 0.0
+    analyzer.submit("silent00000", str(path))  # 同じプロセスでは予約しない
+    assert len(calls) == 1
+
+    # 再起動後も印を読み込んで解析しない
+    restarted, calls = make_analyzer(lambda p: (None, None))
+    restarted.load()
+    run(restarted, "silent00000", str(path))
+    assert calls == []
+
+
+def test_unparseable_loudnorm_output_is_marked(db, tmp_path, monkeypatch):
+    path = tmp_path / "broken.webm"
+    path.write_bytes(b"")
+    analyzer = LoudnessAnalyzer(-14.0, 1)
+    analyzer._ffmpeg = "ffmpeg"
+    runs = []
+
+    def fake_run(args, **kwargs):
+        runs.append(args)
+        return subprocess.CompletedProcess(args, 0, stderr=b"no json here")
+
+    monkeypatch.setattr(loudness.subprocess, "run", fake_run)
+    run(analyzer, "broken00000", str(path))
+    assert history_db.get_all_track_loudness()["broken00000"]["integrated_lufs"] is None
+    analyzer.submit("broken00000", str(path))
+    assert len(runs) == 1
+
+
+def test_missing_file_is_not_marked(db, tmp_path):
+    analyzer, calls = make_analyzer(lambda p: None)  # 掃除済みなど → 次の再生で改めて解析する
+    run(analyzer, "missing0000", str(tmp_path / "missing.webm"))
+    assert history_db.get_all_track_loudness() == {}
+    assert len(calls) == 1
+
+
+def test_measured_track_gets_gain(db, tmp_path):
+    analyzer, _ = make_analyzer(lambda p: (-20.0, -8.0))
+    run(analyzer, "quiet000000", str(tmp_path / "quiet.webm"))
+    row = history_db.get_all_track_loudness()["quiet000000"]
+    assert (row["integrated_lufs"], row["gain_db"]) == (-20.0, 6.0)
+    assert analyzer.gain_db("quiet000000") == 6.0
+
+
+def test_old_schema_is_migrated(tmp_path, monkeypatch):
+    path = tmp_path / "old.db"
+    monkeypatch.setattr(history_db, "DB_NAME", str(path))
+    with sqlite3.connect(path) as conn:
+        conn.execute("""
+        CREATE TABLE track_loudness (
+            key TEXT PRIMARY KEY, integrated_lufs REAL NOT NULL, true_peak_db REAL,
+            gain_db REAL NOT NULL, analyzed_at TEXT NOT NULL
+        )
+        """)
+        conn.execute("INSERT INTO track_loudness VALUES ('kept0000000', -18.0, -3.0, 4.0, '2026-01-01T00:00:00+00:00')")
+    history_db.init_db()
+    history_db.init_db()  # 2回目は何もしない
+
+    history_db.upsert_track_loudness("silent00000", None, None, 0.0)
+    rows = history_db.get_all_track_loudness()
+    assert rows["kept0000000"]["gain_db"] == 4.0
+    assert rows["silent00000"]["integrated_lufs"] is None
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from app.services import music_player
+from app.services.music_player import MusicPlayer, Song, TrackAudioSource
+
+
+class FakeVoiceClient:
+    """VoiceClient の再生状態だけを真似る（source の差し替えは AudioPlayer.set_source と同じく再開する）"""
+
+    def __init__(self, source, paused=False):
+        self._source = source
+        self.paused = paused
+
+    def is_playing(self):
+        return not self.paused
+
+    def is_paused(self):
+        return self.paused
+
+    def pause(self):
+        self.paused = True
+
+    @property
+    def source(self):
+        return self._source
+
+    @source.setter
+    def source(self, value):
+        self._source = value
+        self.paused = False
+
+
+@pytest.fixture(autouse=True)
+def no_ffmpeg(ffmpeg_args, monkeypatch):
+    monkeypatch.setattr(music_player, "VOLUME_RESTART_DEBOUNCE_SECONDS", 0)
+
+
+def make_player(paused):
+    song = Song(source="/music/abc.m4a", title="t", url="https://www.youtube.com/watch?v=abcdefghijk",
+                thumbnail="", artist="a", duration=200.0)
+    player = MusicPlayer.__new__(MusicPlayer)
+    player.guild_id = "1"
+    player.volume = 1.0
+    player.current = song
+    player.voice_client = FakeVoiceClient(TrackAudioSource(song.source), paused=paused)
+    player._create_audio_source = lambda s, start_seconds=0.0: TrackAudioSource(
+        s.source, volume=player.volume, start_seconds=start_seconds)
+    player._create_playback = player._create_audio_source
+
+    async def notify(guild_id):
+        pass
+
+    player.notify_clients = notify
+    return player
+
+
+@pytest.mark.parametrize("paused", [True, False])
+def test_volume_change_keeps_pause_state(paused):
+    player = make_player(paused)
+    player.volume = 0.5
+    asyncio.run(player._apply_volume_to_current())
+    assert player.voice_client.source.volume == 0.5
+    assert player.voice_client.is_paused() is paused
+
+
+@pytest.mark.parametrize("paused", [True, False])
+def test_seek_keeps_pause_state(paused):
+    player = make_player(paused)
+    assert asyncio.run(player.seek(42.0)) == 42.0
+    assert player.voice_client.source.start_seconds == 42.0
+    assert player.voice_client.is_paused() is paused
+
+
+@pytest.mark.parametrize("position", [float("nan"), float("inf"), -1.0, 200.0])
+def test_seek_rejects_invalid_positions(position):
+    player = make_player(False)
+    old = player.voice_client.source
+    with pytest.raises(ValueError):
+        asyncio.run(player.seek(position))
+    assert player.voice_client.source is old
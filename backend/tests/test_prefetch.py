@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+from app.services.extraction_scheduler import ExtractionScheduler, JobPriority
+from app.services.music_player import MusicPlayer, Song
+from app.services.song_queue import SongQueue
+
+
+def song(video_id: str) -> Song:
+    return Song(source=None, title=video_id, url=f"https://www.youtube.com/watch?v={video_id}",
+                thumbnail="", artist="", video_id=video_id)
+
+
+def make_player(loop, depth: int) -> MusicPlayer:
+    player = MusicPlayer.__new__(MusicPlayer)
+    player.guild_id = "1"
+    player.bot = type("Bot", (), {"loop": loop})()
+    player.scheduler = ExtractionScheduler(1)
+    player.queue = SongQueue()
+    player.prefetch_depth = depth
+    player.shutdown_flag = False
+    player._prefetch_task = None
+    player._prefetch_target = None
+    player._prefetch_failed = set()
+    player._preparing = {}
+    player._prefetch_jobs = {}
+    player._refresh_transition = lambda: None
+    return player
+
+
+def test_prefetch_job_is_cancelled_when_song_leaves_window():
+    prepared = []
+    release = threading.Event()
+
+    def prepare_source(s):
+        prepared.append(s.video_id)
+        s.source = f"/music/{s.video_id}.webm"
+        return s
+
+    async def main():
+        player = make_player(asyncio.get_running_loop(), depth=1)
+        player.prepare_source = prepare_source
+        # ワーカーを塞いで、先読みの仕事が待ち行列に残るようにする
+        blocker = player.scheduler.submit(release.wait, priority=JobPriority.INTERACTIVE, guild_id="other")
+        await asyncio.sleep(0.05)
+
+        head, first, second = song("head0000000"), song("first000000"), song("second00000")
+        player.queue.extend([head, first, second])
+        player._schedule_prefetch()
+        await asyncio.sleep(0)
+        first_job = player._prefetch_jobs[first.entry_id]
+
+        player.queue.remove(first)  # 先読み中の曲を削除
+        player._schedule_prefetch()
+        await asyncio.sleep(0)
+        assert first_job.cancelled()
+        assert player.scheduler.stats()["pending"]["prefetch"] == 1  # 次の曲の分だけ
+
+        release.set()
+        await blocker
+        await asyncio.wait_for(player._prefetch_jobs[second.entry_id], 2)
+
+    asyncio.run(main())
+    assert prepared == ["second00000"]
+
+
+def test_prefetch_job_for_song_moved_to_head_is_kept():
+    release = threading.Event()
+
+    async def main():
+        player = make_player(asyncio.get_running_loop(), depth=1)
+        player.prepare_source = lambda s: s
+        blocker = player.scheduler.submit(release.wait, priority=JobPriority.INTERACTIVE, guild_id="other")
+        await asyncio.sleep(0.05)
+
+        head, first = song("head1111111"), song("first111111")
+        player.queue.extend([head, first])
+        player._schedule_prefetch()
+        await asyncio.sleep(0)
+        job = player._prefetch_jobs[first.entry_id]
+
+        player.queue.remove(head)  # 次の曲が先頭へ（再生ループがこの準備を待つ）
+        player._schedule_prefetch()
+        await asyncio.sleep(0)
+        assert not job.cancelled()
+
+        release.set()
+        await blocker
+        await asyncio.wait_for(job, 2)
+
+    asyncio.run(main())
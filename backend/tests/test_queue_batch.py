@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+from app.services.extraction_errors import PermanentExtractionError
+from app.services.extraction_scheduler import ExtractionScheduler, JobPriority
+from app.services.music_player import MusicPlayer, Song
+from app.services.song_queue import SongQueue
+
+
+def make_player(loop, get_song_info) -> MusicPlayer:
+    player = MusicPlayer.__new__(MusicPlayer)
+    player.guild_id = "1"
+    player.bot = type("Bot", (), {"loop": loop})()
+    player.scheduler = ExtractionScheduler(1)
+    player.queue = SongQueue()
+    player.current = None
+    player.voice_client = None
+    player._enqueue_tasks = set()
+    player._schedule_prefetch = lambda: None
+    player.get_song_info = get_song_info
+
+    async def notify(guild_id):
+        pass
+
+    player.notify_clients = notify
+    return player
+
+
+def track(video_id: str, title: str) -> dict:
+    return {"url": f"https://www.youtube.com/watch?v={video_id}", "title": title, "artist": "client"}
+
+
+def test_batch_insert_verifies_client_tracks():
+    def get_song_info(url, added_by=None):
+        if url.endswith("privatevid1"):
+            raise PermanentExtractionError("Private video", "private", "privatevid1")
+        return [Song(source=None, title="yt-dlp title", url=url, thumbnail="thumb", artist="yt-dlp artist",
+                     duration=180.0, video_id=url[-11:])]
+
+    async def main():
+        player = make_player(asyncio.get_running_loop(), get_song_info)
+        inserted = await player.apply_queue_operations([
+            {"op": "insert", "tracks": [track("goodvideo01", "spoofed"), track("privatevid1", "private")]},
+        ])
+        await asyncio.gather(*player._enqueue_tasks)
+        return player, inserted
+
+    player, inserted = asyncio.run(main())
+
+    assert len(inserted[0]) == 2
+    songs = list(player.queue)
+    assert [s.video_id for s in songs] == ["goodvideo01"]  # 再生できない動画は外れる
+    assert (songs[0].title, songs[0].artist, songs[0].duration) == ("yt-dlp title", "yt-dlp artist", 180.0)
+    assert songs[0].lazy is False
+
+
+def test_verification_of_same_video_is_extracted_once():
+    calls = []
+    release = threading.Event()
+
+    def get_song_info(url, added_by=None):
+        calls.append(url)
+        return [Song(source=None, title="yt-dlp title", url=url, thumbnail="", artist="", video_id=url[-11:])]
+
+    async def main():
+        player = make_player(asyncio.get_running_loop(), get_song_info)
+        blocker = player.scheduler.submit(release.wait, priority=JobPriority.INTERACTIVE, guild_id="other")
+        await player.apply_queue_operations([
+            {"op": "insert", "tracks": [track("samevideo01", "first"), track("samevideo01", "second")]},
+        ])
+        await asyncio.sleep(0)
+        # 確認は急がない仕事として1件だけ並ぶ
+        assert player.scheduler.stats()["pending"]["warmup"] == 1
+        release.set()
+        await blocker
+        await asyncio.gather(*player._enqueue_tasks)
+        return player
+
+    player = asyncio.run(main())
+    assert len(calls) == 1
+    assert [s.title for s in player.queue] == ["yt-dlp title", "yt-dlp title"]
+    assert len({s.entry_id for s in player.queue}) == 2
@@ -0,0 +1,126 @@
+import pytest
+
+from app.services.song_queue import SongQueue
+
+
+class Item:
+    def __init__(self, name: str):
+        self.entry_id = name
+
+    def __repr__(self):
+        return self.entry_id
+
+
+def names(queue):
+    return [item.entry_id for item in queue]
+
+
+def make(*names_):
+    items = {name: Item(name) for name in names_}
+    return SongQueue(items.values()), items
+
+
+def test_insert_after_anchor_head_and_missing_anchor():
+    queue, items = make("a", "b", "c")
+    queue.insert_after(items["a"], [Item("x"), Item("y")])
+    assert names(queue) == ["a", "x", "y", "b", "c"]
+
+    queue.insert_after(None, [Item("h")])
+    assert names(queue) == ["h", "a", "x", "y", "b", "c"]
+
+    # 既に取り除かれた曲の後ろを指定されたら末尾に入れる
+    queue.remove(items["b"])
+    queue.insert_after(items["b"], [Item("z")])
+    assert names(queue) == ["h", "a", "x", "y", "c", "z"]
+    assert len(queue) == 6
+
+
+def test_replace_in_place_with_nothing_and_missing_item():
+    queue, items = make("a", "b", "c")
+    queue.replace(items["b"], [Item("b1"), Item("b2")])
+    assert names(queue) == ["a", "b1", "b2", "c"]
+    assert items["b"] not in queue and queue.get("b") is None
+
+    queue.replace(items["a"], [])  # 0件なら削除
+    assert names(queue) == ["b1", "b2", "c"]
+
+    queue.replace(items["a"], [Item("late")])  # 既に無い曲なら末尾に追加
+    assert names(queue) == ["b1", "b2", "c", "late"]
+
+
+def test_move_clamps_index():
+    queue, items = make("a", "b", "c", "d")
+    queue.move(items["a"], 2)
+    assert names(queue) == ["b", "c", "a", "d"]
+    queue.move(items["b"], 100)
+    assert names(queue) == ["c", "a", "d", "b"]
+    queue.move(items["d"], -5)
+    assert names(queue) == ["d", "c", "a", "b"]
+    assert queue.index(items["a"]) == 2 and queue[-1] is items["b"]
+    with pytest.raises(ValueError):
+        queue.move(Item("missing"), 0)
+
+
+def test_move_after():
+    queue, items = make("a", "b", "c", "d")
+    queue.move_after(items["d"], items["a"])
+    assert names(queue) == ["a", "d", "b", "c"]
+    queue.move_after(items["c"], None)
+    assert names(queue) == ["c", "a", "d", "b"]
+    queue.move_after(items["a"], items["a"])  # 自分の後ろなら動かさない
+    assert names(queue) == ["c", "a", "d", "b"]
+
+    with pytest.raises(ValueError):
+        queue.move_after(Item("missing"), items["a"])
+    with pytest.raises(ValueError):
+        queue.move_after(items["a"], Item("missing"))
+    assert names(queue) == ["c", "a", "d", "b"]
+
+
+def test_remove_discard_and_popleft():
+    queue, items = make("a", "b", "c")
+    queue.remove(items["b"])
+    with pytest.raises(ValueError):
+        queue.remove(items["b"])
+    assert queue.discard(items["b"]) is False
+    assert queue.discard(items["c"]) is True
+    assert names(queue) == ["a"]
+
+    assert queue.popleft() is items["a"]
+    assert not queue and len(queue) == 0
+    with pytest.raises(IndexError):
+        queue.popleft()
+
+
+def test_duplicate_entry_id_is_rejected():
+    queue, items = make("a", "b")
+    with pytest.raises(ValueError):
+        queue.append(items["a"])
+    with pytest.raises(ValueError):
+        queue.insert_after(items["b"], [Item("a")])  # 別オブジェクトでも同じエントリ ID は不可
+    assert names(queue) == ["a", "b"]
+
+    # 取り除いた後なら入れ直せる
+    queue.remove(items["a"])
+    queue.append(items["a"])
+    assert names(queue) == ["b", "a"]
+
+
+def test_iterating_while_queue_changes():
+    queue, items = make("a", "b", "c", "d")
+    seen = []
+    for item in queue:
+        seen.append(item.entry_id)
+        if item is items["a"]:
+            queue.remove(items["a"])  # 今のノードを外しても次へ進める
+        elif item is items["b"]:
+            queue.remove(items["c"])  # まだ見ていない曲は飛ばされる
+        elif item is items["d"]:
+            queue.append(Item("e"))  # 末尾に足した曲は続けて見える
+    assert seen == ["a", "b", "d", "e"]
+    assert names(queue) == ["b", "d", "e"]
+
+    # 写しを回せば元のキューの変更に影響されない
+    for item in list(queue):
+        queue.remove(item)
+    assert names(queue) == []
@@ -0,0 +1,44 @@
+import pytest
+
+from app.services import music_player
+from app.services.music_player import TrackAudioSource
+
+
+@pytest.fixture(autouse=True)
+def opus_by_extension(monkeypatch):
+    monkeypatch.setattr(music_player, "is_opus_file", lambda path: path.endswith(".opus"))
+
+
+def _codec(args):
+    return args[args.index("-c:a") + 1]
+
+
+def _last(args, option):
+    """FFmpeg は同じ出力オプションが複数あれば最後のものを使う"""
+    return args[len(args) - 1 - args[::-1].index(option) + 1]
+
+
+def test_opus_cache_at_full_volume_is_passthrough(ffmpeg_args):
+    source = TrackAudioSource("/music/abc.opus")
+    assert source.passthrough
+    assert _codec(ffmpeg_args["args"]) == "copy"
+    assert "-compression_level" not in ffmpeg_args["args"]
+
+
+@pytest.mark.parametrize("path, volume, gain_db", [
+    ("/music/abc.opus", 0.5, 0.0),  # 音量を変えた Opus キャッシュ
+    ("/music/abc.opus", 1.0, -3.0),  # ラウドネス正規化のゲイン
+    ("/music/abc.m4a", 1.0, 0.0),  # Opus 以外のキャッシュ
+    ("https://example.com/audio", 1.0, 0.0),  # ストリーム
+])
+def test_non_passthrough_encodes_with_libopus(ffmpeg_args, path, volume, gain_db):
+    source = TrackAudioSource(path, volume=volume, gain_db=gain_db)
+    assert not source.passthrough
+    args = ffmpeg_args["args"]
+    assert _codec(args) == "libopus"
+    # discord.py 既定の FEC（-fec true -packet_loss 15）は重いので打ち消す
+    assert _last(args, "-fec") == "false"
+    assert _last(args, "-packet_loss") == "0"
+    assert _last(args, "-compression_level") == str(music_player.settings.music.opus_compression_level)
+    if volume != 1.0 or gain_db:
+        assert any(a.startswith("volume=") for a in args)
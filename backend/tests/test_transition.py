@@ -0,0 +1,112 @@
+import struct
+
+import discord
+import pytest
+
+from app.services import transition
+from app.services.transition import PCM_FRAME_BYTES, PreparedNext, TransitionSource, mix_frames
+
+
+class FakeSource(discord.AudioSource):
+    def __init__(self, frames, opus, frame_seconds=0.02):
+        self.frames = list(frames)
+        self.opus = opus
+        self.read_count = 0
+        self.frame_seconds = frame_seconds
+
+    def read(self):
+        if not self.frames:
+            return b""
+        self.read_count += 1
+        return self.frames.pop(0)
+
+    def is_opus(self):
+        return self.opus
+
+    @property
+    def position_seconds(self):
+        return self.read_count * self.frame_seconds
+
+
+class FakeEncoder:
+    SAMPLES_PER_FRAME = 960
+    encoded = []  # 作られたエンコーダに渡された PCM（テストごとに空にする）
+
+    def __init__(self, **kwargs):
+        pass
+
+    def encode(self, pcm, frame_size):
+        assert len(pcm) == PCM_FRAME_BYTES and frame_size == 960
+        FakeEncoder.encoded.append(pcm)
+        return b"enc"
+
+
+def pcm(value):
+    return struct.pack("<h", value) * (PCM_FRAME_BYTES // 2)
+
+
+def samples(frame):
+    return struct.unpack(f"<{len(frame) // 2}h", frame)
+
+
+def test_mix_frames_weights_both_tracks():
+    mixed = mix_frames(pcm(1000), pcm(-1000), 0.25)
+    assert struct.unpack_from("<h", mixed)[0] == 500
+    assert len(mix_frames(pcm(1000)[:100], pcm(0), 0.0)) == PCM_FRAME_BYTES  # 短いフレームは無音で埋める
+
+
+@pytest.mark.parametrize("t", [0.0, 0.1, 0.5, 0.9, 1.0])
+def test_mix_frames_sample_values(t):
+    count = PCM_FRAME_BYTES // 2
+    # 左右で違う波形・端の値を含む
+    outgoing = [(i * 97) % 65536 - 32768 for i in range(count)]
+    incoming = [32767 if i % 2 else -32768 for i in range(count)]
+    mixed = samples(mix_frames(struct.pack(f"<{count}h", *outgoing), struct.pack(f"<{count}h", *incoming), t))
+
+    assert len(mixed) == count
+    for o, i, m in zip(outgoing, incoming, mixed):
+        assert abs(m - (o * (1 - t) + i * t)) < 2  # 2回の掛け算でそれぞれ小数点以下を切り捨てる
+    if t == 0.0:
+        assert list(mixed) == outgoing
+    if t == 1.0:
+        assert list(mixed) == incoming
+
+
+def test_mix_frames_pads_short_outgoing_with_silence():
+    short = struct.pack("<4h", 1000, -1000, 2000, -2000)
+    mixed = samples(mix_frames(short, pcm(400), 0.5))
+    assert mixed[:4] == (700, -300, 1200, -800)
+    assert set(mixed[4:]) == {200}
+
+
+def test_crossfade_frames_are_encoded_and_source_stays_opus(monkeypatch):
+    monkeypatch.setattr(transition.discord.opus, "Encoder", FakeEncoder)
+    monkeypatch.setattr(FakeEncoder, "encoded", [])
+    song_a, song_b = object(), object()
+    main_a = FakeSource([b"opus-a"] * 10, opus=True)
+    source = TransitionSource(song_a, main_a, crossfade_seconds=0.1, request_next=lambda t: None, on_switch=lambda a, b: None)
+    source.set_next(PreparedNext(
+        song=song_b,
+        main=FakeSource([b"opus-b"] * 10, opus=True),
+        fade_out=FakeSource([pcm(1000)] * 5, opus=False),
+        fade_in=FakeSource([pcm(-1000)] * 10, opus=False),
+        fade_start=0.1,
+        for_song=song_a,
+    ))
+
+    packets = []
+    for _ in range(12):
+        packets.append(source.read())
+        assert source.is_opus()
+    assert packets[:5] == [b"opus-a"] * 5
+    assert b"enc" in packets  # フェード中は混ぜた PCM を Opus にしたもの
+    assert packets[-1] == b"opus-b"
+    assert all(p in (b"opus-a", b"opus-b", b"enc") for p in packets)
+    # エンコーダに渡した PCM は、今の曲（1000）から次の曲（-1000）へ直線的に移っていく
+    levels = [set(samples(frame)) for frame in FakeEncoder.encoded]
+    assert all(len(level) == 1 for level in levels)
+    levels = [level.pop() for level in levels]
+    assert levels == sorted(levels, reverse=True)
+    for n, level in enumerate(levels, start=1):
+        t = n / 5  # フェードは 0.1 秒 = 5 フレーム
+        assert abs(level - (1000 * (1 - t) - 1000 * t)) <= 1
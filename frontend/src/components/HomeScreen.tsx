@@ -1,6 +1,6 @@
 import React, { useEffect, useState, useCallback, useMemo, memo, useRef } from 'react';
 import { motion, AnimatePresence, Variants } from 'framer-motion';
-import { PlayableItem, SearchItem, api, Section, QueueItem } from '@/utils/api';
+import { PlayableItem, SearchItem, api, Section, QueueItem, Track } from '@/utils/api';
 import { useToast } from '@/hooks/use-toast';
 import { Loading } from '@/components/ui/loading';
 import Image from 'next/image';
@@ -36,6 +36,8 @@ interface HomeScreenProps {
   onSelectTrack: (item: PlayableItem) => void;
   /** 画面遷移せずにキューへ追加（曲一覧ダイアログからの追加用）。未指定なら onSelectTrack */
   onEnqueue?: (item: PlayableItem) => void | Promise<void>;
+  /** 曲一覧ダイアログの「まとめて追加」（1リクエスト）。未指定なら onEnqueue を1曲ずつ */
+  onEnqueueMany?: (tracks: Track[]) => void | Promise<void>;
   guildId: string | null;
   activeTab: string;
   onTabChange: (tab: string) => void;
@@ -448,6 +450,7 @@ URLAddCard.displayName = 'URLAddCard';
 export const HomeScreen: React.FC<HomeScreenProps> = React.memo(({
   onSelectTrack,
   onEnqueue,
+  onEnqueueMany,
   guildId,
   activeTab,
   onTabChange,
@@ -787,7 +790,7 @@ export const HomeScreen: React.FC<HomeScreenProps> = React.memo(({
 
       {allDialog}
 
-      <CollectionDialog item={collectionItem} onClose={() => setCollectionItem(null)} onAddTrack={(t) => (onEnqueue ?? onSelectTrack)(t)} />
+      <CollectionDialog item={collectionItem} onClose={() => setCollectionItem(null)} onAddTrack={(t) => (onEnqueue ?? onSelectTrack)(t)} onAddTracks={onEnqueueMany} />
 
       {/* Artist dialog */}
       {isArtistDialogOpen && selectedArtistId && (
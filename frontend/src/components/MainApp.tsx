@@ -3,7 +3,7 @@
 
 import React, { useState, useEffect, useRef, useCallback, useMemo } from 'react';
 import { AnimatePresence, motion } from 'framer-motion';
-import { api, PlayableItem, SearchItem } from '@/utils/api';
+import { api, PlayableItem, SearchItem, Track } from '@/utils/api';
 import { MainPlayer } from './MainPlayer';
 import { Header } from './Header';
 import { SideMenu } from './SideMenu';
@@ -55,7 +55,7 @@ export const MainApp: React.FC = () => {
     currentTrack, queue, isPlaying, isLoading, isBuffering, history,
     isMainPlayerVisible, setIsMainPlayerVisible,
     play, pause, skip,
-    addToQueue, reorderQueue, removeFromQueue,
+    addToQueue, addTracksToQueue, reorderQueue, removeFromQueue,
   } = usePlayerStore();
 
   // レイアウト: lg 以上は Now Playing パネルを右にドッキング
@@ -289,6 +289,7 @@ export const MainApp: React.FC = () => {
         if (!isDesktop) setIsMainPlayerVisible(true);
       }}
       onEnqueue={(item: PlayableItem) => addToQueue(item, getUserInfo())}
+      onEnqueueMany={(tracks: Track[]) => addTracksToQueue(tracks, getUserInfo())}
       guildId={activeServerId}
       activeTab={homeActiveTab}
       onTabChange={(tab) => setHomeActiveTab(tab)}
@@ -372,6 +373,7 @@ export const MainApp: React.FC = () => {
                 results={searchResults}
                 onAddToQueue={(item) => addToQueue(item, getUserInfo())}
                 onAddTrackToQueue={(track) => addToQueue(track, getUserInfo())}
+                onAddTracksToQueue={(tracks) => addTracksToQueue(tracks, getUserInfo())}
                 onClose={() => setIsSearchActive(false)}
                 onSearch={handleSearch}
                 isSearching={isSearching}
@@ -24,6 +24,8 @@ interface SearchResultsProps {
   results: SearchItem[];
   onAddToQueue: (item: PlayableItem) => Promise<void>;
   onAddTrackToQueue: (track: Track) => Promise<void>;
+  /** 「全曲追加」（1リクエスト）。未指定なら onAddTrackToQueue を1曲ずつ */
+  onAddTracksToQueue?: (tracks: Track[]) => Promise<void>;
   onClose: () => void;
   onSearch: (query: string) => Promise<void>;
   /** 親（ヘッダー検索）側で検索中のとき true。スケルトンを表示する */
@@ -32,7 +34,7 @@ interface SearchResultsProps {
   lastQuery?: string;
 }
 
-export const SearchResults: React.FC<SearchResultsProps> = ({ results, onAddToQueue, onAddTrackToQueue, onClose, onSearch, isSearching = false, lastQuery = '' }) => {
+export const SearchResults: React.FC<SearchResultsProps> = ({ results, onAddToQueue, onAddTrackToQueue, onAddTracksToQueue, onClose, onSearch, isSearching = false, lastQuery = '' }) => {
   const [searchQuery, setSearchQuery] = useState('');
   const [isLoading, setIsLoading] = useState(false);
   const [playlistTracks, setPlaylistTracks] = useState<{[key: string]: Track[]}>({});
@@ -227,6 +229,7 @@ export const SearchResults: React.FC<SearchResultsProps> = ({ results, onAddToQu
                               item={item}
                               onAddToQueue={onAddToQueue}
                               onAddTrackToQueue={onAddTrackToQueue}
+                              onAddTracksToQueue={onAddTracksToQueue}
                               playlistTracks={playlistTracks}
                               setPlaylistTracks={setPlaylistTracks}
                               setSelectedArtistId={setSelectedArtistId}
@@ -250,6 +253,7 @@ export const SearchResults: React.FC<SearchResultsProps> = ({ results, onAddToQu
                             item={item}
                             onAddToQueue={onAddToQueue}
                             onAddTrackToQueue={onAddTrackToQueue}
+                            onAddTracksToQueue={onAddTracksToQueue}
                             playlistTracks={playlistTracks}
                             setPlaylistTracks={setPlaylistTracks}
                             setSelectedArtistId={setSelectedArtistId}
@@ -285,6 +289,7 @@ interface SearchResultCardProps {
   item: SearchItem;
   onAddToQueue: (item: PlayableItem) => Promise<void>;
   onAddTrackToQueue: (track: Track) => Promise<void>;
+  onAddTracksToQueue?: (tracks: Track[]) => Promise<void>;
   playlistTracks: {[key: string]: Track[]};
   setPlaylistTracks: React.Dispatch<React.SetStateAction<{[key: string]: Track[]}>>;
   setSelectedArtistId: (id: string) => void;
@@ -295,6 +300,7 @@ const SearchResultCardInner: React.FC<SearchResultCardProps> = ({
   item,
   onAddToQueue,
   onAddTrackToQueue,
+  onAddTracksToQueue,
   playlistTracks,
   setPlaylistTracks,
   setSelectedArtistId,
@@ -425,8 +431,12 @@ const SearchResultCardInner: React.FC<SearchResultCardProps> = ({
                         await fetchPlaylistTracks(item);
                       }
                       if (playlistTracks[item.browseId!]) {
-                        for (const track of playlistTracks[item.browseId!]) {
-                          await onAddTrackToQueue(track);
+                        if (onAddTracksToQueue) {
+                          await onAddTracksToQueue(playlistTracks[item.browseId!]);
+                        } else {
+                          for (const track of playlistTracks[item.browseId!]) {
+                            await onAddTrackToQueue(track);
+                          }
                         }
                         toast({
                           title: "追加しました",
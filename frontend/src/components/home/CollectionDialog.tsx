@@ -15,12 +15,14 @@ interface Props {
   item: SearchItem | null;
   onClose: () => void;
   onAddTrack: (track: Track) => Promise<void> | void;
+  /** まとめて追加（1リクエスト）。未指定なら onAddTrack を1曲ずつ */
+  onAddTracks?: (tracks: Track[]) => Promise<void> | void;
 }
 
 const typeLabel = (t: string) => ({ playlist: 'プレイリスト', album: 'アルバム', single: 'シングル', ep: 'EP' } as Record<string, string>)[t] || t;
 
 /** ホームのプレイリスト / アルバム / ミックスをタップしたときの曲一覧（1曲ずつ or まとめて追加） */
-export const CollectionDialog: React.FC<Props> = ({ item, onClose, onAddTrack }) => {
+export const CollectionDialog: React.FC<Props> = ({ item, onClose, onAddTrack, onAddTracks }) => {
   const [tracks, setTracks] = useState<Track[] | null>(null);
   const [error, setError] = useState<string | null>(null);
   const [adding, setAdding] = useState(false);
@@ -47,7 +49,11 @@ export const CollectionDialog: React.FC<Props> = ({ item, onClose, onAddTrack })
     const list = tracks.slice(0, BULK_LIMIT);
     setAdding(true);
     try {
-      for (const t of list) { await onAddTrack(t); }
+      if (onAddTracks) {
+        await onAddTracks(list);
+      } else {
+        for (const t of list) { await onAddTrack(t); }
+      }
       setAddedUrls(prev => { const n = new Set(prev); list.forEach(t => n.add(t.url)); return n; });
       toast({ title: 'キューに追加しました', description: `${list.length} 曲を追加しました${tracks.length > BULK_LIMIT ? `（先頭 ${BULK_LIMIT} 曲）` : ''}` });
     } finally {
@@ -92,6 +92,7 @@ interface PlayerState {
   skip: () => Promise<void>;
   previous: () => Promise<void>;
   addToQueue: (item: PlayableItem, user?: User | null) => Promise<void>;
+  addTracksToQueue: (tracks: Track[], user?: User | null) => Promise<void>;
   reorderQueue: (startIndex: number, endIndex: number) => Promise<void>;
   removeFromQueue: (index: number) => Promise<void>;
 
@@ -333,7 +334,9 @@ export const usePlayerStore = create<PlayerState>()(
           }
           setPendingOperationWithTimeout();
 
-          await api.addUrl(activeServerId, item.url, user || null);
+          // 曲情報も送る（サーバーはそれを使ってすぐキューに入れ、「読み込み中」のプレースホルダを経ない）
+          const { title, artist, thumbnail, url } = item;
+          await api.playTrack(activeServerId, { title, artist, thumbnail, url }, user || null);
 
           toast({
             title: '成功',
@@ -366,6 +369,34 @@ export const usePlayerStore = create<PlayerState>()(
         }
       },
       
+      // まとめてキューに追加（アルバム/プレイリストの全曲など。プレースホルダは WebSocket 更新ですぐ届く）
+      addTracksToQueue: async (tracks, user) => {
+        const activeServerId = getActiveServerId();
+
+        if (!activeServerId) {
+          toast({
+            title: 'エラー',
+            description: 'サーバーが選択されていません。',
+            variant: 'destructive',
+          });
+          return Promise.reject(new Error('サーバーが選択されていません'));
+        }
+
+        try {
+          // 成功の通知は呼び出し側（曲数や上限の表示が画面ごとに違う）
+          await api.addTracks(activeServerId, tracks, user || null);
+          return Promise.resolve();
+        } catch (error) {
+          console.error('追加エラー:', error);
+          toast({
+            title: 'エラー',
+            description: 'キューへの追加に失敗しました。',
+            variant: 'destructive',
+          });
+          return Promise.reject(error);
+        }
+      },
+
       // キューの並べ替え（楽観的更新 + ロールバック）
       reorderQueue: async (startIndex, endIndex) => {
         const { queue } = get();
@@ -389,7 +420,13 @@ export const usePlayerStore = create<PlayerState>()(
           });
           setPendingOperationWithTimeout();
 
-          await api.reorderQueue(activeServerId, startIndex + 1, endIndex + 1);
+          // ID があれば「どの曲を・どの曲の後ろへ」で送る（他のクライアントの操作で位置がずれていても正しい曲が動く）
+          if (movedItem.queue_id) {
+            const afterId = endIndex > 0 ? newQueue[endIndex - 1]?.queue_id ?? null : null;
+            await api.moveQueueEntry(activeServerId, movedItem.queue_id, afterId);
+          } else {
+            await api.reorderQueue(activeServerId, startIndex + 1, endIndex + 1);
+          }
 
           // 成功したら操作中フラグをリセット（WebSocket更新で最終状態が来る）
           return Promise.resolve();
@@ -445,7 +482,11 @@ export const usePlayerStore = create<PlayerState>()(
           });
           setPendingOperationWithTimeout();
 
-          await api.removeFromQueue(activeServerId, index);
+          if (removedTrack?.queue_id) {
+            await api.removeQueueEntry(activeServerId, removedTrack.queue_id);
+          } else {
+            await api.removeFromQueue(activeServerId, index);
+          }
 
           toast({
             title: '成功',
@@ -630,7 +671,7 @@ function applyServerState(data: WebSocketData, source: 'websocket' | 'rest') {
     // @ts-expect-error - Type compatibility issues with track data
     currentTrack: current?.track || null,
     // @ts-expect-error - Type compatibility issues with queue items
-    queue: queueItems.filter((item: { isCurrent: boolean }) => !item.isCurrent).map((item: { track: Track }) => item.track),
+    queue: queueItems.filter((item: { isCurrent: boolean }) => !item.isCurrent).map((item: QueueItem) => ({ ...item.track, queue_id: item.id ?? null })),
     isPlaying: !!data.is_playing,
     isBuffering: !!data.is_loading,
     lastSyncVersion: newVersion,
@@ -87,6 +87,8 @@ export interface Track extends PlayableItem {
   played_at?: string | null;
   /** 追加直後で情報取得中（キューのプレースホルダ） */
   pending?: boolean | null;
+  /** キュー内のエントリ ID（QueueItem.id。ID 指定の削除/移動に使う） */
+  queue_id?: string | null;
 }
 
 export interface SearchItem extends PlayableItem {
@@ -117,10 +119,20 @@ export interface PlayerStateSnapshot {
   [key: string]: unknown;
 }
 
+/** /queue/{guildId}/batch の1操作（after_id は insert なら末尾、move なら次に再生が既定） */
+export interface QueueOperation {
+  op: 'insert' | 'remove' | 'move' | 'clear' | 'shuffle';
+  entry_id?: string | null;
+  after_id?: string | null;
+  tracks?: Track[];
+}
+
 export interface QueueItem {
   track: Track;
   position: number;
   isCurrent: boolean;
+  /** キュー内で変わらないエントリ ID */
+  id?: string | null;
 }
 
 export interface Server {
@@ -344,7 +356,8 @@ export const api = {
     return false; // エラーハンドリング後の空の戻り値
   },
 
-  playTrack: async (guildId: string, track: Track, user: User): Promise<void> => {
+  /** 曲情報ごと送ってキューへ追加する（単曲の動画ならサーバーは情報取得を待たずにすぐ入れる） */
+  playTrack: async (guildId: string, track: Track, user: User | null): Promise<void> => {
     try {
       await apiClient.post(`/play/${guildId}`, { track, user });
     } catch (error) {
@@ -433,6 +446,15 @@ export const api = {
     }
   },
 
+  /** 複数の曲をこの順でまとめてキューへ追加する（情報取得中のプレースホルダとしてすぐ入る） */
+  addTracks: async (guildId: string, tracks: Track[], user: User | null): Promise<void> => {
+    try {
+      await apiClient.post(`/add-tracks/${guildId}`, { tracks, user });
+    } catch (error) {
+      handleApiError(error);
+    }
+  },
+
   reorderQueue: async (guildId: string, startIndex: number, endIndex: number): Promise<void> => {
     try {
       await apiClient.post(`/reorder-queue/${guildId}`, {
@@ -444,6 +466,18 @@ export const api = {
     }
   },
 
+  /** キュー項目を ID で指定した曲の直後へ移す（afterId が null なら次に再生） */
+  moveQueueEntry: async (guildId: string, entryId: string, afterId: string | null): Promise<void> => {
+    try {
+      await apiClient.post(`/queue/${guildId}/move`, {
+        entry_id: entryId,
+        after_id: afterId,
+      });
+    } catch (error) {
+      handleApiError(error);
+    }
+  },
+
   setVolume: async (guildId: string, volume: number): Promise<void> => {
     try {
       await apiClient.post(`/set-volume/${guildId}`, { volume });
@@ -544,6 +578,25 @@ export const api = {
     }
   },
 
+  /** キューへの複数の操作をまとめて適用する（1往復・通知1回。insert ごとに追加した曲の ID を返す） */
+  batchQueue: async (guildId: string, operations: QueueOperation[], user?: User | null): Promise<string[][]> => {
+    try {
+      const response = await apiClient.post(`/queue/${guildId}/batch`, { operations, user });
+      return response.data.inserted ?? [];
+    } catch (error) {
+      handleApiError(error);
+    }
+    return []; // エラーハンドリング後の空の戻り値
+  },
+
+  removeQueueEntry: async (guildId: string, entryId: string): Promise<void> => {
+    try {
+      await apiClient.post(`/queue/${guildId}/remove`, { entry_id: entryId });
+    } catch (error) {
+      handleApiError(error);
+    }
+  },
+
   getRealtimeSession: async (): Promise<RealtimeSessionData> => {
     try {
       const response = await apiClient.post('/realtime-session', {